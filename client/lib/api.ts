@@ -152,11 +152,18 @@ export const jd = {
 
 // History endpoints (v1.3)
 export const history = {
-  // Get past runs with pagination
-  list: (page: number = 1, pageSize: number = 10) =>
-    api.get('/history', { params: { page, page_size: pageSize } }),
-
-  // Re-generate from a past run
-  regenerate: (runId: string) =>
-    api.post(`/history/${runId}/regenerate`)
+  // Get past runs with pagination (pass the previous response's next_cursor to page by cursor)
+  list: (page: number = 1, pageSize: number = 10, cursor?: string) =>
+    api.get('/history', { params: cursor ? { cursor, page_size: pageSize } : { page, page_size: pageSize } }),
+
+  // Full payload of one run (generated output, JD text)
+  get: (runId: string) =>
+    api.get(`/history/${runId}`),
+
+  // Re-generate from a past run (only what the profile changes affect, plus `sections`)
+  regenerate: (runId: string, sections?: Array<'resume' | 'cover_letter' | 'ats'>) =>
+    api.post(`/history/${runId}/regenerate`, null, {
+      params: sections ? { sections } : undefined,
+      paramsSerializer: { indexes: null }
+    })
 };
\ No newline at end of file
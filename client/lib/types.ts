@@ -140,9 +140,10 @@ export interface HistoryItem {
 
 export interface HistoryResponse {
   runs: HistoryItem[];
-  total: number;
+  total: number | null;  // null when requested with with_total=false
   page: number;
   page_size: number;
+  next_cursor?: string | null;  // pass to history.list for the next page
 }
 
 // Helper function to create empty profile
@@ -1,13 +1,18 @@
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
+import time
 import hashlib
 import uuid
 import logging
+from app.core.cache import TTLCache
+from app.auth.crypto import hash_password, verify_password  # noqa: F401 (re-exported)
+from app.db.models import User
 
 logger = logging.getLogger(__name__)
 
@@ -15,50 +20,15 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "secret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-security = HTTPBearer()
+# Verified-token and user-existence caches: status polling re-sends the same
+# token every few seconds, so skip the JWT decode and the users lookup.
+# Tokens are cached until min(TTL, their own exp); only positive results are cached.
+TOKEN_CACHE_TTL = float(os.environ.get("TOKEN_CACHE_TTL", "60"))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "30"))
+_token_cache = TTLCache("jwt", maxsize=10000, ttl=TOKEN_CACHE_TTL)
+_user_cache = TTLCache("user_exists", maxsize=10000, ttl=USER_CACHE_TTL)
 
-# Use SHA256 for testing if bcrypt is problematic
-try:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    logger.info("Bcrypt password context initialized successfully")
-except Exception as e:
-    logger.warning(f"Bcrypt initialization failed: {e}, will use SHA256 fallback")
-    pwd_context = None
-
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt or SHA256 fallback"""
-    logger.debug(f"Hashing password, length: {len(password)}")
-
-    # Fallback to SHA256 if bcrypt fails
-    if pwd_context:
-        try:
-            hashed = pwd_context.hash(password)
-            logger.debug(f"Password hashed using bcrypt, hash length: {len(hashed)}")
-            return hashed
-        except Exception as e:
-            logger.warning(f"Bcrypt hashing failed: {e}, falling back to SHA256")
-
-    # Simple SHA256 fallback for testing
-    hashed = hashlib.sha256(password.encode()).hexdigest()
-    logger.debug(f"Password hashed using SHA256, hash length: {len(hashed)}")
-    return hashed
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash using bcrypt or SHA256 fallback"""
-    logger.debug(f"Verifying password, plain length: {len(plain_password)}, hash length: {len(hashed_password)}")
-
-    if pwd_context:
-        try:
-            result = pwd_context.verify(plain_password, hashed_password)
-            logger.debug(f"Password verification using bcrypt: {result}")
-            return result
-        except Exception as e:
-            logger.warning(f"Bcrypt verification failed: {e}, falling back to SHA256")
-
-    # Simple SHA256 verification for testing
-    result = hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password
-    logger.debug(f"Password verification using SHA256: {result}")
-    return result
+security = HTTPBearer()
 
 def create_access_token(data: dict):
     """Create JWT access token"""
@@ -79,28 +49,66 @@ def create_access_token(data: dict):
         raise
 
 def verify_token(token: str):
-    """Verify and decode JWT token"""
-    logger.debug(f"Verifying token, length: {len(token)}")
+    """Verify and decode JWT token (cached until the token expires, at most TOKEN_CACHE_TTL)"""
+    key = hashlib.sha256(token.encode()).digest()  # don't keep raw tokens in memory
+    cached = _token_cache.get(key)
+    if cached is not None:
+        return dict(cached)
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        logger.debug(f"Token verified successfully, payload keys: {payload.keys()}")
+        logger.debug("Token verified successfully, payload keys: %s", payload.keys())
+        exp = payload.get("exp")
+        _token_cache.set(key, dict(payload), ttl=exp - time.time() if isinstance(exp, (int, float)) else None)
         return payload
     except JWTError as e:
-        logger.warning(f"Token verification failed: {e}")
+        logger.warning("Token verification failed: %s", e)
         return None
     except Exception as e:
-        logger.error(f"Unexpected error during token verification: {e}", exc_info=True)
+        logger.error("Unexpected error during token verification: %s", e, exc_info=True)
         return None
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(lambda: None)  # Will be overridden by actual dependency
-):
+def user_exists(db: Session, user_id: uuid.UUID) -> bool:
+    """True if the user row exists (positive answers cached for USER_CACHE_TTL)"""
+    key = str(user_id)
+    if _user_cache.get(key):
+        return True
+    exists = db.query(User.id).filter(User.id == user_id).first() is not None
+    if exists:
+        _user_cache.set(key, True)
+    return exists
+
+async def user_exists_async(db: AsyncSession, user_id: uuid.UUID) -> bool:
+    """user_exists for async sessions (shares the cache)"""
+    key = str(user_id)
+    if _user_cache.get(key):
+        return True
+    exists = (await db.execute(select(User.id).where(User.id == user_id).limit(1))).first() is not None
+    if exists:
+        _user_cache.set(key, True)
+    return exists
+
+def invalidate_user(user_id) -> None:
+    """Drop a user from the existence cache (call when a user is deleted)"""
+    _user_cache.pop(str(user_id))
+
+@event.listens_for(User, "after_delete")
+def _on_user_deleted(mapper, connection, target):
+    invalidate_user(target.id)
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_bulk_user_delete(orm_execute_state):
+    # query(User).filter(...).delete() bypasses after_delete; we can't tell which rows went
+    if orm_execute_state.is_delete and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is User:
+        _user_cache.clear()
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Dependency to get current authenticated user
     Raises HTTPException if token is invalid
     Returns dict with user_id
+    (async: no I/O, so it runs on the event loop instead of taking a threadpool thread)
     """
     logger.debug("Getting current user from credentials")
 
@@ -0,0 +1,142 @@
+# Password hashing service
+#
+# bcrypt is deliberately slow (~250ms at cost 12), so hashing and verification
+# run on a dedicated, bounded thread pool instead of the request threadpool:
+# a login burst queues here and can't starve the generation endpoints. The
+# async API (hash_password_async / verify_and_update_async) awaits the pool;
+# when more than BCRYPT_WORKERS + BCRYPT_QUEUE calls are pending new ones are
+# rejected with CryptoBusy (the routes answer 503 + Retry-After).
+#
+# verify_and_update() also returns a replacement hash when the stored one is
+# out of date: bcrypt with a different BCRYPT_ROUNDS, or a legacy unsalted
+# SHA256 hex digest written when bcrypt was unavailable. Callers persist it,
+# so hashes migrate transparently on the next successful login.
+#
+# BCRYPT_ROUNDS    bcrypt work factor (default 12; each +1 doubles the cost)
+# BCRYPT_WORKERS   hashing threads (default: CPU count, at most 4)
+# BCRYPT_QUEUE     calls allowed to wait for a thread (default 64)
+
+import os, hmac, asyncio, hashlib, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+from app.core.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_QUEUE = int(os.getenv("BCRYPT_QUEUE", "64"))
+
+
+class CryptoBusy(Exception):
+    """The hashing pool is saturated; retry later"""
+
+
+def _make_context(rounds:int):
+    """bcrypt CryptContext, or None if the bcrypt backend is unusable (SHA256 fallback)"""
+    try:
+        context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        context.handler("bcrypt").get_backend()  # passlib loads it lazily; fail here, not on first signup
+        logger.info("Bcrypt password context initialized (rounds=%d)", rounds)
+        return context
+    except Exception as e:
+        logger.warning("Bcrypt initialization failed: %s, will use SHA256 fallback", e)
+        return None
+
+pwd_context = _make_context(BCRYPT_ROUNDS)
+
+
+def _is_legacy_sha256(hashed:str)->bool:
+    return len(hashed) == 64 and all(c in "0123456789abcdef" for c in hashed)
+
+def _sha256(password:str)->str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def hash_password(password:str)->str:
+    """Hash password using bcrypt or SHA256 fallback (blocking)"""
+    if pwd_context:
+        try:
+            return pwd_context.hash(password)
+        except Exception as e:
+            logger.warning("Bcrypt hashing failed: %s, falling back to SHA256", e)
+    return _sha256(password)
+
+def verify_and_update(password:str, hashed:str)->tuple:
+    """(valid, new_hash) (blocking); new_hash is set when the stored hash should be replaced"""
+    if _is_legacy_sha256(hashed):
+        valid = hmac.compare_digest(_sha256(password), hashed)
+        logger.debug("Password verification using SHA256: %s", valid)
+        if valid and pwd_context:
+            return True, hash_password(password)
+        return valid, None
+    if not pwd_context:
+        return False, None
+    try:
+        valid, new_hash = pwd_context.verify_and_update(password, hashed)
+        logger.debug("Password verification using bcrypt: %s", valid)
+        return valid, new_hash
+    except Exception as e:  # malformed hash, or a password bcrypt refuses
+        logger.warning("Bcrypt verification failed: %s", e)
+        return False, None
+
+def verify_password(password:str, hashed:str)->bool:
+    return verify_and_update(password, hashed)[0]
+
+
+class _CryptoPool:
+    """ThreadPoolExecutor with a cap on pending work"""
+
+    def __init__(self, workers:int, queue:int):
+        self.workers = workers
+        self.limit = workers + queue
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._executor
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise CryptoBusy(f"{self.limit} password hashes already pending")
+        with self._lock:
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+            self._slots.release()
+
+
+_pool = _CryptoPool(BCRYPT_WORKERS, BCRYPT_QUEUE)
+
+if hasattr(os, "register_at_fork"):
+    # threads don't survive fork; a child must not inherit a dead executor
+    os.register_at_fork(after_in_child=lambda: setattr(_pool, "_executor", None))
+
+
+async def hash_password_async(password:str)->str:
+    """hash_password on the bcrypt pool; raises CryptoBusy when saturated"""
+    return await _pool.run(hash_password, password)
+
+async def verify_and_update_async(password:str, hashed:str)->tuple:
+    """verify_and_update on the bcrypt pool; raises CryptoBusy when saturated"""
+    return await _pool.run(verify_and_update, password, hashed)
+
+
+register_collector("auth_crypto", lambda: [
+    ("auth_crypto_pending", "gauge", "Password hashes queued or running", [({}, _pool.pending)]),
+    ("auth_crypto_completed_total", "counter", "Password hashes completed", [({}, _pool.completed)]),
+    ("auth_crypto_rejected_total", "counter", "Password hashes rejected because the pool was full", [({}, _pool.rejected)]),
+])
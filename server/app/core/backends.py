@@ -0,0 +1,263 @@
+# Pluggable LLM backends
+#
+# call_llm_response() (app.core.llm) asks get_backend() for the process-wide
+# backend, chosen by LLM_BACKEND:
+# - "gemini" (default): Google Gemini via google-genai
+# - "stub": local, deterministic, schema-valid output grounded in the prompt's
+#   profile, with configurable latency and failure injection. No API key or
+#   network needed, so the render/compile/DB path can be load-tested offline.
+
+import os, re, json, time, random, logging, threading
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+from google import genai
+from google.genai.types import Schema, GenerateContentConfig, HttpOptions
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponse(NamedTuple):
+    text: str
+    finish_reason: str  # "STOP", "MAX_TOKENS", ... ("" if the API didn't report one)
+
+
+class LLMBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    def generate(self, system:str, prompt:str, response_schema:Schema, max_output_tokens:int)->LLMResponse:
+        """One structured-output generation. Errors carrying a retryable HTTP
+        `code` (429/5xx) are retried by the scheduler."""
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, model:str=None):
+        self.model = model or os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, api_key:str):
+        # one client (and HTTP connection pool) per key instead of one per call;
+        # GEMINI_BASE_URL points it at a local fake server (tests/fake_llm_server.py)
+        base_url = os.getenv("GEMINI_BASE_URL")
+        with self._lock:
+            client = self._clients.get((api_key, base_url))
+            if client is None:
+                client = genai.Client(api_key=api_key, http_options=HttpOptions(base_url=base_url) if base_url else None)
+                self._clients[(api_key, base_url)] = client
+            return client
+
+    def generate(self, system:str, prompt:str, response_schema:Schema, max_output_tokens:int)->LLMResponse:
+        # hot path: %-style args so nothing is formatted unless the level is enabled
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            logger.error("=== LLM ERROR === GEMINI_API_KEY environment variable not set")
+            raise RuntimeError("GEMINI_API_KEY not set")
+
+        logger.info("=== LLM CALL START === model=%s, prompt=%d chars, max_tokens=%d", self.model, len(prompt), max_output_tokens)
+
+        try:
+            client = self._client(api_key)
+            cfg = GenerateContentConfig(
+                response_mime_type="application/json",
+                # strict schema derived from the LLMOutput models (see app.core.schema)
+                response_schema=response_schema,
+                temperature=0.2,
+                top_p=0.9,
+                candidate_count=1,
+                max_output_tokens=max_output_tokens,
+            )
+
+            response = client.models.generate_content(
+                model=self.model,
+                contents=[f"{system}\n\n{prompt}"],
+                config=cfg,
+            )
+            logger.debug("LLM response candidates count: %s", len(response.candidates) if getattr(response, 'candidates', None) else 'N/A')
+
+            # Check for blocking or safety issues
+            if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+                logger.info("LLM prompt feedback: %s", response.prompt_feedback)
+                if hasattr(response.prompt_feedback, 'block_reason') and response.prompt_feedback.block_reason:
+                    logger.error("=== LLM ERROR === Prompt blocked! Reason: %s", response.prompt_feedback.block_reason)
+                    raise RuntimeError(f"LLM prompt blocked: {response.prompt_feedback.block_reason}")
+
+            # Check if we have candidates
+            finish_reason = ""
+            if hasattr(response, 'candidates') and response.candidates:
+                candidate = response.candidates[0]
+                if hasattr(candidate, 'finish_reason') and candidate.finish_reason:
+                    # FinishReason is an enum; str() of it is "FinishReason.STOP", not "STOP"
+                    finish_reason = getattr(candidate.finish_reason, 'name', str(candidate.finish_reason))
+                    if finish_reason != 'STOP':
+                        logger.warning("LLM finished with non-STOP reason: %s", finish_reason)
+
+                if hasattr(candidate, 'safety_ratings'):
+                    logger.debug("LLM safety ratings: %s", candidate.safety_ratings)
+
+            # Get the actual text response
+            result = response.text if response.text else None
+
+            if not result:
+                logger.error("=== LLM ERROR === Returned empty response! Full response object: %s", response)
+                raise RuntimeError("LLM returned empty response. Check prompt feedback and safety ratings above.")
+
+            logger.info("=== LLM CALL SUCCESS === Response length: %d chars, finish reason: %s", len(result), finish_reason)
+            logger.debug("LLM response preview (first 200 chars): %.200s", result)
+            return LLMResponse(result, finish_reason)
+
+        except Exception as e:
+            logger.error("=== LLM CALL ERROR === %s: %s", type(e).__name__, e, exc_info=True)
+            logger.debug("Prompt that caused error (first 500 chars): %.500s", prompt)
+            raise
+
+
+SECTIONS = ("resume", "cover_letter", "ats")
+
+def grounded_output(prompt:str, jd_text:str=None)->dict:
+    """Schema-valid LLM output that only uses facts from the prompt's PROFILE_MIN (and its JD_TEXT unless given)"""
+    m = re.search(r"PROFILE_MIN:\n(.*?)\n\n", prompt, re.S)
+    profile = json.loads(m.group(1)) if m else {}
+    if jd_text is None:
+        jd = re.search(r"JD_TEXT:\n(.*?)\n\nPRESELECTED_PROFILE_BULLETS:", prompt, re.S)
+        jd_text = jd.group(1) if jd else ""
+    jd_words = set(re.findall(r"[A-Za-z0-9\+\#]+", jd_text.lower()))
+    skills = profile.get("skills", [])
+    roles = profile.get("experience", [])
+    bullets = [b for r in roles for b in r.get("bullets", [])]
+    return {
+        "resume": {
+            "summary": profile.get("summary") or f"{profile.get('name', 'Candidate')} - experienced professional",
+            "skills_line": skills[:10],
+            "experience": [{
+                "title": r.get("title", ""),
+                "company": r.get("company", ""),
+                "start": r.get("start") or "",
+                "end": r.get("end") or "",
+                "bullets": r.get("bullets", [])[:4],
+            } for r in roles],
+            "projects": [{"name": p.get("name", ""), "stack": p.get("stack", []), "bullets": p.get("bullets", [])[:2]}
+                         for p in profile.get("projects", [])],
+            "education": [{"school": e.get("school", ""), "degree": e.get("degree", ""),
+                           "period": " - ".join(x for x in (e.get("start"), e.get("end")) if x)}
+                          for e in profile.get("education", [])],
+        },
+        "cover_letter": {
+            "address": "Hiring Team",
+            "intro": "I am excited to apply for this role.",
+            "why_you": "My experience maps directly onto your requirements.",
+            "evidence": bullets[:3],
+            "why_them": "Your mission and team are a strong fit for me.",
+            "close": "Thank you for your consideration.",
+        },
+        "ats": {
+            "jd_keywords_matched": [s for s in skills if s.lower() in jd_words],
+            "risks": [],
+        },
+    }
+
+def shape_for_schema(doc:dict, properties:list):
+    """Return only what the response schema asks for (full output, some sections, or one section)"""
+    if not properties or set(properties) <= set(SECTIONS):
+        return {k: doc[k] for k in (properties or SECTIONS)}
+    for name in SECTIONS:
+        if set(properties) <= set(doc[name]):
+            return doc[name]
+    return doc
+
+
+def grounded_batch_output(prompt:str, item_properties:list)->dict:
+    """Batched answer (app.core.batch): one grounded item per BATCH_JOBS entry"""
+    m = re.search(r"BATCH_JOBS:\n(.*?)\n\n", prompt, re.S)
+    jobs = json.loads(m.group(1)) if m else []
+    sections = [p for p in item_properties if p != "job_key"]
+    return {"results": [{"job_key": job["job_key"], **shape_for_schema(grounded_output(prompt, job["jd_text"]), sections)}
+                        for job in jobs]}
+
+
+class StubAPIError(RuntimeError):
+    """Injected failure shaped like a google-genai APIError (has .code)"""
+
+    def __init__(self, code:int):
+        super().__init__(f"{code} injected by stub LLM backend")
+        self.code = code
+        self.response = None
+
+
+class StubBackend(LLMBackend):
+    """Deterministic local backend for offline load tests.
+
+    latency (+/- latency_jitter) seconds per call; failure_rate of calls raise
+    StubAPIError(failure_code); truncate_rate of calls return half the text
+    with finish reason MAX_TOKENS. Randomness is seeded, so runs are repeatable.
+    """
+    name = "stub"
+
+    def __init__(self, latency:float=0.0, latency_jitter:float=0.0, failure_rate:float=0.0,
+                 failure_code:int=429, truncate_rate:float=0.0, seed:int=0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.failure_code = failure_code
+        self.truncate_rate = truncate_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=float(os.getenv("STUB_LLM_LATENCY", "0")),
+            latency_jitter=float(os.getenv("STUB_LLM_LATENCY_JITTER", "0")),
+            failure_rate=float(os.getenv("STUB_LLM_FAILURE_RATE", "0")),
+            failure_code=int(os.getenv("STUB_LLM_FAILURE_CODE", "429")),
+            truncate_rate=float(os.getenv("STUB_LLM_TRUNCATE_RATE", "0")),
+            seed=int(os.getenv("STUB_LLM_SEED", "0")),
+        )
+
+    def generate(self, system:str, prompt:str, response_schema:Schema, max_output_tokens:int)->LLMResponse:
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.latency_jitter, self.latency_jitter))
+            fail = self._rng.random() < self.failure_rate
+            truncate = self._rng.random() < self.truncate_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise StubAPIError(self.failure_code)
+        properties = list((response_schema.properties or {}) if response_schema is not None else {})
+        if properties == ["results"]:
+            doc = grounded_batch_output(prompt, list(response_schema.properties["results"].items.properties))
+        else:
+            doc = shape_for_schema(grounded_output(prompt), properties)
+        text = json.dumps(doc, ensure_ascii=False)
+        if truncate:
+            return LLMResponse(text[:len(text) // 2], "MAX_TOKENS")
+        return LLMResponse(text, "STOP")
+
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+_backend: Optional[LLMBackend] = None
+_backend_lock = threading.Lock()
+
+def get_backend()->LLMBackend:
+    """Process-wide backend, created from LLM_BACKEND on first use"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.getenv("LLM_BACKEND", "gemini").lower()
+            if name not in BACKENDS:
+                raise RuntimeError(f"Unknown LLM_BACKEND: {name} (expected one of {', '.join(BACKENDS)})")
+            cls = BACKENDS[name]
+            _backend = cls.from_env() if hasattr(cls, "from_env") else cls()
+            logger.info(f"LLM backend: {_backend.name}")
+        return _backend
+
+def set_backend(backend:Optional[LLMBackend]):
+    """Swap the process-wide backend (tests, benchmarks); None re-reads LLM_BACKEND"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
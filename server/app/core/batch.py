@@ -0,0 +1,152 @@
+# Batched tailoring
+#
+# With many short JDs per request the per-call overhead dominates, and every
+# job resends the same profile in its own prompt. Batched mode packs several
+# jobs of one profile into a single LLM request (the profile once, then each
+# job's region rules, JD and preselected bullets) answered with an array of
+# outputs keyed by job. Jobs are packed greedily, in order, under the token
+# limits below; jobs asking for different documents (JobJD.outputs) go in
+# separate requests, as the item schema is shared. An item that is missing,
+# cut off or fails validation is left to the per-job pipeline: one individual
+# call (with repair) for just that job. A failed batch request falls back the
+# same way for all of its jobs.
+#
+# TAILOR_BATCH_MAX_JOBS             jobs per request (default 1: batching off)
+# TAILOR_BATCH_MAX_INPUT_TOKENS     estimated prompt tokens per request (default 24000)
+# TAILOR_BATCH_MAX_OUTPUT_TOKENS    max_output_tokens of a batched request (default 16000)
+# TAILOR_BATCH_ITEM_OUTPUT_TOKENS   output tokens budgeted per job (default 1500)
+
+import os, json, logging, threading
+from collections import Counter
+from typing import Optional
+from .llm import build_batch_prompt, call_llm_response
+from .metrics import register_collector, span
+from .rate_limit import estimate_tokens
+from .repair import parse_llm_json
+from .schema import batch_schema, output_model, sections_for
+from .tailor import select_topk_bullets, region_rules
+from .validate import business_rules_check
+from app.models import Profile, LLMOutput
+
+logger = logging.getLogger(__name__)
+
+TAILOR_BATCH_MAX_JOBS = int(os.getenv("TAILOR_BATCH_MAX_JOBS", "1"))
+TAILOR_BATCH_MAX_INPUT_TOKENS = int(os.getenv("TAILOR_BATCH_MAX_INPUT_TOKENS", "24000"))
+TAILOR_BATCH_MAX_OUTPUT_TOKENS = int(os.getenv("TAILOR_BATCH_MAX_OUTPUT_TOKENS", "16000"))
+TAILOR_BATCH_ITEM_OUTPUT_TOKENS = int(os.getenv("TAILOR_BATCH_ITEM_OUTPUT_TOKENS", "1500"))
+
+_stats_lock = threading.Lock()
+BATCH_STATS: Counter = Counter()
+
+def _count(key:str, n:int=1):
+    with _stats_lock:
+        BATCH_STATS[key] += n
+
+def batch_stats()->dict:
+    """Snapshot of batching counters (requests, jobs batched, items kept, fallbacks)"""
+    with _stats_lock:
+        return dict(BATCH_STATS)
+
+register_collector("tailor_batch", lambda: [
+    ("tailor_batch_events_total", "counter", "Batched tailoring requests and per-job outcomes",
+     [({"event": key}, n) for key, n in sorted(batch_stats().items())]),
+])
+
+
+def pack(items:list, fixed_tokens:int, max_jobs:int=None, max_input_tokens:int=None,
+         max_output_tokens:int=None, item_output_tokens:int=None)->list:
+    """Group item indexes into batches.
+
+    `items` are (sections, tokens) per job; a batch shares its sections and
+    stays within max_jobs, fixed_tokens (the shared prompt) plus its items'
+    tokens <= max_input_tokens, and item_output_tokens per item <=
+    max_output_tokens. A job that fits nowhere else ends up alone.
+    """
+    max_jobs = TAILOR_BATCH_MAX_JOBS if max_jobs is None else max_jobs
+    max_input_tokens = TAILOR_BATCH_MAX_INPUT_TOKENS if max_input_tokens is None else max_input_tokens
+    max_output_tokens = TAILOR_BATCH_MAX_OUTPUT_TOKENS if max_output_tokens is None else max_output_tokens
+    item_output_tokens = TAILOR_BATCH_ITEM_OUTPUT_TOKENS if item_output_tokens is None else item_output_tokens
+    max_items = max(1, min(max_jobs, max_output_tokens // max(1, item_output_tokens)))
+
+    batches, open_batches = [], {}  # sections -> (indexes, tokens) still being filled
+    for i, (sections, tokens) in enumerate(items):
+        indexes, used = open_batches.get(sections, ([], fixed_tokens))
+        if indexes and (len(indexes) >= max_items or used + tokens > max_input_tokens):
+            batches.append(indexes)
+            indexes, used = [], fixed_tokens
+        indexes.append(i)
+        open_batches[sections] = (indexes, used + tokens)
+    batches.extend(indexes for indexes, _ in open_batches.values())
+    return sorted(batches)
+
+
+def _run_batch(profile:Profile, profile_min_json:str, items:list, indexes:list, sections:tuple, lane:str)->dict:
+    """One batched request; index -> LLMOutput for the items that came back valid"""
+    schema, schema_json = batch_schema(sections)
+    prompt = build_batch_prompt(profile_min_json, json.dumps([items[i] for i in indexes], ensure_ascii=False), schema_json)
+    _count("requests")
+    _count("jobs_batched", len(indexes))
+    try:
+        with span("llm_batch"):
+            response = call_llm_response(prompt, response_schema=schema, lane=lane,
+                                         max_output_tokens=min(TAILOR_BATCH_MAX_OUTPUT_TOKENS, len(indexes) * TAILOR_BATCH_ITEM_OUTPUT_TOKENS))
+    except Exception as e:
+        logger.warning("Batched tailoring request for %d jobs failed, tailoring them individually: %s", len(indexes), e)
+        _count("request_failures")
+        _count("fallbacks", len(indexes))
+        return {}
+
+    results = [r for r in parse_llm_json(response.text).get("results") or [] if isinstance(r, dict)]
+    if response.finish_reason == "MAX_TOKENS" and results:
+        results.pop()  # the last item may have been cut mid-string: redo it on its own
+    by_key = {str(r.get("job_key")): r for r in results}
+
+    model, outs = output_model(sections), {}
+    for i in indexes:
+        item = by_key.get(items[i]["job_key"])
+        try:
+            if item is None:
+                raise ValueError("missing from the batched answer")
+            out = LLMOutput(**dict(model.model_validate({s: item.get(s) for s in sections})))
+            business_rules_check(out, profile)
+        except ValueError as e:  # pydantic ValidationError included
+            logger.info("Batched item %s rejected, tailoring it individually: %s", items[i]["job_key"], e)
+            _count("fallbacks")
+            continue
+        outs[i] = out
+        _count("items_ok")
+    return outs
+
+
+def tailor_batched(profile:Profile, jobs:list, lane:str="interactive", bullets:list=None)->list:
+    """LLMOutput per job from batched requests; None for a job left to an individual run_tailor() call.
+
+    All None when batching is off (TAILOR_BATCH_MAX_JOBS <= 1) or there is only one job.
+    """
+    outs: list[Optional[LLMOutput]] = [None] * len(jobs)
+    if TAILOR_BATCH_MAX_JOBS <= 1 or len(jobs) < 2:
+        return outs
+
+    profile_min_json = profile.model_dump_json()
+    items, packing = [], []
+    for i, job in enumerate(jobs):
+        item = {
+            "job_key": str(i),
+            "region_rules": region_rules(job.region),
+            "jd_text": job.jd_text,
+            "preselected_profile_bullets": select_topk_bullets(profile, job.jd_text, index=bullets),
+        }
+        items.append(item)
+        packing.append((sections_for(job.outputs), estimate_tokens(json.dumps(item, ensure_ascii=False))))
+
+    # the shared part of every batched prompt: profile, instructions and the widest schema
+    fixed_tokens = estimate_tokens(build_batch_prompt(profile_min_json, "", batch_schema(sections_for(None))[1]))
+    for indexes in pack(packing, fixed_tokens):
+        if len(indexes) < 2:
+            continue  # a lone job goes through the individual path unchanged
+        outs_by_index = _run_batch(profile, profile_min_json, items, indexes, packing[indexes[0]][0], lane)
+        for i, out in outs_by_index.items():
+            outs[i] = out
+    logger.info("Batched tailoring: %d of %d jobs tailored in batches, stats: %s",
+                sum(out is not None for out in outs), len(jobs), batch_stats())
+    return outs
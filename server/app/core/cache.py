@@ -0,0 +1,70 @@
+# Small in-process TTL cache
+#
+# Thread-safe LRU with a per-entry expiry, plus hit/miss counters exported
+# on /metrics. Per process: every web/Celery worker has its own copy, so TTLs
+# bound how long a stale entry can survive on another worker.
+
+import time, threading
+from collections import OrderedDict
+from .metrics import register_collector
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, name:str, maxsize:int=10000, ttl:float=60.0, clock=time.monotonic):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches[name] = self
+
+    def get(self, key, default=None):
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl:float=None):
+        """Store value for `ttl` seconds (default: the cache TTL); ttl <= 0 is a no-op"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+_caches = {}
+
+register_collector("caches", lambda: [
+    ("cache_hits_total", "counter", "In-process cache hits", [({"cache": n}, c.hits) for n, c in _caches.items()]),
+    ("cache_misses_total", "counter", "In-process cache misses", [({"cache": n}, c.misses) for n, c in _caches.items()]),
+    ("cache_entries", "gauge", "In-process cache size", [({"cache": n}, len(c)) for n, c in _caches.items()]),
+])
@@ -0,0 +1,255 @@
+# Generation engine
+#
+# The one tailor -> render -> compile -> artifact pipeline behind POST
+# /generate, /history/{run_id}/regenerate and the Celery process_generation
+# task. Callers only differ in what they do with the results (persist runs,
+# upload to S3); anything that speeds up a job lands here once.
+#
+# Jobs of a batch run on a pluggable strategy:
+#   inline   one after another in the calling thread (default)
+#   thread   a thread pool; LLM calls and latexmk release the GIL
+#   process  a process pool (spawned workers; logs, metrics and the LLM
+#            scheduler are per process)
+#   celery   one generate_job task per job, waited on by the caller. The
+#            workers must share ART_DIR with the web process. Inside a Celery
+#            task it falls back to inline: a task blocking on its own
+#            subtasks can deadlock the worker pool.
+#
+# With TAILOR_BATCH_MAX_JOBS > 1 the LLM step of a batch runs first, several
+# jobs per request (app.core.batch); the strategy then renders and compiles,
+# tailoring individually only the jobs a batched answer didn't cover.
+#
+# Regenerating a past run (GenerationEngine.regenerate) is a single job and
+# always inline; see app.core.incremental for what it reuses.
+#
+# GENERATION_STRATEGY   inline | thread | process | celery (default inline)
+# GENERATION_WORKERS    pool size for thread/process (default 4)
+
+import os, logging, contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+from typing import NamedTuple, Optional
+from app.models import DOCUMENTS, Profile, JobJD, LLMOutput
+from .tailor import run_tailor
+from .batch import tailor_batched
+from .incremental import Previous, tailor_sections, reuse_pdf
+from .tex_compile import RenderContext, render_tex, compile_tex, bundle, templates_for
+from .metrics import span
+
+logger = logging.getLogger(__name__)
+
+GENERATION_STRATEGY = os.getenv("GENERATION_STRATEGY", "inline").lower()
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "4"))
+
+TEX_PREVIEW_CHARS = 1000
+
+
+class GenerationError(Exception):
+    """Tailoring (LLM call or output validation) failed for a job"""
+
+
+class JobResult(NamedTuple):
+    job: JobJD
+    out: LLMOutput
+    artifact: dict  # job_id, region, /artifacts/ URLs, pdf_compilation (+ LaTeX sources with include_tex)
+    resume_tex: Optional[str]  # local paths; None for a document not in job.outputs
+    cover_letter_tex: Optional[str]
+    resume_pdf: Optional[str]  # None if compilation failed
+    cover_letter_pdf: Optional[str]
+
+
+def result_to_dict(result:JobResult)->dict:
+    """JSON-safe form of a JobResult (Celery results)"""
+    return {**result._asdict(), "job": result.job.model_dump(), "out": result.out.model_dump()}
+
+def result_from_dict(data:dict)->JobResult:
+    return JobResult(**{**data, "job": JobJD(**data["job"]), "out": LLMOutput(**data["out"])})
+
+
+def _pdf_path(tex_path:str, compiled:bool)->Optional[str]:
+    pdf_path = os.path.splitext(tex_path)[0] + ".pdf"
+    return pdf_path if compiled and os.path.exists(pdf_path) else None
+
+
+def run_job(run_id:str, profile:Profile, job:JobJD, contexts:RenderContext=None, bullets:list=None,
+            lane:str="interactive", include_tex:bool=False, previous:Previous=None, out:LLMOutput=None)->JobResult:
+    """Tailor, render and compile one job; raises GenerationError if tailoring fails.
+    With `previous` only its stale sections are tailored and unchanged PDFs are reused;
+    `out` is an output already tailored for the job (batched), used as is."""
+    job_name = job.id or job.title
+    with span("generate_job", region=job.region):
+        try:
+            if out is not None:
+                pass
+            elif previous is None:
+                out = run_tailor(profile, job, lane=lane, bullets=bullets)
+            else:
+                out = tailor_sections(profile, job, previous.llm_output, previous.sections, lane=lane, bullets=bullets)
+            logger.info("LLM processing completed for job: %s", job_name)
+        except Exception as e:
+            logger.error("LLM/validation error for job %s: %s", job_name, e)
+            raise GenerationError(f"LLM/validation error: {e}") from e
+
+        base = f"{run_id}_{job_name.replace(' ', '_')}"
+        resume_ctx, cover_letter_ctx = (contexts or RenderContext(profile)).for_job(job, out)
+        # only the documents in job.outputs are rendered
+        tex_paths = {doc: path for doc, path in zip(DOCUMENTS, render_tex(resume_ctx, cover_letter_ctx, job.region, base)) if path}
+
+        logger.info("Starting PDF compilation for job: %s (%s)", job_name, ", ".join(job.outputs))
+        templates = dict(zip(DOCUMENTS, templates_for(job.region)))
+        reuse = previous.pdfs if previous is not None else None
+        compiled, pdf_paths = {}, {}
+        for doc, tex_path in tex_paths.items():
+            compiled[doc] = (reuse is not None and reuse_pdf(doc, tex_path, reuse.get(doc))) \
+                or compile_tex(tex_path, region=job.region, template=templates[doc])
+            pdf_paths[doc] = _pdf_path(tex_path, compiled[doc])
+
+        now = datetime.now().isoformat()
+        artifact = {
+            "job_id": job_name,
+            "region": job.region,
+            **{f"{doc}_tex": f"/artifacts/{os.path.basename(tex_path)}" for doc, tex_path in tex_paths.items()},
+            "created_at": now,
+            "updated_at": now,
+            "pdf_compilation": {f"{doc}_success": ok for doc, ok in compiled.items()},
+        }
+        for doc, pdf_path in pdf_paths.items():
+            if pdf_path:
+                artifact[f"{doc}_pdf"] = f"/artifacts/{os.path.basename(pdf_path)}"
+                logger.info("%s PDF ready for download: %s", doc, artifact[f"{doc}_pdf"])
+            else:
+                logger.warning("%s PDF compilation failed for job %s - TEX file available", doc, job_name)
+
+        if include_tex:  # the /generate response previews the LaTeX sources
+            for doc, tex_path in tex_paths.items():
+                with open(tex_path, encoding="utf-8") as f:
+                    content = f.read()
+                artifact[f"{doc}_tex_content"] = content
+                artifact[f"{doc}_tex_preview"] = content[:TEX_PREVIEW_CHARS] + "..." if len(content) > TEX_PREVIEW_CHARS else content
+
+    return JobResult(job, out, artifact, tex_paths.get("resume"), tex_paths.get("cover_letter"),
+                     pdf_paths.get("resume"), pdf_paths.get("cover_letter"))
+
+
+def _run_job_in_process(run_id, profile, job, bullets, lane, include_tex, out):
+    # RenderContext's frozen mappings don't pickle; the worker builds its own
+    return result_to_dict(run_job(run_id, profile, job, None, bullets, lane, include_tex, out=out))
+
+
+class InlineStrategy:
+    name = "inline"
+
+    def map(self, run_id:str, profile:Profile, jobs:list, contexts:RenderContext, bullets:list, lane:str, include_tex:bool,
+            outs:list=None)->list:
+        """JobResults in job order; `outs` holds the batched LLMOutput (or None) per job"""
+        return [run_job(run_id, profile, job, contexts, bullets, lane, include_tex, out=out)
+                for job, out in zip(jobs, outs or [None] * len(jobs))]
+
+
+class ThreadPoolStrategy:
+    name = "thread"
+
+    def __init__(self, workers:int=GENERATION_WORKERS):
+        self.workers = workers
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="generate")
+        return self._executor
+
+    def map(self, run_id, profile, jobs, contexts, bullets, lane, include_tex, outs=None):
+        if len(jobs) <= 1:
+            return InlineStrategy().map(run_id, profile, jobs, contexts, bullets, lane, include_tex, outs)
+        executor = self._get_executor()
+        # copy the caller's context into each job so spans stay children of the request's trace
+        futures = [executor.submit(contextvars.copy_context().run, run_job, run_id, profile, job, contexts, bullets, lane, include_tex,
+                                   None, out)
+                   for job, out in zip(jobs, outs or [None] * len(jobs))]
+        return [f.result() for f in futures]
+
+
+class ProcessPoolStrategy:
+    name = "process"
+
+    def __init__(self, workers:int=GENERATION_WORKERS):
+        self.workers = workers
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            import multiprocessing
+            # spawn, not fork: the web process has threads (and pooled DB connections)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def map(self, run_id, profile, jobs, contexts, bullets, lane, include_tex, outs=None):
+        executor = self._get_executor()
+        futures = [executor.submit(_run_job_in_process, run_id, profile, job, bullets, lane, include_tex, out)
+                   for job, out in zip(jobs, outs or [None] * len(jobs))]
+        return [result_from_dict(f.result()) for f in futures]
+
+
+class CeleryStrategy:
+    name = "celery"
+
+    def map(self, run_id, profile, jobs, contexts, bullets, lane, include_tex, outs=None):
+        from celery import current_task, group
+        from app.queue.tasks import generate_job
+        if current_task and current_task.request.id:
+            return InlineStrategy().map(run_id, profile, jobs, contexts, bullets, lane, include_tex, outs)
+        profile_data = profile.model_dump()
+        results = group(generate_job.s(run_id, profile_data, job.model_dump(), lane, include_tex, out.model_dump() if out else None)
+                        for job, out in zip(jobs, outs or [None] * len(jobs))).apply_async()
+        return [result_from_dict(d) for d in results.get()]  # re-raises a job's GenerationError
+
+
+STRATEGIES = {"inline": InlineStrategy, "thread": ThreadPoolStrategy, "process": ProcessPoolStrategy, "celery": CeleryStrategy}
+
+
+class GenerationEngine:
+    """Runs batches of jobs for one profile on an execution strategy"""
+
+    def __init__(self, strategy=None):
+        self.strategy = strategy or InlineStrategy()
+
+    def run(self, run_id:str, profile:Profile, jobs:list, parsed=None, lane:str="interactive",
+            include_tex:bool=False)->list:
+        """JobResults in job order. `parsed` (app.core.profiles.ParsedProfile) supplies the
+        cached profile dump and bullet index; raises GenerationError on the first failed job."""
+        if parsed is not None:
+            profile = parsed.legacy
+        contexts = RenderContext(profile, parsed.legacy_dump if parsed is not None else None)  # profile serialized once per batch
+        bullets = parsed.bullets if parsed is not None else None
+        logger.info("Generating %d jobs for run_id %s (strategy=%s)", len(jobs), run_id, self.strategy.name)
+        jobs = list(jobs)
+        outs = tailor_batched(profile, jobs, lane=lane, bullets=bullets)  # all None unless batching is on
+        return self.strategy.map(run_id, profile, jobs, contexts, bullets, lane, include_tex, outs)
+
+    def regenerate(self, run_id:str, parsed, job:JobJD, previous:Previous, lane:str="bulk")->JobResult:
+        """Redo one job of an earlier run for the `parsed` profile, reusing what `previous` allows"""
+        logger.info("Regenerating job %s for run_id %s (sections: %s)", job.id or job.title, run_id, list(previous.sections))
+        return run_job(run_id, parsed.legacy, job, RenderContext(parsed.legacy, parsed.legacy_dump), parsed.bullets,
+                       lane, previous=previous)
+
+    def bundle(self, run_id:str)->str:
+        return bundle(run_id)
+
+
+_engine = None
+
+def get_engine()->GenerationEngine:
+    """The process-wide engine, on the GENERATION_STRATEGY strategy"""
+    global _engine
+    if _engine is None:
+        strategy = STRATEGIES.get(GENERATION_STRATEGY)
+        if strategy is None:
+            logger.warning("Unknown GENERATION_STRATEGY %r, using inline", GENERATION_STRATEGY)
+            strategy = InlineStrategy
+        _engine = GenerationEngine(strategy())
+    return _engine
+
+
+if hasattr(os, "register_at_fork"):
+    # pools don't survive fork (gunicorn/Celery prefork children start their own)
+    os.register_at_fork(after_in_child=lambda: globals().__setitem__("_engine", None))
@@ -0,0 +1,156 @@
+# Incremental regeneration
+#
+# /history/{run_id}/regenerate used to redo the whole job: a full LLM call and
+# both LaTeX compiles, even when the profile had only gained a skill. Runs now
+# record a fingerprint of the profile fields they were generated from
+# (Run.profile_fingerprint); regenerating diffs it against the current
+# profile, asks the LLM only for the output sections those fields feed
+# (SECTION_INPUTS), keeps the other sections of the original Run.llm_output,
+# and recompiles only the documents whose rendered LaTeX changed: the PDF of
+# an identical source is copied from the original run (see reuse_pdf()).
+# A change to name or contacts alone only re-renders.
+#
+# Runs without a fingerprint (generated before it was recorded, or by the
+# Celery batch task) regenerate in full.
+
+import os, json, shutil, hashlib, logging, threading
+from collections import Counter
+from typing import NamedTuple, Optional
+from .llm import build_user_prompt, build_regeneration_prompt, call_llm_response
+from .metrics import register_collector, span
+from .repair import parse_llm_json, repair_output
+from .schema import OUTPUT_SECTION_MODELS, output_model, sections_for, sections_schema
+from .tailor import run_tailor, select_topk_bullets, region_rules
+from .validate import business_rules_check
+from app.models import Profile, JobJD, LLMOutput
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ("name", "contacts", "summary", "skills", "experience", "projects", "education")
+
+# output section -> the profile fields its content is tailored from
+SECTION_INPUTS = {
+    "resume": ("summary", "skills", "experience", "projects", "education"),
+    "cover_letter": ("summary", "experience", "projects"),  # evidence is drawn from roles and projects
+    "ats": ("summary", "skills", "experience", "projects"),
+}
+
+_stats_lock = threading.Lock()
+REGENERATE_STATS: Counter = Counter()
+
+def _count(key:tuple, n:int=1):
+    with _stats_lock:
+        REGENERATE_STATS[key] += n
+
+def regenerate_stats()->dict:
+    """Snapshot of (kind, name, outcome) -> count for sections and documents"""
+    with _stats_lock:
+        return dict(REGENERATE_STATS)
+
+register_collector("regenerate", lambda: [
+    ("regenerate_sections_total", "counter", "Output sections regenerated or reused by incremental regeneration",
+     [({"section": name, "outcome": outcome}, n) for (kind, name, outcome), n in sorted(regenerate_stats().items()) if kind == "section"]),
+    ("regenerate_documents_total", "counter", "Documents recompiled or reused by incremental regeneration",
+     [({"document": name, "outcome": outcome}, n) for (kind, name, outcome), n in sorted(regenerate_stats().items()) if kind == "document"]),
+])
+
+
+class Previous(NamedTuple):
+    """What a regeneration can take over from the original run"""
+    llm_output: dict  # the original Run.llm_output
+    sections: tuple  # output sections to request again, see affected_sections()
+    pdfs: dict  # doc -> (sha256 of its LaTeX source, local PDF path), see app.db.artifacts.reusable_pdfs
+
+
+def profile_fingerprint(profile:Profile)->dict:
+    """sha256 per profile field, stored with each run"""
+    dump = profile.model_dump(mode="json")
+    return {field: hashlib.sha256(json.dumps(dump.get(field), sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+            for field in PROFILE_FIELDS}
+
+
+def changed_fields(old:Optional[dict], new:dict)->list:
+    """Profile fields whose hash differs; every field if there is no old fingerprint"""
+    if not old:
+        return list(PROFILE_FIELDS)
+    return [field for field in PROFILE_FIELDS if old.get(field) != new.get(field)]
+
+
+def affected_sections(old:Optional[dict], new:dict, requested=())->tuple:
+    """Output sections to regenerate: those fed by a changed field, plus any `requested` explicitly"""
+    changed = set(changed_fields(old, new))
+    return tuple(name for name in OUTPUT_SECTION_MODELS
+                 if name in requested or changed.intersection(SECTION_INPUTS[name]))
+
+
+def tailor_sections(profile:Profile, job:JobJD, previous:dict, sections:tuple, lane:str="interactive",
+                    bullets:list=None)->LLMOutput:
+    """run_tailor() that keeps the sections of `previous` (an LLMOutput dump) not listed in `sections`.
+
+    Only the listed sections (of those job.outputs needs) and any `previous`
+    lacks are requested from the LLM; with none there is no LLM call. Falls
+    back to run_tailor() when nothing can be kept.
+    """
+    job_name = job.id or job.title
+    wanted = sections_for(job.outputs)
+    kept = {name: previous[name] for name in wanted
+            if name not in sections and isinstance((previous or {}).get(name), dict)}
+    missing = tuple(name for name in wanted if name not in kept)
+    if not kept:
+        for name in missing:
+            _count(("section", name, "regenerated"))
+        return run_tailor(profile, job, lane=lane, bullets=bullets)
+
+    logger.info("Incremental tailor for job %s: reusing %s, regenerating %s", job_name, list(kept), list(missing))
+    selected = select_topk_bullets(profile, job.jd_text, index=bullets)
+    reg_rules = region_rules(job.region)
+    data = dict(kept)
+    if missing:
+        with span("prompt_build", region=job.region):
+            schema, schema_json = sections_schema(missing)
+            prompt = build_regeneration_prompt(
+                build_user_prompt(
+                    profile_min_json=profile.model_dump_json(),
+                    jd_text=job.jd_text,
+                    region_rules=reg_rules,
+                    selected_bullets_json=json.dumps(selected, ensure_ascii=False),
+                ),
+                json.dumps(kept, ensure_ascii=False), list(missing), schema_json,
+            )
+        with span("llm", region=job.region):
+            fresh = parse_llm_json(call_llm_response(prompt, response_schema=schema, lane=lane).text)
+        data.update({name: fresh.get(name) for name in missing})
+
+    raw = json.dumps(data, ensure_ascii=False)
+    try:
+        with span("validate", region=job.region):
+            out = LLMOutput(**dict(output_model(wanted).model_validate(data)))
+            business_rules_check(out, profile)
+    except ValueError as validation_error:
+        # kept sections can fail too (e.g. a role the profile no longer has): repair re-asks just those
+        logger.warning("Incremental output failed validation for job %s, repairing: %s", job_name, validation_error)
+        with span("repair", region=job.region):
+            out = repair_output(raw, validation_error, profile, job, reg_rules, selected, lane=lane, sections=wanted)
+
+    for name in wanted:
+        _count(("section", name, "regenerated" if name in missing else "reused"))
+    return out
+
+
+def reuse_pdf(doc:str, tex_path:str, reuse:Optional[tuple])->bool:
+    """Copy the earlier PDF next to tex_path if it was compiled from the same LaTeX source.
+
+    `reuse` is (sha256 of the earlier source, its PDF path). Returns False
+    when the source changed or the PDF is gone: the caller compiles.
+    """
+    if reuse:
+        tex_hash, pdf_path = reuse
+        with open(tex_path, "rb") as f:
+            unchanged = hashlib.sha256(f.read()).hexdigest() == tex_hash
+        if unchanged and os.path.isfile(pdf_path):
+            shutil.copyfile(pdf_path, os.path.splitext(tex_path)[0] + ".pdf")
+            _count(("document", doc, "reused"))
+            logger.info("%s LaTeX unchanged, reusing %s", doc, os.path.basename(pdf_path))
+            return True
+    _count(("document", doc, "compiled"))
+    return False
@@ -0,0 +1,147 @@
+# Tolerant JSON parser for LLM output that was cut off (finish reason MAX_TOKENS)
+#
+# json.loads() rejects a document that ends mid-value. This parser walks the
+# same grammar but, on reaching end-of-input, keeps every value it finished
+# plus the containers that were still open. Scalars that were cut off (half a
+# string, a number that may have had more digits) are dropped. Input that is
+# malformed rather than truncated still raises ValueError.
+
+import json
+import re
+from json.decoder import scanstring
+from typing import Any, NamedTuple
+
+_WS = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+class _EOF(Exception):
+    """Input ended before the current scalar was complete"""
+
+
+class SalvageResult(NamedTuple):
+    data: Any
+    complete: bool  # the whole document parsed, nothing was cut off
+    partial_keys: list  # top-level keys whose values were cut off (kept partially or dropped)
+
+
+def _string(s:str, i:int):
+    try:
+        return scanstring(s, i + 1, False)
+    except json.JSONDecodeError as e:
+        if e.msg.startswith("Unterminated") or e.pos >= len(s) - 6:
+            raise _EOF()
+        raise ValueError(str(e))
+
+
+def _value(s:str, i:int):
+    """Returns (value, next_index, complete)"""
+    i = _WS.match(s, i).end()
+    if i >= len(s):
+        raise _EOF()
+    ch = s[i]
+    if ch == "{":
+        return _object(s, i + 1)
+    if ch == "[":
+        return _array(s, i + 1)
+    if ch == '"':
+        value, end = _string(s, i)
+        return value, end, True
+    for word, value in _LITERALS.items():
+        if s.startswith(word, i):
+            return value, i + len(word), True
+        if len(s) - i < len(word) and word.startswith(s[i:]):
+            raise _EOF()
+    m = _NUMBER.match(s, i)
+    if m:
+        if m.end() >= len(s):
+            raise _EOF()  # "12" might have been "1234"
+        text = m.group()
+        return (float(text) if any(c in text for c in ".eE") else int(text)), m.end(), True
+    raise ValueError(f"Unexpected character {ch!r} at {i}")
+
+
+def _object(s:str, i:int, partial_keys:list=None):
+    obj = {}
+    i = _WS.match(s, i).end()
+    if i < len(s) and s[i] == "}":
+        return obj, i + 1, True
+    while True:
+        i = _WS.match(s, i).end()
+        if i >= len(s):
+            return obj, i, False
+        if s[i] != '"':
+            raise ValueError(f"Expected property name at {i}")
+        try:
+            key, i = _string(s, i)
+        except _EOF:
+            return obj, len(s), False
+        i = _WS.match(s, i).end()
+        if i >= len(s):
+            return obj, i, False
+        if s[i] != ":":
+            raise ValueError(f"Expected ':' at {i}")
+        try:
+            value, i, complete = _value(s, i + 1)
+        except _EOF:
+            if partial_keys is not None:
+                partial_keys.append(key)
+            return obj, len(s), False
+        obj[key] = value
+        if not complete:
+            if partial_keys is not None:
+                partial_keys.append(key)
+            return obj, i, False
+        i = _WS.match(s, i).end()
+        if i >= len(s):
+            return obj, i, False
+        if s[i] == "}":
+            return obj, i + 1, True
+        if s[i] != ",":
+            raise ValueError(f"Expected ',' or '}}' at {i}")
+        i += 1
+
+
+def _array(s:str, i:int):
+    arr = []
+    i = _WS.match(s, i).end()
+    if i < len(s) and s[i] == "]":
+        return arr, i + 1, True
+    while True:
+        try:
+            value, i, complete = _value(s, i)
+        except _EOF:
+            return arr, len(s), False
+        arr.append(value)
+        if not complete:
+            return arr, i, False
+        i = _WS.match(s, i).end()
+        if i >= len(s):
+            return arr, i, False
+        if s[i] == "]":
+            return arr, i + 1, True
+        if s[i] != ",":
+            raise ValueError(f"Expected ',' or ']' at {i}")
+        i += 1
+
+
+def salvage_json(raw:str)->SalvageResult:
+    """Parse possibly-truncated JSON, recovering every complete value.
+
+    Raises ValueError if the text is malformed before the point it was cut off.
+    """
+    i = _WS.match(raw, 0).end()
+    if i >= len(raw):
+        return SalvageResult(None, False, [])
+    partial_keys = []
+    try:
+        if raw[i] == "{":
+            data, i, complete = _object(raw, i + 1, partial_keys)
+        else:
+            data, i, complete = _value(raw, i)
+    except _EOF:
+        return SalvageResult(None, False, [])
+    if complete and _WS.match(raw, i).end() != len(raw):
+        raise ValueError(f"Extra data at {i}")
+    return SalvageResult(data, complete, partial_keys)
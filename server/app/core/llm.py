@@ -1,9 +1,12 @@
-import os
 import json
 import logging
 from dotenv import load_dotenv
-from google import genai
-from google.genai.types import Tool, Schema, GenerateContentConfig
+from google.genai.types import Schema
+from .schema import OUTPUT_GEMINI_SCHEMA, OUTPUT_GEMINI_SCHEMA_STR
+from .rate_limit import LLMScheduler, estimate_tokens
+from .backends import LLMResponse, get_backend
+from .metrics import register_collector
+from .tracing import tracer
 
 # Load environment variables
 load_dotenv()
@@ -18,129 +21,114 @@ SYSTEM = (
 "Respect region style rules. Keep concise, metric-first quantitative bullets, each bullet also flowing in the oder <action -> impactful result>"
 )
 
-# Strict JSON Schema for gemini to avoid hallucinations and stick to our convention
-OUTPUT_JSON_SCHEMA = Schema(
-    type="OBJECT",
-    required=["resume","cover_letter","ats"],
-    properties={
-        "resume": Schema(type="OBJECT", required=["summary","skills_line","experience","projects","education"], properties={
-            "summary": Schema(type="STRING"),
-            "skills_line": Schema(type="ARRAY", items=Schema(type="STRING")),
-            "experience": Schema(type="ARRAY", items=Schema(type="OBJECT", required=["title","company","bullets"], properties={
-                "title": Schema(type="STRING"),
-                "company": Schema(type="STRING"),
-                "start": Schema(type="STRING"),
-                "end": Schema(type="STRING"),
-                "bullets": Schema(type="ARRAY", items=Schema(type="STRING")),
-            })),
-            "projects": Schema(type="ARRAY", items=Schema(type="OBJECT", properties={
-                "name": Schema(type="STRING"),
-                "stack": Schema(type="ARRAY", items=Schema(type="STRING")),
-                "bullets": Schema(type="ARRAY", items=Schema(type="STRING")),
-            })),
-            "education": Schema(type="ARRAY", items=Schema(type="OBJECT", properties={
-                "school": Schema(type="STRING"),
-                "degree": Schema(type="STRING"),
-                "period": Schema(type="STRING"),
-            })),
-        }),
-        "cover_letter": Schema(type="OBJECT", required=["address","intro","why_you","evidence","why_them","close"], properties={
-            "address": Schema(type="STRING"),
-            "intro": Schema(type="STRING"),
-            "why_you": Schema(type="STRING"),
-            "evidence": Schema(type="ARRAY", items=Schema(type="STRING")),
-            "why_them": Schema(type="STRING"),
-            "close": Schema(type="STRING"),
-        }),
-        "ats": Schema(type="OBJECT", required=["jd_keywords_matched","risks"], properties={
-            "jd_keywords_matched": Schema(type="ARRAY", items=Schema(type="STRING")),
-            "risks": Schema(type="ARRAY", items=Schema(type="STRING")),
-        })
-    },
-)
 
+def build_user_prompt(profile_min_json:str, jd_text:str, region_rules:dict, selected_bullets_json:str, schema_json:str=OUTPUT_GEMINI_SCHEMA_STR)-> str:
+    return (
+        f"REGION_RULES:\n{json.dumps(region_rules, ensure_ascii=False)}\n\n"
+        f"PROFILE_MIN:\n{profile_min_json}\n\n"
+        f"JD_TEXT:\n{jd_text}\n\n"
+        f"PRESELECTED_PROFILE_BULLETS:\n{selected_bullets_json}\n\n"
+        f"SCHEMA (immutable):\n{schema_json}\n\n"
+        "Return JSON only."
+        )
 
-def build_user_prompt(profile_min_json:str, jd_text:str, region_rules:dict, selected_bullets_json:str, schema_json:str)-> str:
+def build_section_prompt(section:str, profile_min_json:str, jd_text:str, region_rules:dict, selected_bullets_json:str, problem:str, schema_json:str)-> str:
+    """Small prompt used by the repair stage to regenerate one top-level section"""
     return (
         f"REGION_RULES:\n{json.dumps(region_rules, ensure_ascii=False)}\n\n"
         f"PROFILE_MIN:\n{profile_min_json}\n\n"
         f"JD_TEXT:\n{jd_text}\n\n"
         f"PRESELECTED_PROFILE_BULLETS:\n{selected_bullets_json}\n\n"
+        f"A previous answer had an invalid \"{section}\" object ({problem}).\n"
+        f"Regenerate ONLY the \"{section}\" object.\n\n"
         f"SCHEMA (immutable):\n{schema_json}\n\n"
         "Return JSON only."
         )
 
-def call_llm(prompt:str)->str:
-    logger.info(f"=== LLM CALL START ===")
-
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        logger.error("=== LLM ERROR === GEMINI_API_KEY environment variable not set")
-        raise RuntimeError("GEMINI_API_KEY not set")
-
-    logger.info(f"API key found, length: {len(api_key)} chars")
-    logger.info(f"Prompt length: {len(prompt)} chars")
-    logger.info(f"Creating Gemini client...")
-
-    try:
-        client = genai.Client(api_key=api_key)
-        logger.info(f"Gemini client created successfully")
-
-        logger.info(f"Configuring generation settings: model=gemini-2.5-flash, temp=0.2, max_tokens=4000")
-        cfg = GenerateContentConfig(
-            response_mime_type="application/json",
-            response_schema=OUTPUT_JSON_SCHEMA,
-            temperature=0.2,
-            top_p=0.9,
-            candidate_count=1,
-            max_output_tokens=4000,
+def build_continuation_prompt(prompt:str, done_json:str, missing:list, schema_json:str)-> str:
+    """Continuation after a MAX_TOKENS cut-off: ask only for the sections that didn't fit"""
+    return (
+        f"{prompt}\n\n"
+        f"Your previous answer was cut off. These sections are final, do not repeat them:\n{done_json}\n\n"
+        f"Return ONLY the remaining sections: {', '.join(missing)}.\n\n"
+        f"SCHEMA (immutable):\n{schema_json}\n\n"
+        "Return JSON only."
+        )
+
+def build_regeneration_prompt(prompt:str, kept_json:str, sections:list, schema_json:str)-> str:
+    """Incremental regeneration: the profile changed, only these sections are requested again"""
+    return (
+        f"{prompt}\n\n"
+        f"These sections of an earlier answer are still valid for this profile, keep them as they are and stay consistent with them:\n{kept_json}\n\n"
+        f"Return ONLY these sections, regenerated for the current profile: {', '.join(sections)}.\n\n"
+        f"SCHEMA (immutable):\n{schema_json}\n\n"
+        "Return JSON only."
+        )
+
+def build_batch_prompt(profile_min_json:str, jobs_json:str, schema_json:str)-> str:
+    """Several jobs in one request (app.core.batch): the profile once, then each job's region rules, JD and bullets"""
+    return (
+        f"PROFILE_MIN:\n{profile_min_json}\n\n"
+        f"BATCH_JOBS:\n{jobs_json}\n\n"
+        "Tailor the profile to EACH job in BATCH_JOBS independently, following that job's region_rules, jd_text "
+        "and preselected_profile_bullets. Return one entry in \"results\" per job, carrying its job_key.\n\n"
+        f"SCHEMA (immutable):\n{schema_json}\n\n"
+        "Return JSON only."
         )
 
-        logger.info(f"Sending request to Gemini API...")
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[f"{SYSTEM}\n\n{prompt}"],
-            config=cfg,
+# Process-wide admission control for LLM calls (see app.core.rate_limit)
+scheduler = LLMScheduler.from_env()
+
+def _scheduler_metrics():
+    stats = scheduler.stats()
+    return [
+        ("llm_scheduler_queue_depth", "gauge", "LLM calls waiting for admission",
+         [({"lane": lane}, n) for lane, n in stats["queue_depth"].items()]),
+        ("llm_scheduler_in_flight", "gauge", "LLM calls in progress", [({}, stats["in_flight"])]),
+        ("llm_scheduler_admitted_total", "counter", "LLM call attempts admitted",
+         [({"lane": lane}, stats.get(f"admitted_{lane}", 0)) for lane in stats["queue_depth"]]),
+        ("llm_scheduler_queue_wait_seconds_total", "counter", "Time LLM calls spent waiting for admission",
+         [({}, stats.get("queue_wait_ms", 0) / 1000)]),
+        *[(f"llm_scheduler_{key}_total", "counter", help, [({}, stats.get(key, 0))]) for key, help in (
+            ("completed", "LLM calls that succeeded"),
+            ("retries", "LLM call retries after 429/5xx"),
+            ("throttled", "LLM attempts rejected with 429"),
+            ("failed", "LLM calls that failed after retries"),
+        )],
+    ]
+
+register_collector("llm_scheduler", _scheduler_metrics)
+
+
+def call_llm(prompt:str, response_schema:Schema=OUTPUT_GEMINI_SCHEMA, max_output_tokens:int=4000, lane:str="interactive")->str:
+    return call_llm_response(prompt, response_schema, max_output_tokens, lane).text
+
+def call_llm_response(prompt:str, response_schema:Schema=OUTPUT_GEMINI_SCHEMA, max_output_tokens:int=4000, lane:str="interactive")->LLMResponse:
+    """call_llm that also reports the finish reason, so callers can salvage truncated output.
+
+    The call goes to the configured backend (see app.core.backends), admitted
+    by the rate-limit scheduler on the given lane ("interactive" or "bulk") and
+    retried with backoff on 429/5xx.
+    """
+    backend = get_backend()
+    with tracer.start_as_current_span("llm.call", attributes={"llm.backend": backend.name, "llm.lane": lane, "llm.prompt_chars": len(prompt)}) as span:
+        response = scheduler.run(
+            lambda: _generate(backend, prompt, response_schema, max_output_tokens),
+            est_tokens=estimate_tokens(SYSTEM) + estimate_tokens(prompt),
+            lane=lane,
         )
-        logger.info(f"Gemini API call completed, processing response...")
-
-        # Log detailed response information for debugging
-        logger.debug(f"LLM response object type: {type(response)}")
-        logger.debug(f"LLM response candidates count: {len(response.candidates) if hasattr(response, 'candidates') else 'N/A'}")
-
-        # Check for blocking or safety issues
-        if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-            logger.info(f"LLM prompt feedback: {response.prompt_feedback}")
-            if hasattr(response.prompt_feedback, 'block_reason') and response.prompt_feedback.block_reason:
-                logger.error(f"=== LLM ERROR === Prompt blocked! Reason: {response.prompt_feedback.block_reason}")
-                raise RuntimeError(f"LLM prompt blocked: {response.prompt_feedback.block_reason}")
-
-        # Check if we have candidates
-        if hasattr(response, 'candidates') and response.candidates:
-            candidate = response.candidates[0]
-            if hasattr(candidate, 'finish_reason'):
-                logger.info(f"LLM finish reason: {candidate.finish_reason}")
-                if candidate.finish_reason and str(candidate.finish_reason) != 'STOP':
-                    logger.warning(f"LLM finished with non-STOP reason: {candidate.finish_reason}")
-
-            if hasattr(candidate, 'safety_ratings'):
-                logger.debug(f"LLM safety ratings: {candidate.safety_ratings}")
-
-        # Get the actual text response
-        logger.info(f"Extracting text from LLM response...")
-        result = response.text if response.text else None
-
-        if not result:
-            logger.error("=== LLM ERROR === Returned empty response!")
-            logger.error(f"Full response object: {response}")
-            raise RuntimeError("LLM returned empty response. Check prompt feedback and safety ratings above.")
-
-        logger.info(f"=== LLM CALL SUCCESS === Response length: {len(result)} chars")
-        logger.debug(f"LLM response preview (first 200 chars): {result[:200]}")
-        return result
-
-    except Exception as e:
-        logger.error(f"=== LLM CALL ERROR === {str(e)}", exc_info=True)
-        logger.error(f"Exception type: {type(e).__name__}")
-        logger.error(f"Prompt that caused error (first 500 chars): {prompt[:500]}")
-        raise
+        span.set_attribute("llm.finish_reason", response.finish_reason)
+        return response
+
+def _generate(backend, prompt:str, response_schema:Schema, max_output_tokens:int)->LLMResponse:
+    """One attempt (the scheduler may retry); a child span of llm.call"""
+    with tracer.start_as_current_span("llm.generate", attributes={"llm.max_output_tokens": max_output_tokens}) as span:
+        try:
+            response = backend.generate(SYSTEM, prompt, response_schema, max_output_tokens)
+        except Exception as e:
+            if getattr(e, "code", None) is not None:
+                span.set_attribute("http.status_code", e.code)
+            raise
+        span.set_attribute("llm.finish_reason", response.finish_reason)
+        span.set_attribute("llm.response_chars", len(response.text))
+        return response
@@ -0,0 +1,137 @@
+# Logging setup: non-blocking handlers, JSON output, request-log sampling
+#
+# configure_logging() routes every record through a QueueHandler; a single
+# listener thread formats and writes to stdout and LOG_FILE, so request
+# threads never wait on disk or the terminal. Records are enqueued as-is and
+# formatted on the listener thread, which keeps %-style logger calls lazy:
+# logger.debug("x=%s", x) costs a level check when DEBUG is off, and only
+# the listener pays for formatting when it is on.
+#
+# LOG_LEVEL      root level (default INFO)
+# LOG_FORMAT     "json" (default) or "text"
+# LOG_FILE       log file path ("" disables it; default umukozihr.log)
+# LOG_SAMPLE     per-route request-log sampling, e.g. "/health=0,/api/v1/generate/status=0.05,*=1"
+# LOG_SLOW_MS    requests slower than this are always logged (default 2000)
+
+import os, sys, json, time, queue, random, atexit, logging, threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_FILE = os.getenv("LOG_FILE", "umukozihr.log")
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "/health=0.01,/metrics=0,/api/v1/generate/status=0.1,*=1")
+LOG_SLOW_MS = float(os.getenv("LOG_SLOW_MS", "2000"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# LogRecord attributes; anything else on a record came from `extra=` and is a structured field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields become top-level keys"""
+
+    def format(self, record:logging.LogRecord)->str:
+        doc = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                doc[key] = value
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler that skips the eager format in prepare().
+
+    The queue is in-process, so records don't need to be pickled; the
+    listener thread does all message and exception formatting.
+    """
+
+    def prepare(self, record:logging.LogRecord)->logging.LogRecord:
+        return record
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def configure_logging(level:str=None, fmt:str=None, log_file:str=None):
+    """Install the queue-based root handler once per process (idempotent)"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        formatter = JsonFormatter() if (fmt or LOG_FORMAT) == "json" else logging.Formatter(TEXT_FORMAT)
+        handlers = [logging.StreamHandler(sys.stdout)]
+        log_file = LOG_FILE if log_file is None else log_file
+        if log_file:
+            handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+        for h in handlers:
+            h.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        root.addHandler(_LazyQueueHandler(log_queue))
+        root.setLevel(level or LOG_LEVEL)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def parse_sample_rates(spec:str)->dict:
+    """"/health=0,/api=0.5,*=1" -> {"/health": 0.0, "/api": 0.5, "*": 1.0}"""
+    rates = {}
+    for part in spec.split(","):
+        if "=" in part:
+            path, rate = part.rsplit("=", 1)
+            try:
+                rates[path.strip()] = min(1.0, max(0.0, float(rate)))
+            except ValueError:
+                pass
+    rates.setdefault("*", 1.0)
+    return rates
+
+
+class RequestSampler:
+    """Decides whether to log a finished request.
+
+    Errors (status >= 500) and slow requests are always logged; the rest are
+    sampled by the longest matching path prefix.
+    """
+
+    def __init__(self, spec:str=LOG_SAMPLE, slow_ms:float=LOG_SLOW_MS, rng=random.random):
+        self.rates = parse_sample_rates(spec)
+        self.prefixes = sorted((p for p in self.rates if p != "*"), key=len, reverse=True)
+        self.slow_ms = slow_ms
+        self._rng = rng
+
+    def rate_for(self, path:str)->float:
+        for prefix in self.prefixes:
+            if path.startswith(prefix):
+                return self.rates[prefix]
+        return self.rates["*"]
+
+    def should_log(self, path:str, status:int, duration_ms:float)->bool:
+        if status >= 500 or duration_ms >= self.slow_ms:
+            return True
+        rate = self.rate_for(path)
+        return rate >= 1.0 or (rate > 0.0 and self._rng() < rate)
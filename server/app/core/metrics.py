@@ -0,0 +1,153 @@
+# Stage timing spans and Prometheus metrics
+#
+# span("llm", region="US") times a block of the generation pipeline, logs the
+# duration and records it in the tailor_stage_duration_seconds histogram
+# (labels: stage, region, template, status). Other modules register collectors
+# for their own counters (LLM scheduler, repair stage). render_metrics() emits
+# everything in the Prometheus text format for GET /metrics.
+# Self-contained: no prometheus_client dependency. Each span is also an
+# OpenTelemetry span (see app.core.tracing).
+
+import time, bisect, logging, threading
+from contextlib import contextmanager
+from opentelemetry.trace import Status, StatusCode
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# seconds; spans range from sub-ms prompt builds to multi-second LLM calls and latexmk runs
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value)->str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names:tuple, values:tuple, extra:str="")->str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value:float)->str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, thread-safe"""
+
+    def __init__(self, name:str, help:str, label_names:tuple=(), buckets:tuple=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value:float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self)->dict:
+        """label values -> {"buckets": cumulative counts, "sum": ..., "count": ...}"""
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        out = {}
+        for key, series in items:
+            cumulative, running = [], 0
+            for n in series[:len(self.buckets)]:
+                running += n
+                cumulative.append(running)
+            out[key] = {"buckets": cumulative, "sum": series[-2], "count": series[-1]}
+        return out
+
+    def render(self)->list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, data in sorted(self.snapshot().items()):
+            for le, n in zip(self.buckets + (float("inf"),), data["buckets"] + [data["count"]]):
+                bucket_labels = _labels(self.label_names, key, 'le="%s"' % _number(le))
+                lines.append(f"{self.name}_bucket{bucket_labels} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(data['sum'])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {data['count']}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+STAGE_SECONDS = Histogram(
+    "tailor_stage_duration_seconds",
+    "Duration of generation pipeline stages",
+    ("stage", "region", "template", "status"),
+)
+
+
+@contextmanager
+def span(stage:str, region:str="", template:str=""):
+    """Time a pipeline stage.
+
+    Status is "error" if the block raised; blocks that report failure without
+    raising can set it themselves: `with span("compile") as s: s["status"] = "error"`.
+    """
+    start = time.perf_counter()
+    info = {"status": "ok"}
+    attributes = {k: v for k, v in (("region", region), ("template", template)) if v}
+    with tracer.start_as_current_span(stage, attributes=attributes) as trace_span:
+        try:
+            yield info
+        except BaseException:
+            info["status"] = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            status = info["status"]
+            if status == "error":
+                trace_span.set_status(Status(StatusCode.ERROR))
+            STAGE_SECONDS.observe(elapsed, stage=stage, region=region or "", template=template or "", status=status)
+            logger.debug("span stage=%s region=%s template=%s status=%s duration_ms=%.1f",
+                         stage, region or "-", template or "-", status, elapsed * 1000)
+
+
+# extra histograms rendered after STAGE_SECONDS (e.g. DB pool wait time)
+_histograms = []
+
+def register_histogram(histogram:Histogram)->Histogram:
+    """Expose another Histogram on /metrics"""
+    _histograms.append(histogram)
+    return histogram
+
+
+# name -> fn() returning [(metric name, type, help, [(labels dict, value), ...]), ...]
+_collectors = {}
+
+def register_collector(name:str, fn):
+    """Expose extra gauges/counters (e.g. scheduler stats) on /metrics"""
+    _collectors[name] = fn
+
+def render_metrics()->str:
+    """All metrics in the Prometheus text exposition format (0.0.4)"""
+    lines = STAGE_SECONDS.render()
+    for histogram in _histograms:
+        lines.extend(histogram.render())
+    for name, fn in list(_collectors.items()):
+        try:
+            families = fn()
+        except Exception as e:
+            logger.warning(f"Metrics collector {name} failed: {e}")
+            continue
+        for metric, kind, help, samples in families:
+            lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, value in samples:
+                lines.append(f"{metric}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
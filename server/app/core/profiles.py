@@ -0,0 +1,135 @@
+# Parsed profile cache
+#
+# /generate and regenerate used to validate the stored profile JSON into
+# ProfileV3 and convert it to the legacy Profile on every request, and
+# run_generation_for_job did it once more per job. ParsedProfile keeps the
+# results (plus the legacy model_dump() and the bullet index the tailor
+# scores against), keyed by (user_id, version). update_profile bumps the
+# version, so an outdated entry is never served on any worker; it also drops
+# the old entry here. Cached objects are shared between requests: read-only.
+#
+# PROFILE_CACHE_TTL    seconds a parsed profile is kept (default 3600)
+# PROFILE_CACHE_SIZE   profiles kept per process (default 2000)
+
+import os, logging
+from typing import NamedTuple, Optional
+from sqlalchemy import select
+from app.models import Profile, ProfileV3
+from app.db.models import Profile as DBProfile
+from .cache import TTLCache
+from .metrics import span
+from .tailor import bullet_index
+from .incremental import profile_fingerprint
+from .tex_compile import freeze
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "3600"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "2000"))
+
+_cache = TTLCache("profile", maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+
+class ParsedProfile(NamedTuple):
+    version: Optional[int]
+    v3: ProfileV3
+    legacy: Profile
+    legacy_dump: dict  # frozen, see app.core.tex_compile.RenderContext
+    bullets: list  # see app.core.tailor.bullet_index
+    fingerprint: dict  # see app.core.incremental.profile_fingerprint
+
+
+def convert_v3_profile_to_legacy(profile_v3: ProfileV3) -> Profile:
+    """Convert v1.3 ProfileV3 to legacy v1.2 Profile for tailor compatibility"""
+    from app.models import Contact, Role, Education, Project
+
+    # Convert experience
+    legacy_experience = [
+        Role(
+            title=exp.title,
+            company=exp.company,
+            start=exp.start,
+            end=exp.end,
+            bullets=exp.bullets
+        )
+        for exp in profile_v3.experience
+    ]
+
+    # Convert education
+    legacy_education = [
+        Education(
+            school=edu.school,
+            degree=edu.degree,
+            period=f"{edu.start} - {edu.end}" if edu.start and edu.end else ""
+        )
+        for edu in profile_v3.education
+    ]
+
+    # Convert projects
+    legacy_projects = [
+        Project(
+            name=proj.name,
+            stack=proj.stack,
+            bullets=proj.bullets
+        )
+        for proj in profile_v3.projects
+    ]
+
+    # Convert skills (flatten from Skill objects to simple strings)
+    legacy_skills = [skill.name for skill in profile_v3.skills]
+
+    # Create legacy profile
+    return Profile(
+        name=profile_v3.basics.full_name,
+        contacts=Contact(
+            email=profile_v3.basics.email,
+            phone=profile_v3.basics.phone,
+            location=profile_v3.basics.location,
+            links=profile_v3.basics.links
+        ),
+        summary=profile_v3.basics.summary,
+        skills=legacy_skills,
+        experience=legacy_experience,
+        education=legacy_education,
+        projects=legacy_projects
+    )
+
+
+def parse_profile(profile_data:dict, version:int=None)->ParsedProfile:
+    """Validate and convert stored profile JSON (uncached)"""
+    with span("profile_parse"):
+        profile_v3 = ProfileV3(**profile_data)
+        legacy = convert_v3_profile_to_legacy(profile_v3)
+        return ParsedProfile(version, profile_v3, legacy, freeze(legacy.model_dump()), bullet_index(legacy),
+                             profile_fingerprint(legacy))
+
+
+def get_parsed_profile(user_id, version:int, profile_data:dict)->ParsedProfile:
+    """parse_profile() through the cache"""
+    key = (str(user_id), version)
+    parsed = _cache.get(key)
+    if parsed is None:
+        parsed = parse_profile(profile_data, version)
+        _cache.set(key, parsed)
+    return parsed
+
+
+def load_profile(db, user_id)->Optional[ParsedProfile]:
+    """A user's current profile, parsed; None if they have none.
+
+    Reads only the version unless it isn't cached yet.
+    """
+    current = db.execute(select(DBProfile.version).where(DBProfile.user_id == user_id)).first()
+    if current is None:
+        return None
+    parsed = _cache.get((str(user_id), current.version))
+    if parsed is not None:
+        return parsed
+    row = db.execute(select(DBProfile.version, DBProfile.profile_data).where(DBProfile.user_id == user_id)).first()
+    if row is None:
+        return None
+    return get_parsed_profile(user_id, row.version, row.profile_data)
+
+
+def invalidate_profile(user_id, version:int):
+    _cache.pop((str(user_id), version))
@@ -0,0 +1,159 @@
+# Rate-limit-aware scheduler for LLM calls
+#
+# Every Gemini call goes through one process-wide scheduler that:
+# - admits calls against token buckets sized in requests/min and tokens/min
+# - serves the "interactive" lane before "bulk" (regenerate, queued jobs)
+# - caps in-flight calls
+# - retries 429/5xx with jittered exponential backoff, honouring Retry-After,
+#   and pauses *all* callers after a 429 so we don't hammer an exhausted quota
+# Calls run on the caller's thread; the scheduler only decides when.
+
+import os, time, random, heapq, itertools, threading, logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+LANES = {"interactive": 0, "bulk": 1}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Classic token bucket; not thread-safe on its own (the scheduler holds the lock)"""
+
+    def __init__(self, per_minute:float, capacity:float=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity or per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now:float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n:float, now:float)->float:
+        """Seconds until n tokens are available (0 if they are now)"""
+        self._refill(now)
+        n = min(n, self.capacity)  # an oversized request waits for a full bucket, not forever
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n:float):
+        self.tokens -= min(n, self.capacity)
+
+
+def estimate_tokens(text:str)->int:
+    """Cheap prompt token estimate (~4 chars/token for English/JSON)"""
+    return max(1, len(text) // 4)
+
+
+class LLMScheduler:
+    def __init__(self, rpm:float=60, tpm:float=1_000_000, max_concurrency:int=8, max_retries:int=4,
+                 backoff_base:float=0.5, backoff_max:float=20.0, sleep=time.sleep):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (lane priority, seq)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self._depth = Counter()
+        self._stats = Counter()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            rpm=float(os.getenv("LLM_RPM", "60")),
+            tpm=float(os.getenv("LLM_TPM", "1000000")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+            backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "20")),
+        )
+
+    def _acquire(self, est_tokens:int, lane:str):
+        ticket = (LANES[lane], next(self._seq))
+        enqueued = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self._depth[lane] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._waiting))
+            while True:
+                now = time.monotonic()
+                timeout = None
+                if self._waiting[0] == ticket and self._in_flight < self.max_concurrency:
+                    timeout = max(self._cooldown_until - now,
+                                  self.requests.wait_time(1, now),
+                                  self.tokens.wait_time(est_tokens, now))
+                    if timeout <= 0:
+                        break
+                self._cond.wait(timeout)
+            heapq.heappop(self._waiting)
+            self.requests.take(1)
+            self.tokens.take(est_tokens)
+            self._depth[lane] -= 1
+            self._in_flight += 1
+            self._stats[f"admitted_{lane}"] += 1
+            self._stats["queue_wait_ms"] += int((time.monotonic() - enqueued) * 1000)
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _bump(self, key:str):
+        with self._cond:
+            self._stats[key] += 1
+
+    def _retry_delay(self, error:Exception, attempt:int):
+        """Backoff before the next attempt, or None if the error isn't retryable"""
+        code = getattr(error, "code", None)
+        if code not in RETRYABLE_STATUS:
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))  # full jitter
+        response = getattr(error, "response", None)
+        retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        try:
+            delay = max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            pass
+        if code == 429:
+            with self._cond:
+                self._stats["throttled"] += 1
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        return delay
+
+    def run(self, fn, est_tokens:int=1, lane:str="interactive"):
+        """Run fn() once admitted, retrying retryable API errors with backoff"""
+        attempt = 0
+        while True:
+            self._acquire(est_tokens, lane)
+            try:
+                result = fn()
+            except Exception as e:
+                self._release()
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    self._bump("failed")
+                    raise
+                attempt += 1
+                self._bump("retries")
+                logger.warning(f"LLM call failed with {getattr(e, 'code', '?')}, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                self._sleep(delay)
+                continue
+            self._release()
+            self._bump("completed")
+            return result
+
+    def stats(self)->dict:
+        """Queue depth per lane, in-flight calls and cumulative counters"""
+        with self._cond:
+            return {
+                "queue_depth": {lane: self._depth[lane] for lane in LANES},
+                "in_flight": self._in_flight,
+                **self._stats,
+            }
@@ -0,0 +1,233 @@
+# Repair stage for the tailor pipeline: local fixes first, then targeted LLM re-asks
+#
+# A schema or business-rule failure used to fail the whole request. Most
+# defects are small (a missing list, a company spelled slightly differently,
+# output cut off near the end), so we fix what we can from the profile and
+# only go back to the LLM for the top-level section that is still broken.
+
+import os, json, logging, difflib, threading
+from collections import Counter
+from pydantic import ValidationError
+from .json_salvage import salvage_json
+from .metrics import register_collector
+from .llm import build_section_prompt, build_continuation_prompt, call_llm, call_llm_response
+from .schema import OUTPUT_SECTION_MODELS, OUTPUT_SECTIONS, SECTION_GEMINI_SCHEMAS, SECTION_GEMINI_SCHEMA_STRS, sections_schema
+from .validate import business_rules_check
+from app.models import Profile, JobJD, LLMOutput
+
+logger = logging.getLogger(__name__)
+
+# Max section re-asks per tailored job (0 disables LLM repair, local fixes still apply)
+REPAIR_LLM_BUDGET = int(os.getenv("REPAIR_LLM_BUDGET", "2"))
+SECTION_MAX_OUTPUT_TOKENS = int(os.getenv("REPAIR_SECTION_MAX_TOKENS", "2000"))
+# Max continuation calls after a MAX_TOKENS cut-off
+CONTINUATION_MAX_CALLS = int(os.getenv("CONTINUATION_MAX_CALLS", "2"))
+COMPANY_MATCH_CUTOFF = 0.85
+
+_stats_lock = threading.Lock()
+REPAIR_STATS: Counter = Counter()
+
+def _count(key:str, n:int=1):
+    with _stats_lock:
+        REPAIR_STATS[key] += n
+
+def repair_stats()->dict:
+    """Snapshot of repair counters (attempts, local fixes, re-asks, outcomes)"""
+    with _stats_lock:
+        return dict(REPAIR_STATS)
+
+register_collector("repair", lambda: [
+    ("tailor_repair_events_total", "counter", "Repair and truncation-salvage events",
+     [({"event": key}, n) for key, n in sorted(repair_stats().items())]),
+])
+
+
+class RepairError(ValueError):
+    """Raised when the output could not be repaired within budget"""
+
+
+def parse_llm_json(raw:str)->dict:
+    """JSON object from an LLM answer, salvaging a truncated one; {} when there is none"""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        try:
+            data = salvage_json(raw).data
+            _count("local_truncation_salvaged")
+        except ValueError:
+            data = None
+    return data if isinstance(data, dict) else {}
+
+
+def continue_truncated(raw:str, prompt:str, max_calls:int=None, lane:str="interactive", sections:tuple=OUTPUT_SECTIONS)->str:
+    """Complete an answer that hit MAX_TOKENS without regenerating what we already have.
+
+    Every finished top-level section (of `sections`, the ones the answer
+    should hold) is kept; only the missing or cut-off ones are requested in a
+    continuation call. Returns the merged JSON
+    (possibly still incomplete - validation/repair handle the rest).
+    """
+    max_calls = CONTINUATION_MAX_CALLS if max_calls is None else max_calls
+    _count("truncations")
+    try:
+        result = salvage_json(raw)
+    except ValueError as e:
+        logger.warning("Truncated output is malformed, leaving it to repair: %s", e)
+        return raw
+
+    data = result.data if isinstance(result.data, dict) else {}
+    partial = set(result.partial_keys)
+    for call in range(max_calls + 1):
+        done = {k: v for k, v in data.items() if k in sections and k not in partial}
+        missing = [name for name in sections if name not in done]
+        if not missing:
+            break
+        if call == max_calls:
+            logger.warning("Continuation budget used up, still missing: %s", missing)
+            break
+        _count("continuations")
+        for name in missing:
+            _count(f"continuation_sections_{name}")
+        logger.info("Salvaged sections %s from truncated output, requesting only: %s", list(done), missing)
+        schema, schema_json = sections_schema(tuple(missing))
+        continuation = build_continuation_prompt(prompt, json.dumps(done, ensure_ascii=False), missing, schema_json)
+        try:
+            tail = salvage_json(call_llm_response(continuation, response_schema=schema, lane=lane).text)
+        except Exception as e:
+            logger.warning("Continuation call failed, leaving the rest to repair: %s", e)
+            break
+        tail_data = tail.data if isinstance(tail.data, dict) else {}
+        data = {**done, **{k: v for k, v in tail_data.items() if k in missing}}
+        partial = set(tail.partial_keys)
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _match_company(name:str, prof_companies:list[str]):
+    if name in prof_companies:
+        return name
+    folded = {c.casefold().strip(): c for c in prof_companies}
+    if name.casefold().strip() in folded:
+        return folded[name.casefold().strip()]
+    close = difflib.get_close_matches(name.casefold().strip(), list(folded), n=1, cutoff=COMPANY_MATCH_CUTOFF)
+    return folded[close[0]] if close else None
+
+
+def _fix_resume(resume:dict, profile:Profile)->int:
+    """Fill gaps from the profile and map companies back onto profile companies"""
+    fixes = 0
+    defaults = {"summary": profile.summary, "skills_line": list(profile.skills), "projects": [], "education": []}
+    for key, value in defaults.items():
+        if key not in resume and (value or key in ("projects", "education")):
+            resume[key] = value
+            fixes += 1
+
+    roles_by_company = {r.company: r for r in profile.experience}
+    prof_companies = list(roles_by_company)
+    kept = []
+    for role in resume.get("experience") or []:
+        if not isinstance(role, dict):
+            fixes += 1
+            continue
+        company = role.get("company") or ""
+        if company:
+            matched = _match_company(company, prof_companies)
+            if matched is None:
+                logger.warning("Repair: dropping role at company not in profile: %s", company)
+                fixes += 1
+                continue
+            if matched != company:
+                role["company"] = matched
+                fixes += 1
+        source = roles_by_company.get(role.get("company"))
+        if source is not None:
+            for key in ("title", "bullets"):
+                if key not in role:
+                    role[key] = getattr(source, key)
+                    fixes += 1
+        kept.append(role)
+    if "experience" in resume:
+        resume["experience"] = kept
+    return fixes
+
+
+def _fix_cover_letter(cover_letter:dict, selected:list)->int:
+    if "evidence" not in cover_letter and selected:
+        cover_letter["evidence"] = [b["bullet"] for b in selected[:3]]
+        return 1
+    return 0
+
+
+def _section_error(name:str, value, profile:Profile):
+    """Return a short error string if the section fails validation, else None"""
+    if not isinstance(value, dict):
+        return "missing"
+    try:
+        out = OUTPUT_SECTION_MODELS[name].model_validate(value)
+    except ValidationError as e:
+        return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+    # dropping ungrounded roles must not leave an experienced candidate with none
+    if name == "resume" and not out.experience and profile.experience:
+        return "experience is empty"
+    return None
+
+
+def repair_output(raw:str, error:Exception, profile:Profile, job:JobJD, reg_rules:dict, selected:list, budget:int=None,
+                  lane:str="interactive", sections:tuple=OUTPUT_SECTIONS)->LLMOutput:
+    """Repair an LLM answer that failed validation or business rules.
+
+    Applies local fixes, then re-asks the LLM for each still-invalid section
+    of `sections` (at most `budget` calls); other sections are dropped.
+    Raises RepairError if the result is still invalid.
+    """
+    budget = REPAIR_LLM_BUDGET if budget is None else budget
+    _count("attempts")
+    logger.info("=== REPAIR START === Job: %s, Reason: %s", job.id or job.title, error)
+
+    parsed = parse_llm_json(raw)
+    data = {name: parsed.get(name) if isinstance(parsed.get(name), dict) else {} if name == "ats" else None
+            for name in sections}
+
+    fixes = 0
+    if isinstance(data.get("resume"), dict):
+        fixes += _fix_resume(data["resume"], profile)
+    if isinstance(data.get("cover_letter"), dict):
+        fixes += _fix_cover_letter(data["cover_letter"], selected)
+    _count("local_fixes", fixes)
+    logger.info("Applied %d local fixes", fixes)
+
+    profile_min_json = profile.model_dump_json()
+    selected_json = json.dumps(selected, ensure_ascii=False)
+    for name in sections:
+        problem = _section_error(name, data[name], profile)
+        while problem and budget > 0:
+            budget -= 1
+            _count("llm_reasks")
+            _count(f"llm_reasks_{name}")
+            logger.info("Repair: re-asking LLM for '%s' (%s), remaining budget: %d", name, problem, budget)
+            prompt = build_section_prompt(name, profile_min_json, job.jd_text, reg_rules, selected_json, problem, SECTION_GEMINI_SCHEMA_STRS[name])
+            try:
+                section = parse_llm_json(call_llm(prompt, response_schema=SECTION_GEMINI_SCHEMAS[name], max_output_tokens=SECTION_MAX_OUTPUT_TOKENS, lane=lane))
+            except Exception as e:
+                logger.warning("Repair re-ask for '%s' failed: %s", name, e)
+                section = {}
+            if name == "resume":
+                _fix_resume(section, profile)
+            elif name == "cover_letter":
+                _fix_cover_letter(section, selected)
+            data[name] = section
+            problem = _section_error(name, section, profile)
+        if problem:
+            _count("failures")
+            if budget <= 0:
+                _count("budget_exhausted")
+            raise RepairError(f"Could not repair '{name}': {problem}")
+
+    out = LLMOutput.model_validate(data)
+    try:
+        business_rules_check(out, profile)
+    except ValueError as e:
+        _count("failures")
+        raise RepairError(str(e))
+    _count("successes")
+    logger.info("=== REPAIR SUCCESS === Job: %s, Stats: %s", job.id or job.title, repair_stats())
+    return out
@@ -0,0 +1,118 @@
+# Single source of truth for the LLM output schema.
+#
+# Both representations are derived from the LLMOutput pydantic models at
+# import time: a self-contained JSON Schema (shown to the model in the prompt)
+# and the google.genai Schema passed as response_schema. Their serialized forms
+# are cached here so nothing is re-serialized per request.
+
+import json
+from functools import lru_cache
+from typing import get_args
+from google.genai.types import Schema
+from pydantic import BaseModel, create_model
+from app.models import LLMOutput
+
+# pydantic JSON Schema keywords that carry no constraint for the LLM
+_DROP_KEYS = {"title", "default", "description"}
+
+def _inline(node, defs:dict):
+    """Resolve $ref/$defs and collapse Optional[X] into a nullable X"""
+    if isinstance(node, list):
+        return [_inline(n, defs) for n in node]
+    if not isinstance(node, dict):
+        return node
+    if "$ref" in node:
+        return _inline(defs[node["$ref"].split("/")[-1]], defs)
+    if "anyOf" in node:
+        variants = [v for v in node["anyOf"] if v.get("type") != "null"]
+        if len(variants) == 1:
+            inner = _inline(variants[0], defs)
+            if len(variants) < len(node["anyOf"]):
+                inner["type"] = [inner["type"], "null"]
+            return inner
+    out = {k: _inline(v, defs) for k, v in node.items() if k not in _DROP_KEYS and k not in ("$defs", "properties")}
+    if "properties" in node:
+        # property names are data, not keywords: a field called "title" must survive
+        out["properties"] = {name: _inline(sub, defs) for name, sub in node["properties"].items()}
+    return out
+
+def json_schema_for(model:type[BaseModel])->dict:
+    """Self-contained JSON Schema (no $ref) for a pydantic model"""
+    raw = model.model_json_schema()
+    return _inline(raw, raw.get("$defs", {}))
+
+def gemini_schema_for(json_schema:dict)->Schema:
+    """Convert an inlined JSON Schema into a google.genai Schema"""
+    t = json_schema.get("type")
+    nullable = None
+    if isinstance(t, list):
+        nullable = "null" in t
+        t = next(x for x in t if x != "null")
+    kwargs = {"type": t.upper()}
+    if nullable:
+        kwargs["nullable"] = True
+    if "properties" in json_schema:
+        kwargs["properties"] = {k: gemini_schema_for(v) for k, v in json_schema["properties"].items()}
+        # Gemini emits properties alphabetically unless told otherwise
+        kwargs["property_ordering"] = list(json_schema["properties"])
+    if json_schema.get("required"):
+        kwargs["required"] = list(json_schema["required"])
+    if "items" in json_schema:
+        kwargs["items"] = gemini_schema_for(json_schema["items"])
+    return Schema(**kwargs)
+
+def _section_model(annotation)->type[BaseModel]:
+    """OutResume for Optional[OutResume]"""
+    args = [a for a in get_args(annotation) if a is not type(None)]
+    return args[0] if args else annotation
+
+# Top-level sections (resume / cover_letter / ats) and the sections each document needs
+OUTPUT_SECTION_MODELS: dict[str, type[BaseModel]] = {name: _section_model(f.annotation) for name, f in LLMOutput.model_fields.items()}
+OUTPUT_SECTIONS = tuple(OUTPUT_SECTION_MODELS)
+DOCUMENT_SECTIONS = {"resume": ("resume", "ats"), "cover_letter": ("cover_letter",)}
+
+def sections_for(outputs)->tuple:
+    """Output sections an LLM answer needs for these documents (JobJD.outputs), in schema order"""
+    wanted = {s for doc in outputs or DOCUMENT_SECTIONS for s in DOCUMENT_SECTIONS[doc]}
+    return tuple(s for s in OUTPUT_SECTIONS if s in wanted)
+
+@lru_cache(maxsize=None)
+def output_model(sections:tuple=OUTPUT_SECTIONS)->type[BaseModel]:
+    """LLMOutput with exactly these sections, all required: what an answer is validated against"""
+    name = "LLMOutput" if sections == OUTPUT_SECTIONS else "LLMOutput_" + "_".join(sections)
+    return create_model(name, **{s: (OUTPUT_SECTION_MODELS[s], ...) for s in sections})
+
+OUTPUT_JSON_SCHEMA = json_schema_for(output_model())
+OUTPUT_GEMINI_SCHEMA = gemini_schema_for(OUTPUT_JSON_SCHEMA)
+
+# Cached serialized forms (the prompt embeds the schema verbatim)
+OUTPUT_JSON_SCHEMA_STR = json.dumps(OUTPUT_JSON_SCHEMA, ensure_ascii=False)
+OUTPUT_GEMINI_SCHEMA_STR = json.dumps(OUTPUT_GEMINI_SCHEMA.to_json_dict(), ensure_ascii=False)
+
+# Per-section schemas, used by the repair stage to re-ask for a single failing
+# top-level object (resume / cover_letter / ats) instead of the whole output.
+SECTION_GEMINI_SCHEMAS = {name: gemini_schema_for(json_schema_for(m)) for name, m in OUTPUT_SECTION_MODELS.items()}
+SECTION_GEMINI_SCHEMA_STRS = {name: json.dumps(s.to_json_dict(), ensure_ascii=False) for name, s in SECTION_GEMINI_SCHEMAS.items()}
+
+@lru_cache(maxsize=None)
+def sections_schema(sections:tuple)->tuple[Schema, str]:
+    """Gemini schema (and its serialized form) for an object with only these top-level sections
+    (continuations, incremental regeneration, and jobs asking for a single document)"""
+    js = {
+        "type": "object",
+        "required": [s for s in sections if s in OUTPUT_JSON_SCHEMA["required"]],
+        "properties": {s: OUTPUT_JSON_SCHEMA["properties"][s] for s in sections},
+    }
+    schema = gemini_schema_for(js)
+    return schema, json.dumps(schema.to_json_dict(), ensure_ascii=False)
+
+@lru_cache(maxsize=None)
+def batch_schema(sections:tuple)->tuple[Schema, str]:
+    """Gemini schema (and its serialized form) of a batched answer: {"results": [{"job_key", <sections>}, ...]}"""
+    item = {
+        "type": "object",
+        "required": ["job_key"] + [s for s in sections if s in OUTPUT_JSON_SCHEMA["required"]],
+        "properties": {"job_key": {"type": "string"}, **{s: OUTPUT_JSON_SCHEMA["properties"][s] for s in sections}},
+    }
+    schema = gemini_schema_for({"type": "object", "required": ["results"], "properties": {"results": {"type": "array", "items": item}}})
+    return schema, json.dumps(schema.to_json_dict(), ensure_ascii=False)
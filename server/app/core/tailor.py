@@ -2,8 +2,11 @@
 
 import re, json, logging
 from collections import Counter
-from .llm import build_user_prompt, call_llm, SYSTEM, OUTPUT_JSON_SCHEMA
+from .llm import build_user_prompt, call_llm_response
 from .validate import validate_or_error, business_rules_check
+from .repair import repair_output, continue_truncated
+from .metrics import span
+from .schema import sections_for, sections_schema
 from app.models import Profile, JobJD, LLMOutput
 
 logger = logging.getLogger(__name__)
@@ -18,17 +21,21 @@ def score_bullet(bullet:str, jd_counts:Counter):
     toks = norm_tokens(bullet)
     return sum(jd_counts.get(t,0) for t in toks)
 
-def select_topk_bullets(profile: Profile, jd_text: str, k:int=12):
+def bullet_index(profile: Profile)->list:
+    """(role_title, company, bullet, tokens) for every experience bullet; the JD-independent part of select_topk_bullets"""
+    return [(row.title, row.company, bullet, norm_tokens(bullet)) for row in profile.experience for bullet in row.bullets]
+
+def select_topk_bullets(profile: Profile, jd_text: str, k:int=12, index:list=None):
+    """Top k bullets by JD token overlap; pass `index` (bullet_index(profile)) to skip re-tokenizing the profile"""
     jd_counts = Counter(norm_tokens(jd_text))
     pool = []
-    for row in profile.experience:
-        for bullet in row.bullets:
-            pool.append({
-                "role_title": row.title,
-                "company": row.company,
-                "bullet": bullet,
-                "score": score_bullet(bullet, jd_counts)
-            })
+    for role_title, company, bullet, toks in (index if index is not None else bullet_index(profile)):
+        pool.append({
+            "role_title": role_title,
+            "company": company,
+            "bullet": bullet,
+            "score": sum(jd_counts.get(t,0) for t in toks)
+        })
     pool.sort(key=lambda x: x["score"], reverse=True)
     return [{"role_title":p["role_title"], "company":p["company"], "bullet":p["bullet"]} for p in pool[:k]]
 
@@ -38,58 +45,62 @@ def region_rules(region:str)->dict:
     if region=="GL": return {"pages":1,"style":"one-page allowed; simple","date_format":"YYYY-MM"}    
     return {"pages":2,"style":"no photo; refs on request ok","date_format":"YYYY-MM"}
 
-def run_tailor(profile: Profile, job: JobJD)->LLMOutput:
-    logger.info(f"=== TAILOR START === Job: {job.id or job.title}, Company: {job.company}, Region: {job.region}")
+def run_tailor(profile: Profile, job: JobJD, lane: str = "interactive", bullets: list = None)->LLMOutput:
+    """Tailor one job. `lane` is the LLM scheduler priority: "interactive" or "bulk";
+    `bullets` the profile's bullet_index() when the caller has it cached.
+    Only the sections job.outputs needs are requested; the others are None."""
+    # hot path: %-style args so nothing is formatted unless the level is enabled
+    job_name = job.id or job.title
+    logger.info("=== TAILOR START === Job: %s, Company: %s, Region: %s", job_name, job.company, job.region)
 
     try:
-        logger.info(f"Selecting top bullets from profile (name: {profile.name})")
-        selected = select_topk_bullets(profile, job.jd_text)
-        logger.info(f"Selected {len(selected)} top bullets from {len(profile.experience)} experience entries")
-        logger.debug(f"Top 3 selected bullets: {selected[:3]}")
+        with span("select_bullets", region=job.region):
+            selected = select_topk_bullets(profile, job.jd_text, index=bullets)
+        logger.debug("Selected %d top bullets from %d experience entries", len(selected), len(profile.experience))
+        logger.debug("Top 3 selected bullets: %s", selected[:3])
 
-        logger.info(f"Determining region rules for: {job.region}")
         reg_rules = region_rules(job.region)
-        logger.info(f"Region rules: {reg_rules}")
-
-        logger.info(f"Building LLM prompt for job: {job.id or job.title}")
-        prompt = build_user_prompt(
-            profile_min_json=profile.model_dump_json(),
-            jd_text=job.jd_text,
-            region_rules=reg_rules,
-            selected_bullets_json=json.dumps(selected, ensure_ascii=False),
-            schema_json=json.dumps(OUTPUT_JSON_SCHEMA.to_json_dict(), ensure_ascii=False),
-        )
-        logger.info(f"LLM prompt built - length: {len(prompt)} chars, JD length: {len(job.jd_text)} chars")
-
-        logger.info(f"Calling LLM for job: {job.id or job.title}")
-        raw = call_llm(prompt)
-        logger.info(f"LLM response received - length: {len(raw)} chars")
-        logger.debug(f"Raw LLM response (first 500 chars): {raw[:500]}")
-
-        # call validator to check the schema
-        logger.info(f"Validating LLM output schema for job: {job.id or job.title}")
-        try:
-            data = validate_or_error(raw)
-            logger.info("LLM output passed schema validation successfully")
-        except Exception as validation_error:
-            logger.error(f"=== SCHEMA VALIDATION FAILED === Job: {job.id or job.title}")
-            logger.error(f"Validation error: {validation_error}")
-            logger.error(f"Full raw LLM response that failed validation (length: {len(raw)}): {raw}")
-            raise
-
-        # check to make sure it is grounded with facts
-        logger.info(f"Performing business rules validation for job: {job.id or job.title}")
+        logger.debug("Region rules for %s: %s", job.region, reg_rules)
+
+        sections = sections_for(job.outputs)
+        with span("prompt_build", region=job.region):
+            schema, schema_json = sections_schema(sections)
+            prompt = build_user_prompt(
+                profile_min_json=profile.model_dump_json(),
+                jd_text=job.jd_text,
+                region_rules=reg_rules,
+                selected_bullets_json=json.dumps(selected, ensure_ascii=False),
+                schema_json=schema_json,
+            )
+        logger.debug("LLM prompt built - length: %d chars, JD length: %d chars", len(prompt), len(job.jd_text))
+
+        with span("llm", region=job.region):
+            response = call_llm_response(prompt, response_schema=schema, lane=lane)
+        raw = response.text
+        logger.debug("LLM response received - length: %d chars", len(raw))
+
+        if response.finish_reason == "MAX_TOKENS":
+            logger.warning("LLM output truncated (MAX_TOKENS) for job: %s, salvaging", job_name)
+            with span("llm_continuation", region=job.region):
+                raw = continue_truncated(raw, prompt, lane=lane, sections=sections)
+
+        # call validator to check the schema (parses straight into LLMOutput)
         try:
-            business_rules_check(data, profile)
-            logger.info("LLM output passed business rules validation successfully")
-        except Exception as business_error:
-            logger.error(f"=== BUSINESS RULES VALIDATION FAILED === Job: {job.id or job.title}")
-            logger.error(f"Business rules error: {business_error}")
-            logger.error(f"Data that failed business rules: {json.dumps(data, indent=2)}")
-            raise
-
-        logger.info(f"=== TAILOR SUCCESS === Job: {job.id or job.title}, Resume bullets: {len(data.get('resume', {}).get('experience', []))}, Cover letter paragraphs: {len(data.get('cover_letter', {}).get('body_paragraphs', []))}")
-        return LLMOutput(**data)
+            with span("validate", region=job.region):
+                out = validate_or_error(raw, sections)
+                # check to make sure it is grounded with facts
+                business_rules_check(out, profile)
+            logger.debug("LLM output passed schema and business rules validation")
+        except ValueError as validation_error:
+            logger.warning("=== VALIDATION FAILED, REPAIRING === Job: %s, Error: %s", job_name, validation_error)
+            logger.debug("Raw LLM response that failed validation (length: %d): %s", len(raw), raw)
+            with span("repair", region=job.region):
+                out = repair_output(raw, validation_error, profile, job, reg_rules, selected, lane=lane, sections=sections)
+
+        logger.info("=== TAILOR SUCCESS === Job: %s, Resume roles: %d, Cover letter evidence: %d",
+                    job_name, len(out.resume.experience) if out.resume else 0,
+                    len(out.cover_letter.evidence) if out.cover_letter else 0)
+        return out
     except Exception as e:
-        logger.error(f"=== TAILOR ERROR === Job: {job.id or job.title}, Error: {str(e)}", exc_info=True)
+        logger.error("=== TAILOR ERROR === Job: %s, Error: %s", job_name, e, exc_info=True)
         raise
@@ -1,5 +1,8 @@
-import os, subprocess, zipfile, glob, datetime, logging
+import os, zipfile, glob, datetime, logging
+from types import MappingProxyType
 from jinja2 import Environment, FileSystemLoader, select_autoescape, Template
+from .metrics import span
+from .tracing import run_traced
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -29,24 +32,62 @@ REGION_LETTER_TEMPLATE: dict[str, str] = {
     "GL": "cover_letter_standard_global.tex.j2",
 }
 
+def templates_for(region:str) -> tuple[str, str]:
+    """(resume template, cover letter template) for a region, GL if unknown"""
+    return (REGION_RESUME_TEMPLATE.get(region, REGION_RESUME_TEMPLATE["GL"]),
+            REGION_LETTER_TEMPLATE.get(region, REGION_LETTER_TEMPLATE["GL"]))
+
+def freeze(value):
+    """Read-only copy of a model_dump(): dicts become read-only mappings, lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class RenderContext:
+    """Template contexts for a batch of jobs sharing one profile.
+
+    The profile is serialized once per batch (not twice per job) and the
+    job's dump is shared by its resume and cover letter; both are frozen, so
+    one template can't leak changes into another job's render.
+    """
+
+    def __init__(self, profile=None, profile_dump=None):
+        self.profile = profile_dump if isinstance(profile_dump, MappingProxyType) else freeze(
+            profile_dump if profile_dump is not None else profile.model_dump())
+
+    def for_job(self, job, out)->tuple[dict, dict]:
+        """(resume_ctx, cover_letter_ctx) for render_tex; None for a document the output doesn't have"""
+        job_dump = freeze(job.model_dump())
+        return ({"profile": self.profile, "out": out.resume.model_dump(), "job": job_dump} if out.resume is not None else None,
+                {"profile": self.profile, "out": out.cover_letter.model_dump(), "job": job_dump} if out.cover_letter is not None else None)
+
+
 def render_tex(resume_ctx:dict, cl_ctx:dict, region:str, out_base:str):
-    resume_template_name: str = REGION_RESUME_TEMPLATE.get(region, REGION_RESUME_TEMPLATE["GL"])
-    cover_letter_template_name: str  = REGION_LETTER_TEMPLATE.get(region, REGION_LETTER_TEMPLATE["GL"])
-    resume_template: Template = env.get_template(resume_template_name)
-    cover_letter_template: Template  = env.get_template(cover_letter_template_name)
-    tex_resume: str = resume_template.render(**resume_ctx)
-    tex_cover_letter: str = cover_letter_template.render(**cl_ctx)
-    resume_path: str = os.path.join(ART_DIR, f"{out_base}_resume.tex")
-    cover_letter_path: str  = os.path.join(ART_DIR, f"{out_base}_cover.tex")
-    open(resume_path, "w", encoding="utf-8").write(tex_resume)
-    open(cover_letter_path,  "w", encoding="utf-8").write(tex_cover_letter)
+    """Write the resume and cover letter LaTeX; (resume_path, cover_letter_path), None for a skipped (None) context"""
+    resume_template_name, cover_letter_template_name = templates_for(region)
+    resume_path = cover_letter_path = None
+    if resume_ctx is not None:
+        resume_template: Template = env.get_template(resume_template_name)
+        with span("render", region=region, template=resume_template_name):
+            tex_resume: str = resume_template.render(**resume_ctx)
+        resume_path = os.path.join(ART_DIR, f"{out_base}_resume.tex")
+        open(resume_path, "w", encoding="utf-8").write(tex_resume)
+    if cl_ctx is not None:
+        cover_letter_template: Template  = env.get_template(cover_letter_template_name)
+        with span("render", region=region, template=cover_letter_template_name):
+            tex_cover_letter: str = cover_letter_template.render(**cl_ctx)
+        cover_letter_path = os.path.join(ART_DIR, f"{out_base}_cover.tex")
+        open(cover_letter_path,  "w", encoding="utf-8").write(tex_cover_letter)
     return resume_path, cover_letter_path
 
 def _latexmk(cwd:str, fname:str):
     """Compile LaTeX using local latexmk"""
-    result = subprocess.run(
-        ["latexmk", "-pdf", "-interaction=nonstopmode", "-halt-on-error", fname],
-        cwd=cwd, capture_output=True, text=True, timeout=120
+    result = run_traced(
+        "latexmk", ["latexmk", "-pdf", "-interaction=nonstopmode", "-halt-on-error", fname],
+        cwd=cwd, timeout=120
     )
     if result.returncode != 0:
         raise Exception(f"latexmk failed with code {result.returncode}: {result.stderr}")
@@ -56,16 +97,24 @@ def _docker_latexmk(cwd:str, fname:str):
     """Compile LaTeX using Docker container"""
     # Convert Windows path to Docker-compatible format
     docker_path = cwd.replace('\\', '/').replace('C:', '/c')
-    result = subprocess.run([
+    result = run_traced("latexmk.docker", [
         "docker","run","--rm","-v",f"{docker_path}:/data","blang/latex:ctanfull",
         "latexmk","-pdf","-interaction=nonstopmode","-halt-on-error",fname
-    ], capture_output=True, text=True, timeout=240)
+    ], timeout=240)
     if result.returncode != 0:
         raise Exception(f"Docker latexmk failed with code {result.returncode}: {result.stderr}")
     return result
 
-def compile_tex(tex_path:str) -> bool:
-    """Compile LaTeX to PDF. Returns True if successful, False otherwise."""
+def compile_tex(tex_path:str, region:str="", template:str="") -> bool:
+    """Compile LaTeX to PDF. Returns True if successful, False otherwise.
+    region/template only label the timing span."""
+    with span("compile", region=region, template=template) as s:
+        ok = _compile_tex(tex_path)
+        if not ok:
+            s["status"] = "error"
+    return ok
+
+def _compile_tex(tex_path:str) -> bool:
     cwd = os.path.dirname(tex_path)
     fname = os.path.basename(tex_path)
     pdf_path = tex_path.replace('.tex', '.pdf')
@@ -102,6 +151,10 @@ def compile_tex(tex_path:str) -> bool:
 
 def bundle(run_id:str):
     """Create ZIP bundle with PDFs prioritized"""
+    with span("bundle"):
+        return _bundle(run_id)
+
+def _bundle(run_id:str):
     zip_path = os.path.join(ART_DIR, f"{run_id}_bundle.zip")
     
     with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
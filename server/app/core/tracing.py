@@ -0,0 +1,197 @@
+# OpenTelemetry tracing
+#
+# Spans are created through the OpenTelemetry API everywhere (a no-op until a
+# provider is configured). configure_tracing() installs the SDK provider with
+# the exporter named by TRACING_EXPORTER:
+# - "none" (default): spans are not recorded
+# - "console": JSON spans on stdout
+# - "file": one JSON span per line in TRACING_FILE (default traces.jsonl);
+#   each node writes its own file, join them on trace_id to follow a run
+# - "memory": kept in-process (tests, benchmarks), see memory_exporter()
+# Trace context crosses process boundaries as W3C traceparent: HTTP headers,
+# Celery task headers and the TRACEPARENT env var of latexmk subprocesses.
+
+import os, time, logging, threading, subprocess
+from opentelemetry import trace, propagate
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+
+tracer = trace.get_tracer("umukozihr")
+
+_lock = threading.Lock()
+_provider = None
+_exporters = {}
+
+
+def configure_tracing(exporter:str=None, service_name:str=None):
+    """Install the SDK tracer provider once per process and attach an exporter.
+
+    Returns the exporter (None if tracing is off or opentelemetry-sdk is missing).
+    """
+    global _provider
+    exporter = (exporter or TRACING_EXPORTER).lower()
+    if exporter == "none":
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor, ConsoleSpanExporter
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    except ImportError:
+        logger.warning("TRACING_EXPORTER is set but opentelemetry-sdk is not installed, tracing disabled")
+        return None
+
+    with _lock:
+        if exporter in _exporters:
+            return _exporters[exporter]
+        if _provider is None:
+            name = service_name or os.getenv("OTEL_SERVICE_NAME", "umukozihr-api")
+            _provider = TracerProvider(resource=Resource.create({"service.name": name}))
+            trace.set_tracer_provider(_provider)
+
+        if exporter == "memory":
+            span_exporter = InMemorySpanExporter()
+            _provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+        elif exporter == "console":
+            span_exporter = ConsoleSpanExporter()
+            _provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        elif exporter == "file":
+            out = open(TRACING_FILE, "a", encoding="utf-8")
+            span_exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+            _provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        else:
+            logger.warning(f"Unknown TRACING_EXPORTER: {exporter}, tracing disabled")
+            return None
+        _exporters[exporter] = span_exporter
+        logger.info(f"Tracing enabled: exporter={exporter}")
+        return span_exporter
+
+
+def memory_exporter():
+    """The in-memory exporter (configured on first use)"""
+    return configure_tracing("memory")
+
+
+def inject_headers(carrier:dict)->dict:
+    """Write the current trace context (traceparent) into a headers dict"""
+    propagate.inject(carrier)
+    return carrier
+
+
+class _AttrGetter:
+    """Reads propagation keys from dicts or objects (Celery's task.request)"""
+
+    def get(self, carrier, key):
+        value = carrier.get(key) if isinstance(carrier, dict) else getattr(carrier, key, None)
+        if value is None:
+            return None
+        return value if isinstance(value, list) else [value]
+
+    def keys(self, carrier):
+        return list(carrier) if isinstance(carrier, dict) else []
+
+def extract_context(carrier):
+    return propagate.extract(carrier, getter=_AttrGetter())
+
+
+async def trace_requests(request, call_next):
+    """HTTP middleware: one SERVER span per request, continuing an incoming traceparent.
+    Only needed on FastAPI versions without native telemetry (see app.main)."""
+    parent = extract_context(dict(request.headers))
+    with tracer.start_as_current_span(f"HTTP {request.method}", context=parent, kind=SpanKind.SERVER,
+                                      attributes={"http.method": request.method, "http.target": request.url.path}) as span:
+        response = await call_next(request)
+        route = getattr(request.scope.get("route"), "path", None) or request.url.path
+        span.update_name(f"HTTP {request.method} {route}")
+        span.set_attribute("http.route", route)
+        span.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.set_status(Status(StatusCode.ERROR))
+        return response
+
+
+def instrument_engine(engine):
+    """Span per SQL statement on a SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, ctx, executemany):
+        ctx._otel_span = tracer.start_span(
+            f"db {statement.split(None, 1)[0].upper() if statement else 'SQL'}",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": engine.dialect.name, "db.statement": statement[:1000]},
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, ctx, executemany):
+        span = getattr(ctx, "_otel_span", None)
+        if span is not None:
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        ctx = exception_context.execution_context
+        span = getattr(ctx, "_otel_span", None) if ctx is not None else None
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
+
+
+def run_traced(name:str, cmd:list, cwd:str=None, timeout:float=None, env:dict=None)->subprocess.CompletedProcess:
+    """subprocess.run(capture_output=True, text=True) inside a span.
+
+    The span records the exit code and the child's CPU time, and the child gets
+    TRACEPARENT in its environment so anything it traces joins this trace.
+    """
+    with tracer.start_as_current_span(name, kind=SpanKind.INTERNAL,
+                                      attributes={"process.command": cmd[0], "process.command_line": " ".join(cmd)}) as span:
+        child_env = dict(env if env is not None else os.environ)
+        carrier = inject_headers({})
+        if "traceparent" in carrier:
+            child_env["TRACEPARENT"] = carrier["traceparent"]
+        start = time.perf_counter()
+        if hasattr(os, "wait4"):
+            result, rusage = _run_wait4(cmd, cwd, timeout, child_env)
+            span.set_attribute("process.cpu.user_seconds", rusage.ru_utime)
+            span.set_attribute("process.cpu.system_seconds", rusage.ru_stime)
+        else:  # Windows: no per-child rusage
+            result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, timeout=timeout, env=child_env)
+        span.set_attribute("process.exit_code", result.returncode)
+        span.set_attribute("process.wall_seconds", time.perf_counter() - start)
+        if result.returncode != 0:
+            span.set_status(Status(StatusCode.ERROR, f"exit code {result.returncode}"))
+        return result
+
+
+def _run_wait4(cmd:list, cwd:str, timeout:float, env:dict):
+    """Run a child and reap it with wait4() to get its own rusage (thread-safe, unlike RUSAGE_CHILDREN)"""
+    import tempfile
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=out, stderr=err, env=env)
+        timed_out = threading.Event()
+
+        def _kill():
+            timed_out.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, _kill) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+        finally:
+            if timer:
+                timer.cancel()
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode("utf-8", errors="replace")
+        stderr = err.read().decode("utf-8", errors="replace")
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr), rusage
@@ -1,68 +1,25 @@
-import json
-from jsonschema import validate, Draft202012Validator
-from app.models import Profile
+from pydantic import ValidationError
+from app.models import Profile, LLMOutput
+from .schema import OUTPUT_SECTIONS, output_model
 
-OUTPUT_JSON_SCHEMA = {
-  "type":"object",
-  "required":["resume","cover_letter","ats"],
-  "properties":{
-    "resume":{
-      "type":"object",
-      "required":["summary","skills_line","experience","projects","education"],
-      "properties":{
-        "summary":{"type":"string"},
-        "skills_line":{"type":"array","items":{"type":"string"}},
-        "experience":{"type":"array","items":{
-          "type":"object",
-          "required":["title","company","bullets"],
-          "properties":{
-            "title":{"type":"string"},
-            "company":{"type":"string"},
-            "start":{"type":"string"},
-            "end":{"type":"string"},
-            "bullets":{"type":"array","items":{"type":"string"}}
-          }
-        }},
-        "projects":{"type":"array"},
-        "education":{"type":"array"}
-      }
-    },
-    "cover_letter":{
-      "type":"object",
-      "required":["address","intro","why_you","evidence","why_them","close"],
-      "properties":{
-        "address":{"type":"string"},
-        "intro":{"type":"string"},
-        "why_you":{"type":"string"},
-        "evidence":{"type":"array","items":{"type":"string"}},
-        "why_them":{"type":"string"},
-        "close":{"type":"string"}
-      }
-    },
-    "ats":{
-      "type":"object",
-      "required":["jd_keywords_matched","risks"],
-      "properties":{
-        "jd_keywords_matched":{"type":"array","items":{"type":"string"}},
-        "risks":{"type":"array","items":{"type":"string"}}
-      }
-    }
-  }
-}
+# The output schema lives in app.core.schema (derived from LLMOutput), so
+# validation is a single pydantic pass: parse + validate + build the model.
 
-def validate_or_error(raw_json:str)->dict:
+def _format_errors(e:ValidationError)->str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or '<root>'}: {err['msg']}" for err in e.errors())
+
+def validate_or_error(raw_json:str, sections:tuple=OUTPUT_SECTIONS)->LLMOutput:
+    """Parse an answer that must hold these top-level sections (see app.core.schema.sections_for)"""
     try:
-        data = json.loads(raw_json)
-    except Exception as e:
-        raise ValueError(f"Invalid JSON: {e}")
-    errors = sorted(Draft202012Validator(OUTPUT_JSON_SCHEMA).iter_errors(data), key=lambda e: e.path)
-    if errors:
-        raise ValueError("Schema errors: " + "; ".join([e.message for e in errors]))
-    return data
+        return LLMOutput(**dict(output_model(sections).model_validate_json(raw_json)))
+    except ValidationError as e:
+        if any(err["type"] == "json_invalid" for err in e.errors()):
+            raise ValueError(f"Invalid JSON: {_format_errors(e)}")
+        raise ValueError("Schema errors: " + _format_errors(e))
 
-def business_rules_check(data:dict, profile:Profile):
+def business_rules_check(out:LLMOutput, profile:Profile):
     # company/title safety: must be subset of profile companies (or blank)
     prof_companies = {r.company for r in profile.experience}
-    for r in data["resume"]["experience"]:
-        if r["company"] and r["company"] not in prof_companies:
-            raise ValueError(f"company not in profile: {r['company']}")
+    for r in (out.resume.experience if out.resume else ()):
+        if r.company and r.company not in prof_companies:
+            raise ValueError(f"company not in profile: {r.company}")
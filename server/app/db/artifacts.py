@@ -0,0 +1,100 @@
+# Normalized artifact records
+#
+# Every generated file (LaTeX source, PDF, zip bundle) gets a row in the
+# artifacts table: storage key, size, sha256 and compile status. Run.artifacts_urls
+# keeps only the URL map the client uses; the LaTeX sources that used to be
+# inlined there (*_tex_content / *_tex_preview) are no longer stored in the
+# database (`python migrate.py` backfills and strips older runs).
+
+import os, re, hashlib
+from urllib.parse import urlparse
+from app.core.tex_compile import ART_DIR
+from .models import Artifact
+
+INLINE_CONTENT_KEYS = ("resume_tex_content", "resume_tex_preview", "cover_letter_tex_content", "cover_letter_tex_preview")
+
+# "resume_tex" (one run per job) or "<job>_cover_pdf" (Celery runs covering several jobs)
+_URL_KEY = re.compile(r"^(?:(?P<job>.+)_)?(?P<doc>resume|cover_letter|cover)_(?P<ext>tex|pdf)$")
+
+
+def strip_inline_content(urls:dict)->dict:
+    """artifacts_urls without the inlined LaTeX sources"""
+    return {k: v for k, v in (urls or {}).items() if k not in INLINE_CONTENT_KEYS}
+
+
+def _file_stats(path:str)->tuple:
+    """(size, sha256) of a file, (None, None) if it doesn't exist"""
+    if not os.path.isfile(path):
+        return None, None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return os.path.getsize(path), digest.hexdigest()
+
+
+def artifact_rows(run_id, urls:dict, art_dir:str=ART_DIR)->list:
+    """Column values of the artifacts rows for the files named in a run's artifacts_urls.
+
+    Size and hash come from the file in art_dir, or from the inlined LaTeX
+    source when the file is gone; compile status from "pdf_compilation".
+    """
+    urls = urls or {}
+    compiled = urls.get("pdf_compilation") or {}
+    rows = []
+    for key, url in urls.items():
+        if not isinstance(url, str) or not url:
+            continue
+        if key == "zip":
+            kind, job_key, doc, ext = "bundle", None, None, "zip"
+        else:
+            match = _URL_KEY.match(key)
+            if not match:
+                continue
+            doc = "cover_letter" if match["doc"] == "cover" else match["doc"]
+            ext = match["ext"]
+            kind, job_key = f"{doc}_{ext}", match["job"] or urls.get("job_id")
+
+        file_name = os.path.basename(urlparse(url).path)
+        size, content_hash = _file_stats(os.path.join(art_dir, file_name))
+        inline = urls.get(f"{doc}_tex_content") if ext == "tex" else None
+        if size is None and isinstance(inline, str):
+            data = inline.encode("utf-8")
+            size, content_hash = len(data), hashlib.sha256(data).hexdigest()
+
+        if ext == "pdf":
+            compile_status = "ok"
+        elif ext == "tex" and f"{doc}_success" in compiled:
+            compile_status = "ok" if compiled[f"{doc}_success"] else "failed"
+        else:
+            compile_status = None
+
+        rows.append({
+            "run_id": run_id,
+            "job_key": job_key,
+            "kind": kind,
+            "storage": "local" if url.startswith("/artifacts/") else "s3",
+            "storage_key": f"artifacts/{file_name}",
+            "size_bytes": size,
+            "content_hash": content_hash,
+            "compile_status": compile_status,
+        })
+    return rows
+
+
+def artifacts_from_urls(run_id, urls:dict, art_dir:str=ART_DIR)->list:
+    """Artifact objects for a run, see artifact_rows()"""
+    return [Artifact(**row) for row in artifact_rows(run_id, urls, art_dir)]
+
+
+def reusable_pdfs(artifacts:list, art_dir:str=ART_DIR)->dict:
+    """doc -> (sha256 of its LaTeX source, local PDF path) for a single-job run's compiled documents,
+    see app.core.incremental.reuse_pdf()"""
+    by_kind = {a.kind: a for a in artifacts}
+    reuse = {}
+    for doc in ("resume", "cover_letter"):
+        tex, pdf = by_kind.get(f"{doc}_tex"), by_kind.get(f"{doc}_pdf")
+        if tex is None or pdf is None or not tex.content_hash or pdf.storage != "local":
+            continue
+        reuse[doc] = (tex.content_hash, os.path.join(art_dir, os.path.basename(pdf.storage_key)))
+    return reuse
@@ -0,0 +1,51 @@
+# Bulk persistence for multi-job generation
+#
+# generate() used to add() each Job, commit, then refresh() every one just to
+# read back the id the database had been handed anyway (uuid4 is a Python-side
+# default): one SELECT per job. Here ids are assigned in Python up front and
+# each table is written with a single executemany, which SQLAlchemy batches
+# into multi-row INSERTs (insertmanyvalues) on PostgreSQL and SQLite. Nothing
+# is read back. Mapper events (after_insert) don't fire for these statements:
+# caches kept fresh by them also need a do_orm_execute hook (see the history
+# total in app.routes.v1_history).
+
+import uuid
+from datetime import datetime
+from sqlalchemy import insert
+
+
+def job_rows(user_id:uuid.UUID, jobs:list)->list:
+    """Column values for a Job per JobJD, with ids assigned client-side"""
+    now = datetime.utcnow()
+    return [{
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "company": j.company,
+        "title": j.title,
+        "jd_text": j.jd_text,
+        "region": j.region,
+        "outputs": list(j.outputs),
+        "created_at": now,
+    } for j in jobs]
+
+
+def run_row(user_id:uuid.UUID, job_id:uuid.UUID, llm_output:dict, artifacts_urls:dict,
+            profile_version:int=None, status:str="completed", profile_fingerprint:dict=None)->dict:
+    """Column values for one Run, with its id assigned client-side"""
+    return {
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "job_id": job_id,
+        "status": status,
+        "profile_version": profile_version,
+        "profile_fingerprint": profile_fingerprint,
+        "llm_output": llm_output,
+        "artifacts_urls": artifacts_urls,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def bulk_insert(db, model, rows:list):
+    """One batched INSERT of rows into model's table (no-op for an empty list)"""
+    if rows:
+        db.execute(insert(model), rows)
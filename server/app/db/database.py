@@ -1,16 +1,168 @@
 import os
-from sqlalchemy import create_engine
+import time
+import logging
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from app.core.metrics import Histogram, register_collector, register_histogram
+from app.core.tracing import instrument_engine
+
+logger = logging.getLogger(__name__)
 
 # Get database URL from environment variable or use default SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./umukozihr.db")
 
-# For SQLite, we need to add check_same_thread=False for web applications
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+# Connection pool (per process: size it so web workers x (size + overflow) plus
+# Celery workers x (size + overflow) stays under the server's max_connections)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # below the server/proxy idle timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# SQLite (dev): WAL lets readers run alongside the writer; busy_timeout waits instead of "database is locked"
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+POOL_WAIT_SECONDS = register_histogram(Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pooled DB connection",
+    ("engine",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+))
+
+
+# engine name -> engine, for metrics and the after-fork reset
+_engines = {}
+# engine name -> counters; kept outside the pool, which engine.dispose() replaces
+_pool_stats = {}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection"""
+
+    def _do_get(self):
+        name = self.logging_name or "default"
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:  # connect failures etc. are not pool exhaustion
+            _pool_stats[name]["timeouts"] += 1
+            raise
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - start, engine=name)
+
+
+def make_engine(url:str=DATABASE_URL, name:str="default", **kwargs):
+    """create_engine with the pool settings above, tracing and pool metrics.
+
+    SQLite gets check_same_thread=False and, for file databases, WAL mode.
+    kwargs override any create_engine argument.
+    """
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}, "pool_pre_ping": DB_POOL_PRE_PING}
+        if ":memory:" not in url and url not in ("sqlite://", "sqlite:///"):
+            options.update(poolclass=TimedQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                           pool_timeout=DB_POOL_TIMEOUT)
+    else:
+        options = {
+            "poolclass": TimedQueuePool,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+    options.update(kwargs)
+    return _setup_engine(create_engine(url, pool_logging_name=name, **options), name)
+
+
+def _setup_engine(new_engine, name:str):
+    """SQLite pragmas, invalidation counter, tracing; registers the engine for metrics and fork reset"""
+    _pool_stats[name] = {"timeouts": 0, "invalidated": 0}
+
+    @event.listens_for(new_engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        if new_engine.dialect.name == "sqlite":
+            cursor = dbapi_conn.cursor()
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            if SQLITE_WAL and new_engine.url.database not in (None, "", ":memory:"):
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+    @event.listens_for(new_engine.pool, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exception):
+        # stale connection caught by pre-ping, or dropped mid-query
+        _pool_stats[name]["invalidated"] += 1
+        logger.warning("DB connection invalidated (engine=%s): %s", name, exception)
+
+    instrument_engine(new_engine)
+    _engines[name] = new_engine
+    return new_engine
+
+
+def async_url(url:str)->str:
+    """Map a sync DATABASE_URL to its async driver (asyncpg / aiosqlite)"""
+    scheme, sep, rest = url.partition("://")
+    driver = scheme.split("+", 1)[0]
+    if driver in ("postgresql", "postgres"):
+        # libpq's sslmode isn't an asyncpg argument; asyncpg takes the same values as ssl=
+        return "postgresql+asyncpg://" + rest.replace("sslmode=", "ssl=")
+    if driver == "sqlite":
+        return "sqlite+aiosqlite://" + rest
+    return url
+
+
+def make_async_engine(url:str=DATABASE_URL, name:str="async", **kwargs):
+    """AsyncEngine counterpart of make_engine() (same pool settings, pragmas and metrics)"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    url = async_url(url)
+    if url.startswith("sqlite"):
+        options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    else:
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+    options.update(kwargs)
+    async_engine = create_async_engine(url, pool_logging_name=name, **options)
+    _setup_engine(async_engine.sync_engine, name)
+    return async_engine
+
+
+def _reset_pools_after_fork():
+    # A forked child (Celery prefork worker, gunicorn worker) inherits the
+    # parent's pooled sockets; using them from two processes corrupts both
+    # sessions. Drop the inherited connections without closing them (they
+    # still belong to the parent) so the child opens its own.
+    for e in _engines.values():
+        e.dispose(close=False)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def _pool_metrics():
+    queue_pools = [(name, e.pool) for name, e in _engines.items() if isinstance(e.pool, QueuePool)]
+    return [
+        ("db_pool_size", "gauge", "Configured pool size", [({"engine": n}, p.size()) for n, p in queue_pools]),
+        ("db_pool_checked_out", "gauge", "Connections currently checked out", [({"engine": n}, p.checkedout()) for n, p in queue_pools]),
+        ("db_pool_overflow", "gauge", "Connections open beyond pool_size", [({"engine": n}, max(0, p.overflow())) for n, p in queue_pools]),
+        ("db_pool_timeouts_total", "counter", "Checkouts that timed out waiting for a connection",
+         [({"engine": n}, _pool_stats[n]["timeouts"]) for n in _engines]),
+        ("db_pool_invalidated_total", "counter", "Connections invalidated (failed pre-ping or disconnect)",
+         [({"engine": n}, _pool_stats[n]["invalidated"]) for n in _engines]),
+    ]
+
+register_collector("db_pool", _pool_metrics)
+
+
+engine = make_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -20,4 +172,28 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Async path for light read endpoints (history, profile, status polling): they
+# run on the event loop instead of taking a threadpool thread. Celery tasks and
+# the generation pipeline keep the sync engine above. Created on first use so
+# processes that never serve async routes don't need asyncpg/aiosqlite.
+_async_engine = None
+_async_sessionmaker = None
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_engine = make_async_engine()
+        _async_sessionmaker = async_sessionmaker(bind=_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessionmaker()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Text, JSON, DateTime, ForeignKey, Integer, Float, Boolean
+from sqlalchemy import Column, String, Text, JSON, DateTime, ForeignKey, Integer, Float, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import deferred
 from datetime import datetime
 import uuid
 from .database import Base
@@ -29,11 +30,12 @@ class Job(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     company = Column(String)
     title = Column(String)
-    jd_text = Column(Text)
+    jd_text = deferred(Column(Text))  # large; loaded on first access (async sessions: undefer explicitly)
     region = Column(String)
     url = Column(String, nullable=True)
     is_fetched = Column(Boolean, default=False)
     fetch_status = Column(String, nullable=True)
+    outputs = Column(JSON, nullable=True)  # documents generated (JobJD.outputs); None = resume and cover letter
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Run(Base):
@@ -44,6 +46,28 @@ class Run(Base):
     job_id = Column(UUID(as_uuid=True), ForeignKey("jobs.id"))
     status = Column(String, default="pending")  # pending, processing, completed, failed
     profile_version = Column(Integer, nullable=True)
-    llm_output = Column(JSON)
+    profile_fingerprint = Column(JSON, nullable=True)  # per-field profile hashes, see app.core.incremental
+    llm_output = deferred(Column(JSON))  # whole generated resume/cover letter; loaded on first access
     artifacts_urls = Column(JSON)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Artifact(Base):
+    """One generated file of a run (see app.db.artifacts)"""
+    __tablename__ = "artifacts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    run_id = Column(UUID(as_uuid=True), ForeignKey("runs.id"), nullable=False)
+    job_key = Column(String, nullable=True)  # job id/title, for runs covering several jobs
+    kind = Column(String, nullable=False)  # resume_tex, resume_pdf, cover_letter_tex, cover_letter_pdf, bundle
+    storage = Column(String, default="local")  # local | s3
+    storage_key = Column(String, nullable=False)  # artifacts/<file>: under the artifacts dir, or the S3 key
+    size_bytes = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # sha256 hex
+    compile_status = Column(String, nullable=True)  # ok | failed (LaTeX sources and PDFs)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# History pages through a user's runs newest first, keyset on (created_at, id),
+# and joins each to its job. (Existing databases: python migrate.py)
+Index("ix_runs_user_id_created_at_id", Run.user_id, Run.created_at.desc(), Run.id.desc())
+Index("ix_jobs_user_id", Job.user_id)
+Index("ix_artifacts_run_id", Artifact.run_id)
@@ -12,18 +12,16 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.routes.v1_profile import router as profile_router
 from app.routes.v1_generate import router as generate_router
 from app.routes.v1_auth import router as auth_router
+from app.routes.v1_history import router as history_router
+from app.core.metrics import render_metrics
+from app.core.tracing import configure_tracing, trace_requests
+from app.core.logging_config import configure_logging, RequestSampler
 import os
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('umukozihr.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (queue-based, JSON by default; see app.core.logging_config)
+configure_logging()
 logger = logging.getLogger(__name__)
+configure_tracing()
 
 # Auto-ping configuration to prevent Render free tier from sleeping
 PING_INTERVAL = 240  # 4 minutes in seconds
@@ -91,30 +89,43 @@ app.add_middleware(
 )
 logger.info(f"CORS middleware configured with origins: {ALLOWED_ORIGINS}")
 
-# Request logging middleware
+# Request logging middleware: one structured line per request, sampled per
+# route (LOG_SAMPLE); errors and slow requests are always logged
+request_sampler = RequestSampler()
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all incoming requests and responses"""
-    start_time = time.time()
+    """Log requests and responses"""
+    start_time = time.perf_counter()
+    path = request.url.path
 
-    # Log incoming request
-    logger.info(f"Incoming request: {request.method} {request.url.path}")
-    logger.info(f"Request headers: {dict(request.headers)}")
-    logger.info(f"Request client: {request.client.host if request.client else 'unknown'}")
-
-    # Process request
     try:
         response = await call_next(request)
-        process_time = time.time() - start_time
-
-        # Log response
-        logger.info(f"Response: {response.status_code} for {request.method} {request.url.path} (took {process_time:.3f}s)")
-
-        return response
     except Exception as e:
-        logger.error(f"Request failed: {request.method} {request.url.path} - Error: {str(e)}", exc_info=True)
+        logger.error("Request failed: %s %s - Error: %s", request.method, path, e, exc_info=True,
+                     extra={"method": request.method, "path": path})
         raise
 
+    duration_ms = (time.perf_counter() - start_time) * 1000
+    if request_sampler.should_log(path, response.status_code, duration_ms):
+        logger.info("%s %s %s %.1fms", request.method, path, response.status_code, duration_ms, extra={
+            "method": request.method,
+            "path": path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 1),
+            "client": request.client.host if request.client else None,
+            "sample_rate": request_sampler.rate_for(path),
+        })
+    return response
+
+# Request spans: newer FastAPI releases trace requests natively once a tracer
+# provider is configured; older ones get our middleware (registered last so it
+# wraps request logging too)
+try:
+    import fastapi.telemetry  # noqa: F401
+except ImportError:
+    app.middleware("http")(trace_requests)
+
 # Exception handlers
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
@@ -146,13 +157,19 @@ async def general_exception_handler(request: Request, exc: Exception):
 app.include_router(auth_router)
 app.include_router(profile_router, prefix="/api/v1/profile")
 app.include_router(generate_router, prefix="/api/v1/generate")
+app.include_router(history_router, prefix="/api/v1")
 logger.info("API routes registered successfully (v1.3 endpoints active)")
 
 @app.get("/health")
 def health_check():
-    logger.info("Health check requested")
+    logger.debug("Health check requested")
     return {"status": "healthy", "service": "umukozihrtailor-backend"}
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage latency histograms, LLM scheduler, repair, cache and DB pool metrics"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 ART = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "artifacts"))
 os.makedirs(ART, exist_ok=True)
 app.mount("/artifacts", StaticFiles(directory=ART), name="artifacts")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional, Literal, Dict
 from datetime import datetime
 
@@ -97,6 +97,9 @@ class Profile(BaseModel):
     education: List[Education] = []
     projects: List[Project] = []
 
+Document = Literal["resume", "cover_letter"]
+DOCUMENTS = ("resume", "cover_letter")
+
 class JobJD(BaseModel):
     id: Optional[str] = None
     # "GL" here is Global region... later we may add other regions
@@ -104,11 +107,22 @@ class JobJD(BaseModel):
     company: str
     title: str
     jd_text: str
+    # documents to generate; the LLM schema, prompt, rendering and compilation cover only these
+    outputs: List[Document] = Field(default_factory=lambda: list(DOCUMENTS), min_length=1)
 
 class GenerateRequest(BaseModel):
     profile: Optional[Profile] = None  # Optional for authenticated users (loaded from DB)
     jobs: List[JobJD]
     prefs: Dict = {}
+    outputs: Optional[List[Document]] = Field(None, min_length=1)  # default for jobs that don't set their own
+
+    @model_validator(mode="after")
+    def _apply_outputs(self):
+        if self.outputs:
+            for job in self.jobs:
+                if "outputs" not in job.model_fields_set:
+                    job.outputs = list(self.outputs)
+        return self
 
 # LLM output schema -- let's use gemini or a grq model with tool use...
 class OutRole(BaseModel):
@@ -118,12 +132,24 @@ class OutRole(BaseModel):
     end: Optional[str] = ""
     bullets: List[str]
 
+class OutProject(BaseModel):
+    name: str = ""
+    stack: List[str] = []
+    bullets: List[str] = []
+
+class OutEducation(BaseModel):
+    school: str = ""
+    degree: str = ""
+    period: str = ""  # rendered as-is by the resume templates
+
+# app.core.schema derives both the Gemini response schema and the prompt's
+# JSON Schema from these models, so required fields here are required there.
 class OutResume(BaseModel):
     summary: str
     skills_line: List[str]
     experience: List[OutRole]
-    projects: List[Project] = []
-    education: List[Education] = []
+    projects: List[OutProject]
+    education: List[OutEducation]
 
 class OutCoverLetter(BaseModel):
     address: str
@@ -137,10 +163,12 @@ class OutATS(BaseModel):
     jd_keywords_matched: List[str] = []
     risks: List[str] = []
 
+# A document the job didn't ask for (JobJD.outputs) is None; app.core.schema.output_model
+# is the strict form, with every requested section required.
 class LLMOutput(BaseModel):
-    resume: OutResume
-    cover_letter: OutCoverLetter
-    ats: OutATS
+    resume: Optional[OutResume] = None
+    cover_letter: Optional[OutCoverLetter] = None
+    ats: OutATS = OutATS()
 
 # v1.3 API Request/Response models
 
@@ -193,12 +221,29 @@ class HistoryItem(BaseModel):
     artifacts_urls: Dict
     created_at: str
 
+class ArtifactInfo(BaseModel):
+    """A generated file of a run (artifacts table)"""
+    kind: str
+    job_key: Optional[str] = None
+    storage: str
+    storage_key: str
+    size_bytes: Optional[int] = None
+    content_hash: Optional[str] = None
+    compile_status: Optional[str] = None
+
+class HistoryDetail(HistoryItem):
+    """Response for GET /api/v1/history/{run_id}: a list item plus the full payload"""
+    jd_text: Optional[str] = None
+    llm_output: Optional[Dict] = None
+    artifacts: List[ArtifactInfo] = []
+
 class HistoryResponse(BaseModel):
     """Response for GET /api/v1/history"""
     runs: List[HistoryItem]
-    total: int
+    total: Optional[int] = None  # None when requested with with_total=false
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page; None on the last page
 
 class RegenerateRequest(BaseModel):
     """Request for POST /api/v1/history/{run_id}/regenerate"""
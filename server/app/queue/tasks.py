@@ -1,12 +1,16 @@
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun, task_postrun
+from opentelemetry import context as otel_context
+from opentelemetry.trace import SpanKind, Status, StatusCode, set_span_in_context
 import os, uuid, logging
-from datetime import datetime
-from app.core.tailor import run_tailor
-from app.core.tex_compile import render_tex, compile_tex, bundle
+from app.core.engine import get_engine, run_job, result_to_dict
+from app.core.metrics import span
+from app.core.tracing import configure_tracing, tracer, inject_headers, extract_context
 from app.db.database import SessionLocal
 from app.db.models import Run
+from app.db.artifacts import artifacts_from_urls
 from app.storage.s3 import upload_to_s3
-from app.models import Profile, JobJD
+from app.models import Profile, JobJD, LLMOutput
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +20,36 @@ celery_app = Celery(
     backend=os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 )
 
+configure_tracing(service_name=os.getenv("OTEL_SERVICE_NAME", "umukozihr-worker"))
+
+# Trace context rides in the task message headers (traceparent), so the
+# worker's spans join the trace of the request that queued the task
+_task_spans = {}
+
+@before_task_publish.connect
+def _inject_trace_context(headers=None, **kwargs):
+    if headers is not None:
+        inject_headers(headers)
+
+@task_prerun.connect
+def _start_task_span(task_id=None, task=None, **kwargs):
+    parent = extract_context(task.request)
+    span = tracer.start_span(f"celery {task.name}", context=parent, kind=SpanKind.CONSUMER,
+                             attributes={"celery.task_id": task_id})
+    token = otel_context.attach(set_span_in_context(span, parent))
+    _task_spans[task_id] = (span, token)
+
+@task_postrun.connect
+def _end_task_span(task_id=None, state=None, **kwargs):
+    span, token = _task_spans.pop(task_id, (None, None))
+    if span is None:
+        return
+    if state and state != "SUCCESS":
+        span.set_status(Status(StatusCode.ERROR, state))
+    span.set_attribute("celery.state", state or "")
+    span.end()
+    otel_context.detach(token)
+
 @celery_app.task
 def process_generation(run_id: str, profile_data: dict, jobs_data: list):
     db = SessionLocal()
@@ -34,64 +68,31 @@ def process_generation(run_id: str, profile_data: dict, jobs_data: list):
         profile = Profile(**profile_data)
         jobs = [JobJD(**job_data) for job_data in jobs_data]
         
-        # generate artifacts using your existing logic
-        artifacts = []
+        # tailor, render and compile every job (see app.core.engine)
+        engine = get_engine()
+        results = engine.run(run_id, profile, jobs, lane="bulk")
+        artifacts = [result.artifact for result in results]
         artifact_urls = {}
         
-        for job in jobs:
-            try:
-                out = run_tailor(profile, job)
-            except Exception as e:
-                raise Exception(f"LLM/validation error: {e}")
-            
-            base = f"{run_id}_{(job.id or job.title).replace(' ', '_')}"
-            resume_ctx = {"profile": profile.model_dump(), "out": out.resume.model_dump(), "job": job.model_dump()}
-            cover_letter_ctx = {"profile": profile.model_dump(), "out": out.cover_letter.model_dump(), "job": job.model_dump()}
-
-            resume_tex, cover_letter_tex = render_tex(resume_ctx, cover_letter_ctx, job.region, base)
-
-            for path in (resume_tex, cover_letter_tex):
-                compile_tex(path)
-            
-            # Check if PDFs were generated
-            resume_pdf_path = os.path.join(os.path.dirname(resume_tex), os.path.basename(resume_tex).replace('.tex','.pdf'))
-            cover_letter_pdf_path = os.path.join(os.path.dirname(cover_letter_tex), os.path.basename(cover_letter_tex).replace('.tex','.pdf'))
-            
-            artifact = {
-                "job_id": job.id or job.title,
-                "region": job.region,
-                "resume_tex": f"/artifacts/{os.path.basename(resume_tex)}",
-                "cover_letter_tex": f"/artifacts/{os.path.basename(cover_letter_tex)}",
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-            }
-            
+        for result in results:
+            job_key = result.job.id or result.job.title
             # Upload to S3 if configured, otherwise use local paths
             try:
-                s3_resume_tex = upload_to_s3(resume_tex)
-                s3_cover_tex = upload_to_s3(cover_letter_tex)
-                artifact_urls[f"{job.id or job.title}_resume_tex"] = s3_resume_tex
-                artifact_urls[f"{job.id or job.title}_cover_tex"] = s3_cover_tex
-                
-                if os.path.exists(resume_pdf_path):
-                    artifact["resume_pdf"] = f"/artifacts/{os.path.basename(resume_tex).replace('.tex','.pdf')}"
-                    s3_resume_pdf = upload_to_s3(resume_pdf_path)
-                    artifact_urls[f"{job.id or job.title}_resume_pdf"] = s3_resume_pdf
-                    
-                if os.path.exists(cover_letter_pdf_path):
-                    artifact["cover_letter_pdf"] = f"/artifacts/{os.path.basename(cover_letter_tex).replace('.tex','.pdf')}"
-                    s3_cover_pdf = upload_to_s3(cover_letter_pdf_path)
-                    artifact_urls[f"{job.id or job.title}_cover_pdf"] = s3_cover_pdf
-                    
+                if result.resume_tex:
+                    artifact_urls[f"{job_key}_resume_tex"] = upload_to_s3(result.resume_tex)
+                if result.cover_letter_tex:
+                    artifact_urls[f"{job_key}_cover_tex"] = upload_to_s3(result.cover_letter_tex)
+                if result.resume_pdf:
+                    artifact_urls[f"{job_key}_resume_pdf"] = upload_to_s3(result.resume_pdf)
+                if result.cover_letter_pdf:
+                    artifact_urls[f"{job_key}_cover_pdf"] = upload_to_s3(result.cover_letter_pdf)
             except Exception as upload_error:
                 logger.warning(f"S3 upload failed, using local paths: {upload_error}")
                 # Keep local paths if S3 fails
                 pass
-                
-            artifacts.append(artifact)
         
         # Create zip bundle
-        zip_path = bundle(run_id)
+        zip_path = engine.bundle(run_id)
         if zip_path:
             try:
                 s3_zip_url = upload_to_s3(zip_path)
@@ -105,7 +106,9 @@ def process_generation(run_id: str, profile_data: dict, jobs_data: list):
             "llm_output": {"artifacts": artifacts},
             "artifacts_urls": artifact_urls
         })
-        db.commit()
+        db.add_all(artifacts_from_urls(run.id, artifact_urls))
+        with span("db_commit"):
+            db.commit()
         
         return {"status": "completed", "artifacts": artifacts, "artifact_urls": artifact_urls}
         
@@ -118,4 +121,12 @@ def process_generation(run_id: str, profile_data: dict, jobs_data: list):
         db.commit()
         return {"error": str(e)}
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@celery_app.task
+def generate_job(run_id: str, profile_data: dict, job_data: dict, lane: str = "interactive", include_tex: bool = False,
+                 out_data: dict = None):
+    """One job of a batch fanned out by app.core.engine.CeleryStrategy (out_data: its batched LLM output, if any)"""
+    out = LLMOutput(**out_data) if out_data else None
+    return result_to_dict(run_job(run_id, Profile(**profile_data), JobJD(**job_data), lane=lane, include_tex=include_tex, out=out))
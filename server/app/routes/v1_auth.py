@@ -1,10 +1,12 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from app.db.database import get_db
 from app.db.models import User
-from app.auth.auth import hash_password, verify_password, create_access_token
+from app.auth.auth import create_access_token
+from app.auth.crypto import CryptoBusy, hash_password_async, verify_and_update_async
 
 logger = logging.getLogger(__name__)
 
@@ -18,14 +20,21 @@ class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
+def _busy(e: CryptoBusy) -> HTTPException:
+    logger.warning("Auth crypto pool saturated: %s", e)
+    return HTTPException(status_code=503, detail="Too many login attempts, try again shortly", headers={"Retry-After": "1"})
+
+# The handlers are async so bcrypt runs on the dedicated crypto pool (app.auth.crypto)
+# instead of holding a request-threadpool slot; DB work still goes to the threadpool.
+
 @router.post("/signup")
-def signup(req: SignupRequest, db: Session = Depends(get_db)):
+async def signup(req: SignupRequest, db: Session = Depends(get_db)):
     logger.info(f"=== SIGNUP START === Email: {req.email}")
 
     try:
         # Check if user exists
         logger.info(f"Checking if user exists: {req.email}")
-        existing = db.query(User).filter(User.email == req.email).first()
+        existing = await run_in_threadpool(lambda: db.query(User).filter(User.email == req.email).first())
 
         if existing:
             logger.warning(f"Signup failed - email already registered: {req.email}")
@@ -35,7 +44,7 @@ def signup(req: SignupRequest, db: Session = Depends(get_db)):
 
         # Hash password
         logger.info(f"Hashing password for user: {req.email}")
-        hashed_password = hash_password(req.password)
+        hashed_password = await hash_password_async(req.password)
         logger.info(f"Password hashed successfully, length: {len(hashed_password)}")
 
         # Create user
@@ -49,10 +58,10 @@ def signup(req: SignupRequest, db: Session = Depends(get_db)):
         db.add(user)
 
         logger.info(f"Committing user to database: {req.email}")
-        db.commit()
+        await run_in_threadpool(db.commit)
 
         logger.info(f"Refreshing user object: {req.email}")
-        db.refresh(user)
+        await run_in_threadpool(db.refresh, user)
 
         logger.info(f"User created successfully: {req.email} with ID: {user.id}")
 
@@ -68,42 +77,57 @@ def signup(req: SignupRequest, db: Session = Depends(get_db)):
         }
     except HTTPException:
         raise
+    except CryptoBusy as e:
+        raise _busy(e)
     except Exception as e:
         logger.error(f"=== SIGNUP ERROR === Email: {req.email}, Error: {str(e)}", exc_info=True)
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         raise HTTPException(status_code=500, detail=f"Signup failed: {str(e)}")
 
 @router.post("/login")
-def login(req: LoginRequest, db: Session = Depends(get_db)):
+async def login(req: LoginRequest, db: Session = Depends(get_db)):
     logger.info(f"=== LOGIN START === Email: {req.email}")
 
     try:
         logger.info(f"Querying database for user: {req.email}")
-        user = db.query(User).filter(User.email == req.email).first()
+        user = await run_in_threadpool(lambda: db.query(User).filter(User.email == req.email).first())
 
         if not user:
             logger.warning(f"Login failed - user not found: {req.email}")
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
         logger.info(f"User found, verifying password for: {req.email}")
-        password_valid = verify_password(req.password, str(user.password_hash))
+        password_valid, new_hash = await verify_and_update_async(req.password, str(user.password_hash))
 
         if not password_valid:
             logger.warning(f"Login failed - invalid password for email: {req.email}")
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
-        logger.info(f"Password verified successfully for user: {user.id}")
+        user_id = user.id  # read before commit: an expired instance would reload on the event loop
+        logger.info(f"Password verified successfully for user: {user_id}")
 
-        logger.info(f"Generating access token for user: {user.id}")
-        access_token = create_access_token({"sub": str(user.id)})
+        if new_hash:
+            # cost factor changed or legacy SHA256 hash: store the upgraded hash
+            try:
+                user.password_hash = new_hash
+                await run_in_threadpool(db.commit)
+                logger.info("Password hash upgraded for user: %s", user_id)
+            except Exception as e:
+                logger.warning("Password rehash failed for user %s: %s", user_id, e)
+                await run_in_threadpool(db.rollback)
+
+        logger.info(f"Generating access token for user: {user_id}")
+        access_token = create_access_token({"sub": str(user_id)})
 
-        logger.info(f"=== LOGIN SUCCESS === User ID: {user.id}, Email: {req.email}")
+        logger.info(f"=== LOGIN SUCCESS === User ID: {user_id}, Email: {req.email}")
         return {
             "access_token": access_token,
             "token_type": "bearer"
         }
     except HTTPException:
         raise
+    except CryptoBusy as e:
+        raise _busy(e)
     except Exception as e:
         logger.error(f"=== LOGIN ERROR === Email: {req.email}, Error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
\ No newline at end of file
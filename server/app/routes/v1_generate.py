@@ -1,15 +1,22 @@
 import uuid, os, logging
 import datetime
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from app.models import GenerateRequest, Profile, ProfileV3
-from app.core.tailor import run_tailor
-from app.core.tex_compile import render_tex, compile_tex, bundle
-from app.db.database import get_db
-from app.db.models import User, Profile as DBProfile, Job as DBJob, Run as DBRun
-from app.auth.auth import verify_token
+from app.models import DOCUMENTS, GenerateRequest, JobJD
+from app.core.engine import GenerationError, get_engine
+from app.core.incremental import Previous, affected_sections
+from app.core.profiles import get_parsed_profile, load_profile
+from app.core.metrics import span
+from app.db.database import get_db, get_async_db
+from app.db.models import Job as DBJob, Run as DBRun, Artifact as DBArtifact
+from app.db.artifacts import artifacts_from_urls, artifact_rows, strip_inline_content, reusable_pdfs
+from app.db.bulk import job_rows, run_row, bulk_insert
+from app.auth.auth import verify_token, user_exists, user_exists_async
 from datetime import datetime
 import uuid as python_uuid
 
@@ -18,8 +25,8 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 security = HTTPBearer(auto_error=False)
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    """Optional auth - returns user_id if authenticated, None otherwise"""
+def _token_user_id(credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[python_uuid.UUID]:
+    """User UUID from a valid bearer token, None if absent or invalid"""
     if not credentials:
         return None
 
@@ -30,132 +37,61 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
 
     try:
         # Convert string UUID from JWT back to UUID object for database query
-        user_id_str = payload["sub"]
-        user_id_uuid = python_uuid.UUID(user_id_str)
-
-        # Verify user exists
-        user = db.query(User).filter(User.id == user_id_uuid).first()
-        return str(user.id) if user else None
+        return python_uuid.UUID(payload["sub"])
     except (ValueError, KeyError) as e:
         logger.error(f"Error processing user token: {e}")
         return None
 
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    """Optional auth - returns user_id if authenticated, None otherwise"""
+    user_id_uuid = _token_user_id(credentials)
+    # Verify user exists (cached, see app.auth.auth.user_exists)
+    return str(user_id_uuid) if user_id_uuid and user_exists(db, user_id_uuid) else None
 
-def convert_v3_profile_to_legacy(profile_v3: ProfileV3) -> Profile:
-    """Convert v1.3 ProfileV3 to legacy v1.2 Profile for tailor compatibility"""
-    from app.models import Contact, Role, Education, Project
-
-    # Convert experience
-    legacy_experience = [
-        Role(
-            title=exp.title,
-            company=exp.company,
-            start=exp.start,
-            end=exp.end,
-            bullets=exp.bullets
-        )
-        for exp in profile_v3.experience
-    ]
-
-    # Convert education
-    legacy_education = [
-        Education(
-            school=edu.school,
-            degree=edu.degree,
-            period=f"{edu.start} - {edu.end}" if edu.start and edu.end else ""
-        )
-        for edu in profile_v3.education
-    ]
-
-    # Convert projects
-    legacy_projects = [
-        Project(
-            name=proj.name,
-            stack=proj.stack,
-            bullets=proj.bullets
-        )
-        for proj in profile_v3.projects
-    ]
-
-    # Convert skills (flatten from Skill objects to simple strings)
-    legacy_skills = [skill.name for skill in profile_v3.skills]
-
-    # Create legacy profile
-    return Profile(
-        name=profile_v3.basics.full_name,
-        contacts=Contact(
-            email=profile_v3.basics.email,
-            phone=profile_v3.basics.phone,
-            location=profile_v3.basics.location,
-            links=profile_v3.basics.links
-        ),
-        summary=profile_v3.basics.summary,
-        skills=legacy_skills,
-        experience=legacy_experience,
-        education=legacy_education,
-        projects=legacy_projects
-    )
+async def get_current_user_async(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user on the async session, for endpoints that run on the event loop"""
+    user_id_uuid = _token_user_id(credentials)
+    return str(user_id_uuid) if user_id_uuid and await user_exists_async(db, user_id_uuid) else None
 
 
-def run_generation_for_job(db: Session, user_id: str, job: DBJob, profile_data: dict, profile_version: int) -> DBRun:
+def run_generation_for_job(db: Session, user_id: str, job: DBJob, profile_data: dict, profile_version: int,
+                           original_run: DBRun = None, sections: tuple = ()) -> DBRun:
     """
     Helper function to run generation for a single job
     Used by both /generate and /history/{run_id}/regenerate endpoints
+
+    With `original_run` only the output sections affected by profile changes
+    since that run (plus `sections`) are regenerated, see app.core.incremental
     """
     run_id = str(uuid.uuid4())
     logger.info(f"Running generation for job: {job.title} at {job.company}, run_id: {run_id}")
 
-    # Convert profile data to ProfileV3, then to legacy Profile
-    profile_v3 = ProfileV3(**profile_data)
-    legacy_profile = convert_v3_profile_to_legacy(profile_v3)
+    # ProfileV3 -> legacy Profile, cached per (user, profile version)
+    parsed = get_parsed_profile(user_id, profile_version, profile_data)
 
     # Create JobJD from DBJob
-    from app.models import JobJD
     job_jd = JobJD(
         id=job.title,
         region=job.region,
         company=job.company,
         title=job.title,
-        jd_text=job.jd_text
+        jd_text=job.jd_text,
+        outputs=job.outputs or list(DOCUMENTS)
     )
 
-    # Run tailor
+    # Tailor, render and compile (regenerations queue behind interactive requests for LLM quota)
     try:
-        out = run_tailor(legacy_profile, job_jd)
-        logger.info(f"LLM processing completed for job: {job.title}")
-    except Exception as e:
-        logger.error(f"LLM/validation error for job {job.title}: {e}")
-        raise HTTPException(400, f"LLM/validation error: {e}")
-
-    # Render and compile
-    base = f"{run_id}_{job.title.replace(' ', '_')}"
-    resume_ctx = {"profile": legacy_profile.model_dump(), "out": out.resume.model_dump(), "job": job_jd.model_dump()}
-    cover_letter_ctx = {"profile": legacy_profile.model_dump(), "out": out.cover_letter.model_dump(), "job": job_jd.model_dump()}
-
-    resume_tex_path, cover_letter_tex_path = render_tex(resume_ctx, cover_letter_ctx, job.region, base)
-
-    logger.info(f"Starting PDF compilation for job: {job.title}")
-    resume_pdf_success = compile_tex(resume_tex_path)
-    cover_letter_pdf_success = compile_tex(cover_letter_tex_path)
-
-    # Build artifacts URLs
-    artifacts_urls = {
-        "resume_tex": f"/artifacts/{os.path.basename(resume_tex_path)}",
-        "cover_letter_tex": f"/artifacts/{os.path.basename(cover_letter_tex_path)}",
-        "pdf_compilation": {
-            "resume_success": resume_pdf_success,
-            "cover_letter_success": cover_letter_pdf_success
-        }
-    }
-
-    resume_pdf_path = resume_tex_path.replace('.tex', '.pdf')
-    cover_letter_pdf_path = cover_letter_tex_path.replace('.tex', '.pdf')
-
-    if resume_pdf_success and os.path.exists(resume_pdf_path):
-        artifacts_urls["resume_pdf"] = f"/artifacts/{os.path.basename(resume_pdf_path)}"
-
-    if cover_letter_pdf_success and os.path.exists(cover_letter_pdf_path):
-        artifacts_urls["cover_letter_pdf"] = f"/artifacts/{os.path.basename(cover_letter_pdf_path)}"
+        if original_run is None:
+            result, = get_engine().run(run_id, parsed.legacy, [job_jd], parsed=parsed, lane="bulk")
+        else:
+            previous = Previous(
+                original_run.llm_output or {},
+                affected_sections(original_run.profile_fingerprint, parsed.fingerprint, sections),
+                reusable_pdfs(db.query(DBArtifact).filter(DBArtifact.run_id == original_run.id).all()),
+            )
+            result = get_engine().regenerate(run_id, parsed, job_jd, previous)
+    except GenerationError as e:
+        raise HTTPException(400, str(e))
 
     # Create Run record
     db_run = DBRun(
@@ -164,13 +100,16 @@ def run_generation_for_job(db: Session, user_id: str, job: DBJob, profile_data:
         job_id=job.id,
         status="completed",
         profile_version=profile_version,
-        llm_output=out.model_dump(),
-        artifacts_urls=artifacts_urls,
+        profile_fingerprint=parsed.fingerprint,
+        llm_output=result.out.model_dump(),
+        artifacts_urls=result.artifact,
         created_at=datetime.utcnow()
     )
 
     db.add(db_run)
-    db.commit()
+    db.add_all(artifacts_from_urls(db_run.id, result.artifact))
+    with span("db_commit", region=job.region):
+        db.commit()
     db.refresh(db_run)
 
     return db_run
@@ -194,16 +133,16 @@ def generate(
     # Determine profile source
     profile_to_use = request.profile
     profile_version = None
+    parsed = None
 
     if user_id:
-        # v1.3: Read profile from database for authenticated users
+        # v1.3: Read profile from database for authenticated users (parsed once per version, see app.core.profiles)
         logger.info("Authenticated user - loading profile from database")
-        db_profile = db.query(DBProfile).filter(DBProfile.user_id == python_uuid.UUID(user_id)).first()
+        parsed = load_profile(db, python_uuid.UUID(user_id))
 
-        if db_profile:
-            profile_v3 = ProfileV3(**db_profile.profile_data)
-            profile_to_use = convert_v3_profile_to_legacy(profile_v3)
-            profile_version = db_profile.version
+        if parsed:
+            profile_to_use = parsed.legacy
+            profile_version = parsed.version
             logger.info(f"Loaded profile version {profile_version} from database")
         else:
             logger.error("No profile found in database for authenticated user")
@@ -213,112 +152,39 @@ def generate(
         logger.error("No profile provided and user not authenticated")
         raise HTTPException(status_code=400, detail="Profile required for unauthenticated requests")
 
-    # Persist jobs for authenticated users
+    # Persist jobs for authenticated users (ids assigned here, one batched INSERT; see app.db.bulk)
     db_jobs = []
     if user_id:
-        for j in request.jobs:
-            db_job = DBJob(
-                user_id=python_uuid.UUID(user_id),
-                company=j.company,
-                title=j.title,
-                jd_text=j.jd_text,
-                region=j.region,
-                created_at=datetime.utcnow()
-            )
-            db.add(db_job)
-            db_jobs.append(db_job)
-        db.commit()
-        for db_job in db_jobs:
-            db.refresh(db_job)
-
-    # Process synchronously for all users
-    artifacts = []
-    for idx, j in enumerate(request.jobs):
-        logger.info(f"Processing job: {j.id or j.title} for company: {j.company}")
-
-        # Get corresponding DB job for authenticated users
-        db_job = db_jobs[idx] if user_id and db_jobs else None
-
-        try:
-            out = run_tailor(profile_to_use, j)
-            logger.info(f"LLM processing completed for job: {j.id or j.title}")
-        except Exception as e:
-            logger.error(f"LLM/validation error for job {j.id or j.title}: {e}")
-            raise HTTPException(400, f"LLM/validation error: {e}")
-
-        base = f"{run_id}_{(j.id or j.title).replace(' ', '_')}"
-        resume_ctx = {"profile": profile_to_use.model_dump(), "out": out.resume.model_dump(), "job": j.model_dump()}
-        cover_letter_ctx = {"profile": profile_to_use.model_dump(), "out": out.cover_letter.model_dump(), "job": j.model_dump()}
-
-        resume_tex_path, cover_letter_tex_path = render_tex(resume_ctx, cover_letter_ctx, j.region, base)
-
-        # Compile to PDFs - this is the primary goal
-        logger.info(f"Starting PDF compilation for job: {j.id or j.title}")
-        resume_pdf_success = compile_tex(resume_tex_path)
-        cover_letter_pdf_success = compile_tex(cover_letter_tex_path)
-        
-        # Check PDF paths
-        resume_pdf_path = resume_tex_path.replace('.tex', '.pdf')
-        cover_letter_pdf_path = cover_letter_tex_path.replace('.tex', '.pdf')
-        
-        artifact = {
-            "job_id": j.id or j.title,
-            "region": j.region,
-            "resume_tex": f"/artifacts/{os.path.basename(resume_tex_path)}",
-            "cover_letter_tex": f"/artifacts/{os.path.basename(cover_letter_tex_path)}",
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-            "pdf_compilation": {
-                "resume_success": resume_pdf_success,
-                "cover_letter_success": cover_letter_pdf_success
-            }
-        }
-        
-        # Add PDF download links if compilation succeeded
-        if resume_pdf_success and os.path.exists(resume_pdf_path):
-            artifact["resume_pdf"] = f"/artifacts/{os.path.basename(resume_pdf_path)}"
-            logger.info(f"Resume PDF ready for download: {artifact['resume_pdf']}")
-        else:
-            logger.warning(f"Resume PDF compilation failed for job {j.id or j.title} - TEX file available")
-            
-        if cover_letter_pdf_success and os.path.exists(cover_letter_pdf_path):
-            artifact["cover_letter_pdf"] = f"/artifacts/{os.path.basename(cover_letter_pdf_path)}"
-            logger.info(f"Cover letter PDF ready for download: {artifact['cover_letter_pdf']}")
-        else:
-            logger.warning(f"Cover letter PDF compilation failed for job {j.id or j.title} - TEX file available")
-        
-        # Optional: Include TEX content for preview (but PDFs are the main goal)
-        if os.path.exists(resume_tex_path):
-            with open(resume_tex_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                artifact["resume_tex_content"] = content  # Full content as required by project specs
-                artifact["resume_tex_preview"] = content[:1000] + "..." if len(content) > 1000 else content
-        if os.path.exists(cover_letter_tex_path):
-            with open(cover_letter_tex_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                artifact["cover_letter_tex_content"] = content  # Full content as required by project specs
-                artifact["cover_letter_tex_preview"] = content[:1000] + "..." if len(content) > 1000 else content
+        db_jobs = job_rows(python_uuid.UUID(user_id), request.jobs)
+        bulk_insert(db, DBJob, db_jobs)
+        with span("db_commit"):
+            db.commit()
 
-        artifacts.append(artifact)
-
-        # Persist Run for authenticated users
-        if user_id and db_job:
-            db_run = DBRun(
-                user_id=python_uuid.UUID(user_id),
-                job_id=db_job.id,
-                status="completed",
-                profile_version=profile_version,
-                llm_output=out.model_dump(),
-                artifacts_urls=artifact,
-                created_at=datetime.utcnow()
-            )
-            db.add(db_run)
+    # Tailor, render and compile every job (see app.core.engine); the response includes the LaTeX sources
+    engine = get_engine()
+    try:
+        results = engine.run(run_id, profile_to_use, request.jobs, parsed=parsed, include_tex=True)
+    except GenerationError as e:
+        raise HTTPException(400, str(e))
+    artifacts = [result.artifact for result in results]
 
-    # Commit all runs at once for authenticated users
+    # Insert and commit all runs at once for authenticated users
     if user_id:
-        db.commit()
+        run_rows, artifact_records = [], []
+        for db_job, result in zip(db_jobs, results):
+            db_run = run_row(
+                python_uuid.UUID(user_id), db_job["id"], result.out.model_dump(),
+                strip_inline_content(result.artifact),  # LaTeX sources live in the files, see app.db.artifacts
+                profile_version=profile_version, profile_fingerprint=parsed.fingerprint,
+            )
+            run_rows.append(db_run)
+            artifact_records.extend(artifact_rows(db_run["id"], result.artifact))
+        bulk_insert(db, DBRun, run_rows)
+        bulk_insert(db, DBArtifact, artifact_records)
+        with span("db_commit"):
+            db.commit()
     
-    zip_path = bundle(run_id)
+    zip_path = engine.bundle(run_id)
     logger.info(f"Document generation completed for run_id: {run_id}")
     logger.info(f"Generated {len(artifacts)} artifacts, bundle: {zip_path}")
     
@@ -332,8 +198,25 @@ def generate(
         "status": "completed"  # Since we process synchronously, it's always completed
     }
 
+def _scan_run_files(artifacts_dir: str, run_id: str) -> list:
+    """Names of the files in the artifacts directory that belong to run_id (lists the whole directory)"""
+    if not os.path.isdir(artifacts_dir):
+        return []
+    return [filename for filename in os.listdir(artifacts_dir) if filename.startswith(run_id)]
+
+async def _recorded_run_files(db: AsyncSession, user_id: str, run_id: str) -> list:
+    """Names of run_id's files from the artifacts table, looked up through the user's runs"""
+    result = await db.execute(
+        select(DBArtifact.storage_key)
+        .join(DBRun, DBRun.id == DBArtifact.run_id)
+        .where(DBRun.user_id == python_uuid.UUID(user_id),
+               DBArtifact.storage_key.startswith(f"artifacts/{run_id}_", autoescape=True))
+    )
+    return [os.path.basename(key) for key in result.scalars()]
+
 @router.get("/status/{run_id}")
-def get_generation_status(run_id: str, user_id: str = Depends(get_current_user)):
+async def get_generation_status(run_id: str, user_id: str = Depends(get_current_user_async),
+                                db: AsyncSession = Depends(get_async_db)):
     """Get generation status - for frontend polling compatibility
     
     Since we process synchronously, this endpoint simulates async behavior
@@ -344,12 +227,16 @@ def get_generation_status(run_id: str, user_id: str = Depends(get_current_user))
     # Check if artifacts exist for this run_id in the artifacts directory
     artifacts_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "artifacts"))
     
-    # Look for files matching this run_id pattern
-    matching_files = []
-    if os.path.exists(artifacts_dir):
-        for filename in os.listdir(artifacts_dir):
-            if filename.startswith(run_id):
-                matching_files.append(filename)
+    # Signed-in users' runs are recorded in the artifacts table (the bundle is written after
+    # the commit); anonymous runs only exist on disk, and listing the artifacts directory
+    # grows with every run, so that scan runs in the threadpool rather than on the event loop
+    matching_files = await _recorded_run_files(db, user_id, run_id) if user_id else []
+    if matching_files:
+        zip_name = f"{run_id}_bundle.zip"
+        if await run_in_threadpool(os.path.isfile, os.path.join(artifacts_dir, zip_name)):
+            matching_files.append(zip_name)
+    else:
+        matching_files = await run_in_threadpool(_scan_run_files, artifacts_dir, run_id)
     
     if matching_files:
         # Process exists and completed - reconstruct artifacts list
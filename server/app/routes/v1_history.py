@@ -1,32 +1,117 @@
 """
 History and regeneration endpoints for v1.3
 """
+import os
+import json
+import base64
 import logging
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, desc, event, func, or_, select
 from uuid import UUID
 
-from app.models import HistoryResponse, HistoryItem, RegenerateResponse
-from app.db.database import get_db
-from app.db.models import Run as DBRun, Job as DBJob, Profile as DBProfile
+from app.models import HistoryResponse, HistoryItem, HistoryDetail, ArtifactInfo, RegenerateResponse
+from app.core.cache import TTLCache
+from app.core.schema import OUTPUT_SECTION_MODELS
+from app.db.database import get_db, get_async_db
+from app.db.models import Run as DBRun, Job as DBJob, Profile as DBProfile, Artifact as DBArtifact
+from app.db.artifacts import strip_inline_content
 from app.auth.auth import get_current_user
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Per-user run counts for the history total. Dropped when this process writes
+# runs through a Session: add()/delete() (mapper events) and ORM statements such
+# as session.execute(insert(Run), rows) (do_orm_execute). Core statements on a
+# Connection and runs written by other processes (Celery workers) go unseen:
+# those totals are at most HISTORY_TOTAL_TTL stale.
+HISTORY_TOTAL_TTL = float(os.getenv("HISTORY_TOTAL_TTL", "30"))
+_total_cache = TTLCache("history_total", maxsize=10000, ttl=HISTORY_TOTAL_TTL)
+
+def invalidate_history_total(user_id) -> None:
+    """Drop a user's cached history total (call after writing runs outside a Session)"""
+    _total_cache.pop(str(user_id))
+
+@event.listens_for(DBRun, "after_insert")
+@event.listens_for(DBRun, "after_delete")
+def _on_run_changed(mapper, connection, target):
+    invalidate_history_total(target.user_id)
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_run_statement(orm_execute_state):
+    # insert(Run) with rows and query(Run).delete() bypass the mapper events
+    if not (orm_execute_state.is_insert or orm_execute_state.is_delete) \
+            or orm_execute_state.bind_mapper is None or orm_execute_state.bind_mapper.class_ is not DBRun:
+        return
+    params = orm_execute_state.parameters
+    rows = [params] if isinstance(params, dict) else params or []
+    if orm_execute_state.is_insert and rows and all(row.get("user_id") for row in rows):
+        for user_id in {str(row["user_id"]) for row in rows}:
+            invalidate_history_total(user_id)
+    else:
+        _total_cache.clear()  # can't tell whose runs these are
+
+
+# What a history list row needs: no llm_output or jd_text (see get_history_detail)
+HISTORY_COLUMNS = (
+    DBRun.id, DBRun.job_id, DBRun.status, DBRun.profile_version, DBRun.artifacts_urls, DBRun.created_at,
+    DBJob.company, DBJob.title, DBJob.region,
+)
+
+
+def history_query(user_uuid: UUID):
+    """A user's runs with their jobs, newest first (served by ix_runs_user_id_created_at_id)"""
+    return (
+        select(*HISTORY_COLUMNS)
+        .join(DBJob, DBRun.job_id == DBJob.id)
+        .where(DBRun.user_id == user_uuid)
+        .order_by(desc(DBRun.created_at), desc(DBRun.id))
+    )
+
+
+def encode_cursor(created_at: datetime, run_id: UUID) -> str:
+    """Opaque position after a run: base64 of [created_at, id]"""
+    raw = json.dumps([created_at.isoformat(), run_id.hex], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor; ValueError if the cursor is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, run_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(hex=run_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def after_cursor(query, cursor: str):
+    """Keyset condition: runs strictly older than the cursor in (created_at, id) order"""
+    created_at, run_id = decode_cursor(cursor)
+    return query.where(or_(
+        DBRun.created_at < created_at,
+        and_(DBRun.created_at == created_at, DBRun.id < run_id),
+    ))
+
 
 @router.get("/history", response_model=HistoryResponse)
-def get_history(
-    page: int = 1,
-    page_size: int = 10,
+async def get_history(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    with_total: bool = True,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     GET /api/v1/history
-    List past runs with pagination
+    List past runs, newest first.
+    Pass the previous response's next_cursor to get the next page (keyset:
+    cost doesn't grow with depth); `page` still works as an offset. `total`
+    is cached per user for HISTORY_TOTAL_TTL seconds, with_total=false skips it.
     """
     user_id = current_user["user_id"]
     logger.info(f"Fetching history for user: {user_id}, page: {page}")
@@ -37,61 +122,128 @@ def get_history(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid user ID format")
 
-    # Calculate offset
-    offset = (page - 1) * page_size
-
     # Query runs with joins to get job details
-    runs_query = (
-        db.query(DBRun, DBJob)
-        .join(DBJob, DBRun.job_id == DBJob.id)
-        .filter(DBRun.user_id == user_uuid)
-        .order_by(desc(DBRun.created_at))
-    )
+    runs_query = history_query(user_uuid)
 
     # Get total count
-    total = runs_query.count()
+    total = None
+    if with_total:
+        total = _total_cache.get(str(user_uuid))
+        if total is None:
+            total = (await db.execute(select(func.count()).select_from(runs_query.order_by(None).subquery()))).scalar_one()
+            _total_cache.set(str(user_uuid), total)
 
-    # Get paginated results
-    results = runs_query.offset(offset).limit(page_size).all()
+    # Get paginated results (one extra row tells us whether there is a next page)
+    if cursor:
+        try:
+            page_query = after_cursor(runs_query, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    else:
+        page_query = runs_query.offset((page - 1) * page_size)
+    results = (await db.execute(page_query.limit(page_size + 1))).all()
+    has_more = len(results) > page_size
+    results = results[:page_size]
 
     # Build response items
     history_items = []
-    for run, job in results:
+    for row in results:
+        artifacts_urls = strip_inline_content(row.artifacts_urls)  # runs from before the artifacts table
         history_items.append(
             HistoryItem(
-                run_id=str(run.id),
-                job_id=str(job.id),
-                company=job.company,
-                title=job.title,
-                region=job.region,
-                status=run.status,
-                profile_version=run.profile_version,
-                artifacts_urls=run.artifacts_urls or {},
-                created_at=run.created_at.isoformat()
+                run_id=str(row.id),
+                job_id=str(row.job_id),
+                company=row.company,
+                title=row.title,
+                region=row.region,
+                status=row.status,
+                profile_version=row.profile_version,
+                artifacts_urls=artifacts_urls,
+                created_at=row.created_at.isoformat()
             )
         )
 
+    last_run = results[-1] if results else None
     return HistoryResponse(
         runs=history_items,
         total=total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=encode_cursor(last_run.created_at, last_run.id) if has_more else None
+    )
+
+
+@router.get("/history/{run_id}", response_model=HistoryDetail)
+async def get_history_detail(
+    run_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    GET /api/v1/history/{run_id}
+    One run with its full payload: generated output, JD text and its artifact records
+    """
+    user_id = current_user["user_id"]
+    try:
+        user_uuid = UUID(user_id) if isinstance(user_id, str) else user_id
+        run_uuid = UUID(run_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid run_id format")
+
+    row = (await db.execute(
+        select(DBRun, DBJob)
+        .join(DBJob, DBRun.job_id == DBJob.id)
+        .where(DBRun.id == run_uuid, DBRun.user_id == user_uuid)
+        .options(undefer(DBRun.llm_output), undefer(DBJob.jd_text))
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    run, job = row
+    artifacts = (await db.execute(
+        select(DBArtifact).where(DBArtifact.run_id == run.id).order_by(DBArtifact.job_key, DBArtifact.kind)
+    )).scalars().all()
+    return HistoryDetail(
+        run_id=str(run.id),
+        job_id=str(job.id),
+        company=job.company,
+        title=job.title,
+        region=job.region,
+        status=run.status,
+        profile_version=run.profile_version,
+        artifacts_urls=run.artifacts_urls or {},
+        created_at=run.created_at.isoformat(),
+        jd_text=job.jd_text,
+        llm_output=run.llm_output,
+        artifacts=[ArtifactInfo(
+            kind=a.kind, job_key=a.job_key, storage=a.storage, storage_key=a.storage_key,
+            size_bytes=a.size_bytes, content_hash=a.content_hash, compile_status=a.compile_status,
+        ) for a in artifacts],
     )
 
 
 @router.post("/history/{run_id}/regenerate", response_model=RegenerateResponse)
 def regenerate_run(
     run_id: str,
+    sections: Optional[List[str]] = Query(None, description="Output sections to regenerate even if the profile changes don't affect them: resume, cover_letter, ats"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     POST /api/v1/history/{run_id}/regenerate
     Re-run generation for a past job using current profile
+
+    Incremental: only the sections affected by profile changes since the
+    original run (plus `sections`) go back to the LLM, and documents whose
+    LaTeX is unchanged are not recompiled (see app.core.incremental)
     """
     user_id = current_user["user_id"]
     logger.info(f"Regenerating run: {run_id} for user: {user_id}")
 
+    unknown = [s for s in sections or () if s not in OUTPUT_SECTION_MODELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+
     # Convert string UUID to UUID object for database query
     try:
         user_uuid = UUID(user_id) if isinstance(user_id, str) else user_id
@@ -132,7 +284,9 @@ def regenerate_run(
             user_id=user_id,
             job=job,
             profile_data=profile.profile_data,
-            profile_version=profile.version
+            profile_version=profile.version,
+            original_run=original_run,
+            sections=tuple(sections or ())
         )
 
         logger.info(f"Regeneration successful. New run_id: {new_run.id}")
@@ -1,6 +1,8 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 import os
 
@@ -8,10 +10,11 @@ from app.models import (
     Profile, ProfileV3, ProfileResponse, ProfileUpdateRequest,
     ProfileUpdateResponse, CompletenessResponse
 )
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
 from app.db.models import Profile as DBProfile
 from app.auth.auth import get_current_user
 from app.utils.completeness import calculate_completeness
+from app.core.profiles import invalidate_profile
 
 logger = logging.getLogger(__name__)
 
@@ -33,9 +36,9 @@ def save_profile(profile: Profile):
 # v1.3 endpoints (database-backed)
 
 @router.get("/profile", response_model=ProfileResponse)
-def get_profile(
+async def get_profile(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     GET /api/v1/profile
@@ -56,7 +59,7 @@ def get_profile(
             raise HTTPException(status_code=400, detail="Invalid user ID format")
 
         logger.info(f"Querying database for profile: user_uuid={user_uuid}")
-        db_profile = db.query(DBProfile).filter(DBProfile.user_id == user_uuid).first()
+        db_profile = (await db.execute(select(DBProfile).where(DBProfile.user_id == user_uuid))).scalars().first()
 
         if not db_profile:
             logger.warning(f"Profile not found for user: {user_uuid}")
@@ -119,6 +122,7 @@ def update_profile(
         if db_profile:
             # Update existing profile
             logger.info(f"Updating existing profile - current version: {db_profile.version}")
+            invalidate_profile(user_uuid, db_profile.version)
             db_profile.profile_data = request.profile.model_dump(mode="json")
             db_profile.version += 1
             db_profile.completeness = completeness
@@ -162,9 +166,9 @@ def update_profile(
 
 
 @router.get("/me/completeness", response_model=CompletenessResponse)
-def get_completeness(
+async def get_completeness(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     GET /api/v1/me/completeness
@@ -185,7 +189,7 @@ def get_completeness(
             raise HTTPException(status_code=400, detail="Invalid user ID format")
 
         logger.info(f"Querying database for profile: user_uuid={user_uuid}")
-        db_profile = db.query(DBProfile).filter(DBProfile.user_id == user_uuid).first()
+        db_profile = (await db.execute(select(DBProfile).where(DBProfile.user_id == user_uuid))).scalars().first()
 
         if not db_profile:
             logger.warning(f"No profile found for user: {user_uuid} - returning 0% completeness")
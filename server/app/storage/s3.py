@@ -1,6 +1,7 @@
 import boto3
 import os
 from botocore.exceptions import NoCredentialsError
+from app.core.tracing import tracer
 
 s3_client = boto3.client(
     's3',
@@ -13,6 +14,10 @@ BUCKET_NAME = os.getenv('S3_BUCKET', 'umukozihr-artifacts')
 
 def upload_to_s3(local_path: str) -> str:
     """Upload file to S3 and return signed URL"""
+    with tracer.start_as_current_span("s3.upload", attributes={"s3.bucket": BUCKET_NAME, "file.name": os.path.basename(local_path)}):
+        return _upload_to_s3(local_path)
+
+def _upload_to_s3(local_path: str) -> str:
     try:
         file_name = os.path.basename(local_path)
         s3_key = f"artifacts/{file_name}"
@@ -12,7 +12,7 @@ server_dir = Path(__file__).parent
 sys.path.insert(0, str(server_dir))
 
 from app.db.database import engine, Base
-from app.db.models import User, Profile, Job, Run
+from app.db.models import User, Profile, Job, Run, Artifact
 
 def migrate_v1_2_to_v1_3(db):
     """Migrate v1.2 schema to v1.3 by adding new columns"""
@@ -69,6 +69,10 @@ def migrate_v1_2_to_v1_3(db):
         if 'fetch_status' not in jobs_columns:
             migrations.append("ALTER TABLE jobs ADD COLUMN fetch_status VARCHAR")
 
+        # Add outputs column (resume-only / cover-letter-only jobs)
+        if 'outputs' not in jobs_columns:
+            migrations.append("ALTER TABLE jobs ADD COLUMN outputs JSON")
+
     if 'runs' in inspector.get_table_names():
         runs_columns = [col['name'] for col in inspector.get_columns('runs')]
 
@@ -76,6 +80,10 @@ def migrate_v1_2_to_v1_3(db):
         if 'profile_version' not in runs_columns:
             migrations.append("ALTER TABLE runs ADD COLUMN profile_version INTEGER")
 
+        # Add profile_fingerprint column (incremental regeneration)
+        if 'profile_fingerprint' not in runs_columns:
+            migrations.append("ALTER TABLE runs ADD COLUMN profile_fingerprint JSON")
+
     # Execute migrations
     if migrations:
         print(f"Applying {len(migrations)} schema migrations...")
@@ -95,6 +103,98 @@ def migrate_v1_2_to_v1_3(db):
         print("[OK] Schema is up to date")
 
 
+# Indexes replaced by a newer definition in app.db.models: dropped once the replacement exists
+SUPERSEDED_INDEXES = {
+    "runs": ["ix_runs_user_id_created_at"],  # -> ix_runs_user_id_created_at_id (keyset pagination)
+}
+
+
+def migrate_indexes(bind=None):
+    """Create the indexes declared in app.db.models that an existing database lacks.
+
+    create_all() only builds indexes together with new tables. On PostgreSQL
+    indexes are built CONCURRENTLY so a large runs table stays writable.
+    """
+    from sqlalchemy import inspect, text
+    from sqlalchemy.schema import CreateIndex
+
+    bind = bind if bind is not None else engine
+    print("\n--- Checking indexes ---")
+    inspector = inspect(bind)
+    created = 0
+    for table in (Run.__table__, Job.__table__, Profile.__table__, User.__table__, Artifact.__table__):
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name in existing:
+                continue
+            ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=bind.dialect))
+            if bind.dialect.name == "postgresql":
+                # CONCURRENTLY can't run inside a transaction block
+                ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    print(f"  - {ddl}")
+                    conn.execute(text(ddl))
+            else:
+                with bind.begin() as conn:
+                    print(f"  - {ddl}")
+                    conn.execute(text(ddl))
+            created += 1
+        for name in SUPERSEDED_INDEXES.get(table.name, []):
+            if name in existing:
+                ddl = f"DROP INDEX CONCURRENTLY IF EXISTS {name}" if bind.dialect.name == "postgresql" else f"DROP INDEX IF EXISTS {name}"
+                with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    print(f"  - {ddl}")
+                    conn.execute(text(ddl))
+                created += 1
+    print(f"[OK] Applied {created} index changes" if created else "[OK] Indexes are up to date")
+
+
+def backfill_artifacts(bind=None, art_dir=None, batch_size=500):
+    """Create artifacts rows for runs written before the artifacts table, and
+    strip the LaTeX sources inlined in their artifacts_urls.
+
+    Walks runs in id order in batches, one transaction per batch; runs that
+    already have artifact rows are only stripped, so it is safe to re-run.
+    """
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+    from app.db.artifacts import artifacts_from_urls, strip_inline_content
+    from app.core.tex_compile import ART_DIR
+
+    bind = bind if bind is not None else engine
+    art_dir = art_dir or ART_DIR
+    print("\n--- Backfilling artifacts ---")
+    created = stripped = 0
+    last_id = None
+    while True:
+        with Session(bind) as db:
+            query = select(Run.id, Run.artifacts_urls).order_by(Run.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(Run.id > last_id)
+            batch = db.execute(query).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            ids = [row.id for row in batch]
+            done = set(db.execute(select(Artifact.run_id).where(Artifact.run_id.in_(ids)).distinct()).scalars())
+            for row in batch:
+                if row.id not in done:
+                    rows = artifacts_from_urls(row.id, row.artifacts_urls, art_dir)
+                    db.add_all(rows)
+                    created += len(rows)
+                urls = strip_inline_content(row.artifacts_urls)
+                if row.artifacts_urls is not None and urls != row.artifacts_urls:
+                    db.execute(Run.__table__.update().where(Run.id == row.id).values(artifacts_urls=urls))
+                    stripped += 1
+            db.commit()
+        print(f"  - {created} artifacts created, {stripped} runs stripped", end="\r")
+    print(f"[OK] Backfilled {created} artifacts, stripped inline LaTeX from {stripped} runs")
+    if stripped and bind.dialect.name == "postgresql":
+        print("  Run VACUUM (ANALYZE) runs; to reclaim the space of the stripped LaTeX sources")
+
+
 def create_tables():
     """Create all database tables"""
     try:
@@ -119,7 +219,7 @@ def create_tables():
         else:
             tables = []
 
-        expected_tables = ['users', 'profiles', 'jobs', 'runs']
+        expected_tables = ['users', 'profiles', 'jobs', 'runs', 'artifacts']
         created_tables = [table for table in expected_tables if table in tables]
 
         print(f"Created tables: {created_tables}")
@@ -132,6 +232,8 @@ def create_tables():
 
         # Run v1.2 → v1.3 migrations
         migrate_v1_2_to_v1_3(db)
+        migrate_indexes()
+        backfill_artifacts()
 
         db.close()
 
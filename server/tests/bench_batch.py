@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Batched tailoring benchmark for UmukoziHR Resume Tailor
+Tailors BENCH_JOBS short JDs for one profile on the stub LLM (BENCH_LLM_LATENCY
+seconds per call), two ways:
+- individual: one run_tailor() call per job (profile resent every time)
+- batched:    app.core.batch.tailor_batched() with BENCH_BATCH jobs per
+              request, individual calls only for what a batch didn't cover
+and reports LLM requests, estimated input tokens and the wall time of the
+tailoring stage. The outputs of both modes are compared.
+
+Usage:
+    python tests/bench_batch.py
+    BENCH_JOBS=50 BENCH_BATCH=8 python tests/bench_batch.py
+
+Environment:
+    BENCH_JOBS          jobs tailored (default 20)
+    BENCH_BATCH         jobs per batched request, TAILOR_BATCH_MAX_JOBS (default 5)
+    BENCH_LLM_LATENCY   stub LLM latency per call in seconds (default 0.2)
+    BENCH_OUTPUT        results file (default bench_batch.json)
+"""
+import sys
+import os
+import json
+import time
+import logging
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SELF_PING_ENABLED", "false")
+
+import app.core.batch as batch
+from app.core.backends import StubBackend, set_backend
+from app.core.rate_limit import estimate_tokens
+from app.core.tailor import run_tailor
+from app.models import Profile, Contact, Role, Project, Education, JobJD
+
+JOBS = int(os.getenv("BENCH_JOBS", "20"))
+BATCH = int(os.getenv("BENCH_BATCH", "5"))
+LATENCY = float(os.getenv("BENCH_LLM_LATENCY", "0.2"))
+OUTPUT = os.getenv("BENCH_OUTPUT", "bench_batch.json")
+REGIONS = ["US", "EU", "GL"]
+
+
+class CountingBackend(StubBackend):
+    """Stub backend that records the input tokens of every call"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.input_tokens = 0
+
+    def generate(self, system, prompt, response_schema, max_output_tokens):
+        self.input_tokens += estimate_tokens(system) + estimate_tokens(prompt)
+        return super().generate(system, prompt, response_schema, max_output_tokens)
+
+
+def bench_profile() -> Profile:
+    return Profile(
+        name="Bench Batch",
+        contacts=Contact(email="bench@example.com", phone="+1 555 0100", location="Kigali"),
+        summary="Backend engineer focused on latency, reliability and cost.",
+        skills=["Python", "Go", "PostgreSQL", "Redis", "Kubernetes", "AWS", "FastAPI", "Celery"],
+        experience=[Role(
+            title=f"Senior Engineer {i}", company=f"Company {i}", start=f"{2024 - 2 * i}-01", end=f"{2026 - 2 * i}-01",
+            bullets=[f"Cut p95 latency of service {i}.{j} by {10 + j}% by caching hot paths" for j in range(5)],
+        ) for i in range(6)],
+        projects=[Project(name="tailor", stack=["Python", "Redis"], bullets=["Shipped to 10k users"])],
+        education=[Education(school="University of Rwanda", degree="BSc Computer Science", period="2010 - 2014")],
+    )
+
+
+def tailor_individual(profile, jobs) -> list:
+    return [run_tailor(profile, job, lane="bulk") for job in jobs]
+
+
+def tailor_batched(profile, jobs) -> list:
+    outs = batch.tailor_batched(profile, jobs, lane="bulk")
+    return [out if out is not None else run_tailor(profile, job, lane="bulk") for job, out in zip(jobs, outs)]
+
+
+def measure(tailor, profile, jobs) -> tuple:
+    backend = CountingBackend(latency=LATENCY)
+    set_backend(backend)
+    try:
+        start = time.perf_counter()
+        outs = tailor(profile, jobs)
+        elapsed = time.perf_counter() - start
+    finally:
+        set_backend(None)
+    return outs, {"requests": backend.calls, "input_tokens": backend.input_tokens, "wall_s": round(elapsed, 3)}
+
+
+def main():
+    logging.disable(logging.WARNING)
+
+    print("=" * 60)
+    print(f"Batched tailoring: {JOBS} short JDs, {BATCH} jobs per request, {LATENCY:.2f}s per LLM call")
+    print("=" * 60)
+
+    profile = bench_profile()
+    jobs = [JobJD(id=f"bench-{i}", region=REGIONS[i % len(REGIONS)], company=f"Acme {i}", title="Backend Engineer",
+                  jd_text=f"Acme {i} is hiring a Python engineer to own APIs on PostgreSQL and Redis.")
+            for i in range(JOBS)]
+
+    batch.TAILOR_BATCH_MAX_JOBS = BATCH
+    results, outputs = {}, {}
+    for mode, tailor in (("individual", tailor_individual), ("batched", tailor_batched)):
+        outputs[mode], results[mode] = measure(tailor, profile, jobs)
+        r = results[mode]
+        print(f"{mode:<11} {r['requests']:4d} LLM requests  {r['input_tokens']:8d} input tokens  {r['wall_s']:7.2f} s")
+
+    identical = outputs["individual"] == outputs["batched"]
+    token_reduction = 1 - results["batched"]["input_tokens"] / results["individual"]["input_tokens"]
+    print(f"input token reduction: {token_reduction:.0%}, outputs identical: {identical}, batch stats: {batch.batch_stats()}")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"jobs": JOBS, "batch": BATCH, "llm_latency_s": LATENCY},
+        "identical_output": identical,
+        "input_token_reduction": round(token_reduction, 3),
+        "batch_stats": batch.batch_stats(),
+        "results": results,
+    }
+    with open(OUTPUT, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {OUTPUT}")
+
+    success = identical and results["batched"]["requests"] < results["individual"]["requests"] and token_reduction > 0
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
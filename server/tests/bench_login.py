@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Login-storm benchmark for UmukoziHR Resume Tailor
+Fires a burst of concurrent POST /api/v1/auth/login requests while a steady
+trickle of requests hits a sync "probe" endpoint standing in for the
+generation routes (both share the request threadpool). Runs twice:
+- inline: bcrypt verified inside a sync handler (the old login route)
+- pool:   the async login route, bcrypt on the app.auth.crypto pool
+and reports login and probe p50/p95/p99, so starvation of the other
+endpoints during a login burst shows up directly in the probe latencies.
+
+Usage:
+    python tests/bench_login.py
+    BENCH_LOGINS=400 BCRYPT_ROUNDS=12 BENCH_THREADPOOL=16 python tests/bench_login.py
+
+Environment:
+    BENCH_LOGINS        concurrent logins per run (default 200)
+    BENCH_USERS         distinct users (default 50)
+    BENCH_PROBES        probe requests per run (default 100)
+    BENCH_PROBE_MS      work done by each probe request (default 5)
+    BENCH_THREADPOOL    request threadpool size (default 40, Starlette's default)
+    BENCH_OUTPUT        results file (default bench_login.json)
+    BCRYPT_ROUNDS / BCRYPT_WORKERS / BCRYPT_QUEUE   see app.auth.crypto
+"""
+import sys
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import tempfile
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SELF_PING_ENABLED", "false")
+os.environ.setdefault("BCRYPT_QUEUE", "100000")  # measure queueing, not 503s
+
+import anyio.to_thread
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import app.auth.crypto as crypto
+from app.auth.auth import create_access_token
+from app.db.database import Base, get_db
+from app.db.models import User
+from app.routes import v1_auth
+
+LOGINS = int(os.getenv("BENCH_LOGINS", "200"))
+USERS = int(os.getenv("BENCH_USERS", "50"))
+PROBES = int(os.getenv("BENCH_PROBES", "100"))
+PROBE_MS = float(os.getenv("BENCH_PROBE_MS", "5"))
+THREADPOOL = int(os.getenv("BENCH_THREADPOOL", "40"))
+OUTPUT = os.getenv("BENCH_OUTPUT", "bench_login.json")
+PASSWORD = "correct horse battery staple"
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+def stats(ms: list) -> dict:
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+    }
+
+
+def build_app(SessionLocal) -> FastAPI:
+    app = FastAPI()
+    app.include_router(v1_auth.router)
+
+    def session():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[get_db] = session
+
+    @app.post("/inline-login")
+    def inline_login(req: v1_auth.LoginRequest, db: Session = Depends(get_db)):
+        # the pre-pool login: bcrypt runs on (and blocks) a request threadpool slot
+        user = db.query(User).filter(User.email == req.email).first()
+        if not user or not crypto.verify_password(req.password, str(user.password_hash)):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        return {"access_token": create_access_token({"sub": str(user.id)}), "token_type": "bearer"}
+
+    @app.get("/probe")
+    def probe():
+        time.sleep(PROBE_MS / 1000)
+        return {"ok": True}
+
+    return app
+
+
+async def storm(client: httpx.AsyncClient, login_path: str) -> dict:
+    login_ms, probe_ms, errors = [], [], 0
+
+    async def login(i: int):
+        nonlocal errors
+        start = time.perf_counter()
+        resp = await client.post(login_path, json={"email": f"user{i % USERS}@example.com", "password": PASSWORD})
+        login_ms.append((time.perf_counter() - start) * 1000)
+        if resp.status_code != 200:
+            errors += 1
+
+    async def probes():
+        for _ in range(PROBES):
+            start = time.perf_counter()
+            await client.get("/probe")
+            probe_ms.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await asyncio.gather(probes(), *(login(i) for i in range(LOGINS)))
+    wall = time.perf_counter() - start
+    return {"wall_s": round(wall, 3), "errors": errors, "logins_per_s": round((LOGINS - errors) / wall, 2),
+            "login": stats(login_ms), "probe": stats(probe_ms)}
+
+
+async def run_all(app: FastAPI) -> dict:
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for mode, path in (("inline", "/inline-login"), ("pool", "/api/v1/auth/login")):
+            results[mode] = await storm(client, path)
+            r = results[mode]
+            print(f"{mode:<7} {r['logins_per_s']:8.1f} logins/s, {r['errors']} errors, {r['wall_s']:.2f}s wall")
+            for name in ("login", "probe"):
+                s = r[name]
+                print(f"   {name:<6} p50 {s['p50_ms']:9.1f}  p95 {s['p95_ms']:9.1f}  p99 {s['p99_ms']:9.1f} ms")
+    return results
+
+
+def main():
+    logging.disable(logging.ERROR)
+
+    print("=" * 60)
+    print(f"Login storm: {LOGINS} logins over {USERS} users, {PROBES} probes ({PROBE_MS:g}ms each)")
+    print(f"bcrypt rounds {crypto.BCRYPT_ROUNDS}, crypto workers {crypto.BCRYPT_WORKERS}, threadpool {THREADPOOL}")
+    print("=" * 60)
+    if crypto.pwd_context is None:
+        print("❌ bcrypt backend unavailable (see app.auth.crypto)")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(engine, tables=[User.__table__])
+        SessionLocal = sessionmaker(bind=engine)
+        hashed = crypto.hash_password(PASSWORD)  # one hash for every user; the verify cost is the same
+        with SessionLocal() as db:
+            db.add_all(User(id=uuid.uuid4(), email=f"user{i}@example.com", password_hash=hashed) for i in range(USERS))
+            db.commit()
+
+        results = asyncio.run(run_all(build_app(SessionLocal)))
+        engine.dispose()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"logins": LOGINS, "users": USERS, "probes": PROBES, "probe_ms": PROBE_MS, "threadpool": THREADPOOL,
+                   "bcrypt_rounds": crypto.BCRYPT_ROUNDS, "bcrypt_workers": crypto.BCRYPT_WORKERS},
+        "results": results,
+    }
+    with open(OUTPUT, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {OUTPUT}")
+
+    success = all(r["errors"] == 0 for r in results.values())
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
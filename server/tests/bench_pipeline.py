@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for UmukoziHR Resume Tailor
+Drives run_tailor, render_tex, compile_tex, bundle and POST /api/v1/generate
+against the stub LLM backend (no API key, no network) with synthetic
+profiles and JDs, at several concurrency levels. Reports per-stage
+p50/p95/p99 latency and jobs/sec, and writes everything to a JSON file so
+runs can be compared between commits.
+
+Usage:
+    python tests/bench_pipeline.py
+    BENCH_CONCURRENCY=1,8,32 BENCH_JOBS=64 STUB_LLM_LATENCY=1.5 python tests/bench_pipeline.py
+    BENCH_BASELINE=bench_pipeline_old.json python tests/bench_pipeline.py   # print p95 deltas
+
+Environment:
+    BENCH_JOBS          jobs per concurrency level (default 24)
+    BENCH_CONCURRENCY   comma-separated worker counts (default 1,4,8)
+    BENCH_COMPILE       1/0 run compile_tex (default: only if latexmk is on PATH)
+    BENCH_ROUTE         1/0 also benchmark the /api/v1/generate route (default 1)
+    BENCH_LLM_RPM       scheduler requests/min (default: effectively unlimited)
+    BENCH_OUTPUT        results file (default bench_pipeline.json)
+    BENCH_BASELINE      previous results file to compare against
+    STUB_LLM_*          stub backend latency / failure injection (see app.core.backends)
+"""
+import sys
+import os
+import json
+import glob
+import time
+import shutil
+import logging
+import platform
+import threading
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("STUB_LLM_LATENCY", "0.05")
+os.environ.setdefault("SELF_PING_ENABLED", "false")
+
+import app.core.llm as llm
+from app.core.backends import StubBackend, set_backend
+from app.core.rate_limit import LLMScheduler
+from app.core.tailor import run_tailor
+from app.core.tex_compile import render_tex, compile_tex, bundle, ART_DIR
+from app.models import Profile, Contact, Role, Project, Education, JobJD
+
+JOBS = int(os.getenv("BENCH_JOBS", "24"))
+CONCURRENCY = [int(c) for c in os.getenv("BENCH_CONCURRENCY", "1,4,8").split(",") if c.strip()]
+COMPILE = os.getenv("BENCH_COMPILE", "1" if shutil.which("latexmk") else "0") == "1"
+ROUTE = os.getenv("BENCH_ROUTE", "1") == "1"
+LLM_RPM = float(os.getenv("BENCH_LLM_RPM", "1000000"))
+OUTPUT = os.getenv("BENCH_OUTPUT", "bench_pipeline.json")
+BASELINE = os.getenv("BENCH_BASELINE")
+
+SKILLS = ["Python", "FastAPI", "PostgreSQL", "Redis", "Celery", "Docker", "Kubernetes", "AWS", "Terraform",
+          "React", "TypeScript", "GraphQL", "Kafka", "Spark", "Airflow", "dbt", "Go", "Rust", "gRPC", "Linux",
+          "CI/CD", "Prometheus", "Grafana", "Elasticsearch", "MongoDB", "Snowflake", "Pandas", "PyTorch",
+          "LLMs", "Microservices"]
+REGIONS = ["US", "EU", "GL"]
+
+# (roles, bullets per role, skills, projects)
+PROFILE_SIZES = {"small": (2, 3, 6, 1), "medium": (5, 5, 15, 2), "large": (10, 8, 30, 4)}
+
+
+def synthetic_profile(size: str) -> Profile:
+    roles, bullets, skills, projects = PROFILE_SIZES[size]
+    return Profile(
+        name=f"Bench {size.title()}",
+        contacts=Contact(email="bench@example.com", phone="+1 555 0100", location="Kigali", links=["https://example.com"]),
+        summary="Backend engineer focused on latency, reliability and cost",
+        skills=SKILLS[:skills],
+        experience=[Role(
+            title=f"Senior Engineer {i}",
+            company=f"Company {i}",
+            start=f"{2024 - 2 * i}-01",
+            end=f"{2025 - 2 * i}-12" if i else None,
+            bullets=[f"Cut p95 latency of the {SKILLS[(i + j) % len(SKILLS)]} service by {10 + j * 5}% by caching hot paths"
+                     for j in range(bullets)],
+        ) for i in range(roles)],
+        projects=[Project(name=f"project-{i}", stack=SKILLS[i:i + 3], bullets=[f"Shipped v{i + 1} to 10k users"])
+                  for i in range(projects)],
+        education=[Education(school="University of Rwanda", degree="BSc Computer Science", period="2010 - 2014")],
+    )
+
+
+def jd_corpus() -> list:
+    """Short, medium and long JDs over overlapping skill sets"""
+    jds = []
+    for i, paragraphs in enumerate((1, 4, 12)):
+        wanted = ", ".join(SKILLS[i * 5:i * 5 + 8])
+        text = "\n\n".join(f"We are looking for an engineer with {wanted}. You will own services end to end, "
+                           f"improve latency and reliability, and mentor others. Requirement {p}: {SKILLS[p % len(SKILLS)]}."
+                           for p in range(paragraphs))
+        jds.append(text)
+    return jds
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+def summarize(samples: dict, jobs: int, errors: int, wall: float) -> dict:
+    stages = {name: {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+    } for name, ms in samples.items()}
+    return {"jobs": jobs, "errors": errors, "wall_s": round(wall, 3),
+            "jobs_per_s": round((jobs - errors) / wall, 2) if wall else 0.0, "stages": stages}
+
+
+def work_items() -> list:
+    jds = jd_corpus()
+    profiles = {size: synthetic_profile(size) for size in PROFILE_SIZES}
+    items = []
+    for i in range(JOBS):
+        size = list(PROFILE_SIZES)[i % len(PROFILE_SIZES)]
+        job = JobJD(id=f"bench-{i}", region=REGIONS[i % len(REGIONS)], company="Acme",
+                    title=f"Engineer {i}", jd_text=jds[i % len(jds)])
+        items.append((size, profiles[size], job))
+    return items
+
+
+def pipeline_job(index: int, profile: Profile, job: JobJD, samples: dict, lock: threading.Lock):
+    """One job through the same stages the generate route runs, timed per stage"""
+    run_id = f"bench-{os.getpid()}-{index}"
+    timings = {}
+
+    start = time.perf_counter()
+    out = run_tailor(profile, job)
+    timings["tailor"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resume_ctx = {"profile": profile.model_dump(), "out": out.resume.model_dump(), "job": job.model_dump()}
+    cover_letter_ctx = {"profile": profile.model_dump(), "out": out.cover_letter.model_dump(), "job": job.model_dump()}
+    resume_tex, cover_letter_tex = render_tex(resume_ctx, cover_letter_ctx, job.region, f"{run_id}_{job.id}")
+    timings["render"] = time.perf_counter() - start
+
+    if COMPILE:
+        start = time.perf_counter()
+        compile_tex(resume_tex)
+        compile_tex(cover_letter_tex)
+        timings["compile"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bundle(run_id)
+    timings["bundle"] = time.perf_counter() - start
+
+    with lock:
+        for name, seconds in timings.items():
+            samples[name].append(seconds * 1000)
+        samples["job_total"].append(sum(timings.values()) * 1000)
+    return run_id
+
+
+def route_job(client_for, profile: Profile, job: JobJD, samples: dict, lock: threading.Lock):
+    payload = {"profile": profile.model_dump(), "jobs": [job.model_dump()], "prefs": {}}
+    start = time.perf_counter()
+    response = client_for().post("/api/v1/generate/", json=payload)
+    elapsed = (time.perf_counter() - start) * 1000
+    if response.status_code != 200:
+        raise RuntimeError(f"generate returned {response.status_code}: {response.text[:200]}")
+    with lock:
+        samples["route_generate"].append(elapsed)
+    return response.json()["run_id"]
+
+
+def run_level(fn, items: list, workers: int) -> dict:
+    samples, lock = defaultdict(list), threading.Lock()
+    errors, run_ids = 0, []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fn, i, profile, job, samples, lock) for i, (_, profile, job) in enumerate(items)]
+        for f in futures:
+            try:
+                run_ids.append(f.result())
+            except Exception as e:
+                errors += 1
+                print(f"   ⚠️  job failed: {e}")
+    wall = time.perf_counter() - start
+    cleanup(run_ids)
+    return summarize(samples, len(items), errors, wall)
+
+
+def cleanup(run_ids: list):
+    """Remove the artifacts this benchmark wrote"""
+    for run_id in run_ids:
+        for path in glob.glob(os.path.join(ART_DIR, f"{run_id}_*")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: dict, baseline_path: str):
+    """Print p95 and jobs/sec deltas against a previous results file"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nComparison with {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+    for mode, levels in results["results"].items():
+        for level, current in levels.items():
+            old = baseline.get("results", {}).get(mode, {}).get(level)
+            if not old:
+                continue
+            print(f"  {mode} @ {level}: jobs/s {old['jobs_per_s']:.2f} -> {current['jobs_per_s']:.2f}")
+            for stage, stats in current["stages"].items():
+                before = old["stages"].get(stage)
+                if before and before["p95_ms"]:
+                    delta = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+                    print(f"    {stage:<15} p95 {before['p95_ms']:9.1f} -> {stats['p95_ms']:9.1f} ms ({delta:+.1f}%)")
+
+
+def print_level(mode: str, workers: int, result: dict):
+    print(f"{mode} @ concurrency {workers}: {result['jobs_per_s']:.2f} jobs/s, "
+          f"{result['errors']} errors, {result['wall_s']:.2f}s wall")
+    for stage, stats in result["stages"].items():
+        print(f"   {stage:<15} p50 {stats['p50_ms']:9.1f}  p95 {stats['p95_ms']:9.1f}  p99 {stats['p99_ms']:9.1f} ms")
+
+
+def main():
+    # keep the pipeline's per-call logging (and compile warnings without latexmk) out of the measurements
+    logging.disable(logging.ERROR)
+
+    print("=" * 60)
+    print(f"Pipeline benchmark ({JOBS} jobs per level, concurrency {CONCURRENCY})")
+    print(f"compile_tex: {'on' if COMPILE else 'off (latexmk not found or BENCH_COMPILE=0)'}, route: {'on' if ROUTE else 'off'}")
+    print("=" * 60)
+
+    stub = StubBackend.from_env()
+    original_scheduler = llm.scheduler
+    set_backend(stub)
+    items = work_items()
+    results = {"pipeline": {}, "route": {}}
+    try:
+        for workers in CONCURRENCY:
+            llm.scheduler = LLMScheduler(rpm=LLM_RPM, max_concurrency=max(CONCURRENCY))
+            results["pipeline"][str(workers)] = run_level(pipeline_job, items, workers)
+            print_level("pipeline", workers, results["pipeline"][str(workers)])
+
+        if ROUTE:
+            from fastapi.testclient import TestClient
+            from app.main import app
+            logging.disable(logging.ERROR)  # app.main reconfigures logging on import
+            local = threading.local()
+
+            def client_for():
+                if not hasattr(local, "client"):
+                    local.client = TestClient(app)
+                return local.client
+
+            def route_fn(i, profile, job, samples, lock):
+                return route_job(client_for, profile, job, samples, lock)
+
+            for workers in CONCURRENCY:
+                llm.scheduler = LLMScheduler(rpm=LLM_RPM, max_concurrency=max(CONCURRENCY))
+                results["route"][str(workers)] = run_level(route_fn, items, workers)
+                print_level("route", workers, results["route"][str(workers)])
+    finally:
+        set_backend(None)
+        llm.scheduler = original_scheduler
+        logging.disable(logging.NOTSET)
+
+    report = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {
+            "jobs": JOBS, "concurrency": CONCURRENCY, "compile": COMPILE, "route": ROUTE, "llm_rpm": LLM_RPM,
+            "profile_sizes": {k: dict(zip(("roles", "bullets", "skills", "projects"), v)) for k, v in PROFILE_SIZES.items()},
+            "stub": {"latency": stub.latency, "latency_jitter": stub.latency_jitter, "failure_rate": stub.failure_rate,
+                     "truncate_rate": stub.truncate_rate},
+        },
+        "results": results,
+    }
+    with open(OUTPUT, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {OUTPUT}")
+
+    if BASELINE:
+        compare(report, BASELINE)
+
+    errors = sum(level["errors"] for mode in results.values() for level in mode.values())
+    return errors == 0
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Render-context benchmark for UmukoziHR Resume Tailor
+Builds the resume and cover letter template contexts for a batch of
+BENCH_JOBS jobs with a large profile, two ways:
+- dump:    profile.model_dump() and job.model_dump() per context (2N profile
+           serializations per batch, the old generate()/Celery loop)
+- context: app.core.tex_compile.RenderContext (profile serialized once per
+           batch, job dump shared by its two contexts)
+and reports the bytes allocated per batch (tracemalloc), p50/p95 build time
+per batch, and the time to build and render every template. The rendered
+LaTeX of both modes is compared.
+
+Usage:
+    python tests/bench_render.py
+    BENCH_JOBS=200 BENCH_ROLES=40 python tests/bench_render.py
+
+Environment:
+    BENCH_JOBS      jobs per batch (default 50)
+    BENCH_ROLES     experience entries in the profile (default 25)
+    BENCH_BULLETS   bullets per entry (default 8)
+    BENCH_BATCHES   batches timed per mode (default 20)
+    BENCH_OUTPUT    results file (default bench_render.json)
+"""
+import sys
+import os
+import json
+import time
+import logging
+import tracemalloc
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SELF_PING_ENABLED", "false")
+
+from app.core.backends import StubBackend, set_backend
+from app.core.tailor import run_tailor
+from app.core.tex_compile import RenderContext, env, templates_for
+from app.models import Profile, Contact, Role, Project, Education, JobJD
+
+JOBS = int(os.getenv("BENCH_JOBS", "50"))
+ROLES = int(os.getenv("BENCH_ROLES", "25"))
+BULLETS = int(os.getenv("BENCH_BULLETS", "8"))
+BATCHES = int(os.getenv("BENCH_BATCHES", "20"))
+OUTPUT = os.getenv("BENCH_OUTPUT", "bench_render.json")
+REGIONS = ["US", "EU", "GL"]
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+def large_profile() -> Profile:
+    return Profile(
+        name="Bench Large",
+        contacts=Contact(email="bench@example.com", phone="+1 555 0100", location="Kigali",
+                         links=[f"https://example.com/{i}" for i in range(5)]),
+        summary="Backend engineer focused on latency, reliability and cost. " * 4,
+        skills=[f"Skill {i}" for i in range(60)],
+        experience=[Role(
+            title=f"Senior Engineer {i}", company=f"Company {i}", start=f"{2024 - i}-01", end=f"{2025 - i}-01",
+            bullets=[f"Cut p95 latency of service {i}.{j} by {10 + j}% by caching hot paths and batching writes"
+                     for j in range(BULLETS)],
+        ) for i in range(ROLES)],
+        projects=[Project(name=f"project-{i}", stack=["Python", "Redis", "Postgres"],
+                          bullets=[f"Shipped v{i + 1} to 10k users"] * 3) for i in range(10)],
+        education=[Education(school="University of Rwanda", degree="BSc Computer Science", period="2010 - 2014")],
+    )
+
+
+def build_dump(profile, batch) -> list:
+    return [({"profile": profile.model_dump(), "out": out.resume.model_dump(), "job": job.model_dump()},
+             {"profile": profile.model_dump(), "out": out.cover_letter.model_dump(), "job": job.model_dump()})
+            for job, out in batch]
+
+
+def build_context(profile, batch) -> list:
+    contexts = RenderContext(profile)
+    return [contexts.for_job(job, out) for job, out in batch]
+
+
+def render_all(batch, built) -> list:
+    rendered = []
+    for (job, _), (resume_ctx, cover_letter_ctx) in zip(batch, built):
+        resume_template, cover_letter_template = templates_for(job.region)
+        rendered.append(env.get_template(resume_template).render(**resume_ctx))
+        rendered.append(env.get_template(cover_letter_template).render(**cover_letter_ctx))
+    return rendered
+
+
+def measure(build, profile, batch) -> dict:
+    build(profile, batch)  # warm-up: pydantic serializer and import caches
+    tracemalloc.start()
+    try:
+        built = build(profile, batch)  # a batch holds its contexts until every job is rendered
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del built
+
+    build_ms, render_ms = [], []
+    for _ in range(BATCHES):
+        start = time.perf_counter()
+        built = build(profile, batch)
+        build_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        render_all(batch, built)
+        render_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        "peak_kib": round(peak / 1024, 1),
+        "build_p50_ms": round(percentile(build_ms, 50), 3),
+        "build_p95_ms": round(percentile(build_ms, 95), 3),
+        "build_render_p50_ms": round(percentile([b + r for b, r in zip(build_ms, render_ms)], 50), 3),
+    }
+
+
+def main():
+    logging.disable(logging.WARNING)
+
+    print("=" * 60)
+    print(f"Render contexts: {JOBS} jobs per batch, profile with {ROLES} roles x {BULLETS} bullets")
+    print("=" * 60)
+
+    profile = large_profile()
+    jobs = [JobJD(id=f"bench-{i}", region=REGIONS[i % len(REGIONS)], company=f"Acme {i}", title=f"Engineer {i}",
+                  jd_text="We need a Python engineer who can cut latency and own services end to end. " * 20)
+            for i in range(JOBS)]
+    set_backend(StubBackend())
+    try:
+        outs = {region: run_tailor(profile, next(j for j in jobs if j.region == region)) for region in REGIONS}
+    finally:
+        set_backend(None)
+    batch = [(job, outs[job.region]) for job in jobs]
+
+    identical = render_all(batch, build_dump(profile, batch)) == render_all(batch, build_context(profile, batch))
+    results = {}
+    for mode, build in (("dump", build_dump), ("context", build_context)):
+        results[mode] = measure(build, profile, batch)
+        r = results[mode]
+        print(f"{mode:<8} {r['peak_kib']:9.1f} KiB allocated per batch   build p50 {r['build_p50_ms']:8.2f}  "
+              f"p95 {r['build_p95_ms']:8.2f} ms   build+render p50 {r['build_render_p50_ms']:8.2f} ms")
+    reduction = 1 - results["context"]["peak_kib"] / results["dump"]["peak_kib"]
+    print(f"allocation reduction: {reduction:.0%}, rendered LaTeX identical: {identical}")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"jobs": JOBS, "roles": ROLES, "bullets": BULLETS, "batches": BATCHES},
+        "identical_output": identical,
+        "allocation_reduction": round(reduction, 3),
+        "results": results,
+    }
+    with open(OUTPUT, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {OUTPUT}")
+
+    sys.exit(0 if identical and reduction > 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Validation benchmark for UmukoziHR Resume Tailor
+Compares single-pass pydantic validation against the previous
+jsonschema-then-LLMOutput(**data) path
+"""
+import sys
+import os
+import json
+import time
+
+# Add the parent directory to the path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsonschema import Draft202012Validator
+from app.core.schema import OUTPUT_JSON_SCHEMA
+from app.core.validate import validate_or_error
+from app.models import LLMOutput
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "2000"))
+
+def sample_output(roles: int = 6, bullets: int = 5) -> dict:
+    """LLM-shaped output roughly the size of a two-page EU resume"""
+    return {
+        "resume": {
+            "summary": "Backend engineer focused on latency and reliability",
+            "skills_line": ["Python", "FastAPI", "PostgreSQL", "Redis", "Celery"],
+            "experience": [{
+                "title": f"Engineer {i}",
+                "company": f"Company {i}",
+                "start": "2020-01",
+                "end": "2022-01",
+                "bullets": [f"Cut p95 latency by {j * 10}% by caching hot paths" for j in range(bullets)]
+            } for i in range(roles)],
+            "projects": [{"name": "tailor", "stack": ["Python"], "bullets": ["Shipped v1"]}],
+            "education": [{"school": "University", "degree": "BSc", "period": "2014 - 2018"}]
+        },
+        "cover_letter": {
+            "address": "Hiring Team",
+            "intro": "I am applying for the role",
+            "why_you": "I have shipped similar systems",
+            "evidence": ["Scaled API to 2k rps", "Halved infra spend"],
+            "why_them": "Your mission resonates",
+            "close": "Thank you"
+        },
+        "ats": {"jd_keywords_matched": ["Python"], "risks": []}
+    }
+
+def per_call_validator(raw_json: str) -> LLMOutput:
+    """Original behaviour: fresh jsonschema validator, sorted errors, then pydantic"""
+    data = json.loads(raw_json)
+    errors = sorted(Draft202012Validator(OUTPUT_JSON_SCHEMA).iter_errors(data), key=lambda e: [str(p) for p in e.path])
+    if errors:
+        raise ValueError("Schema errors: " + "; ".join([e.message for e in errors]))
+    return LLMOutput(**data)
+
+_CACHED_VALIDATOR = Draft202012Validator(OUTPUT_JSON_SCHEMA)
+
+def cached_validator(raw_json: str) -> LLMOutput:
+    """Cached jsonschema validator with is_valid() fast path, then pydantic"""
+    data = json.loads(raw_json)
+    if not _CACHED_VALIDATOR.is_valid(data):
+        raise ValueError("Schema errors")
+    return LLMOutput(**data)
+
+def time_it(fn, raw_json: str) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn(raw_json)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+def main():
+    print("=" * 60)
+    print(f"Validation benchmark ({ITERATIONS} iterations)")
+    print("=" * 60)
+
+    raw = json.dumps(sample_output())
+    baseline_us = time_it(per_call_validator, raw)
+    cached_us = time_it(cached_validator, raw)
+    pydantic_us = time_it(validate_or_error, raw)
+
+    print(f"per-call jsonschema + pydantic : {baseline_us:8.1f} us/doc")
+    print(f"cached jsonschema + pydantic   : {cached_us:8.1f} us/doc")
+    print(f"pydantic (validate_or_error)   : {pydantic_us:8.1f} us/doc")
+    print(f"speedup vs per-call            : {baseline_us / pydantic_us:8.2f}x")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
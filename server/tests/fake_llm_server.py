@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Fake Gemini server for UmukoziHR Resume Tailor
+Speaks just enough of the generateContent REST API for google-genai, returns
+schema-valid output grounded in the prompt's PROFILE_MIN, and enforces its own
+request quota (429 + Retry-After) so the LLM scheduler can be exercised offline.
+
+Usage:
+    python tests/fake_llm_server.py --port 8765 --limit 30 --window 60
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8765 uvicorn app.main:app
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# same output generator as the in-process stub backend (LLM_BACKEND=stub)
+from app.core.backends import grounded_output, shape_for_schema
+
+class FakeGeminiServer:
+    """Threaded fake server; at most `limit` requests per `window` seconds"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, limit: int = 0, window: float = 60.0, latency: float = 0.0):
+        self.limit, self.window, self.latency = limit, window, latency
+        self.requests = 0
+        self.throttled = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _admit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > self.window:
+                self._recent.popleft()
+            if self.limit and len(self._recent) >= self.limit:
+                self.throttled += 1
+                return False
+            self._recent.append(now)
+            return True
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict = None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.endswith(":generateContent"):
+                    return self._send(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+                if not server._admit():
+                    return self._send(429, {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}},
+                                      {"Retry-After": f"{server.window:g}"})
+                if server.latency:
+                    time.sleep(server.latency)
+                prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+                schema = body.get("generationConfig", {}).get("responseSchema")
+                text = json.dumps(shape_for_schema(grounded_output(prompt), list((schema or {}).get("properties", {}))))
+                self._send(200, {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                    "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+                })
+
+        return Handler
+
+    def start(self) -> str:
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini generateContent server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--limit", type=int, default=0, help="max requests per window (0 = unlimited)")
+    parser.add_argument("--window", type=float, default=60.0, help="quota window in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(args.host, args.port, args.limit, args.window, args.latency)
+    print(f"Fake Gemini listening on {server.base_url} (limit={args.limit}/{args.window:g}s, latency={args.latency}s)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
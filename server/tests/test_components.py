@@ -79,6 +79,633 @@ def test_auth_components():
         print(f"❌ Auth test failed: {e}")
         return False
 
+def test_auth_caches():
+    """Test the verified-token cache and the user-existence cache"""
+    print("🔄 Testing Auth Caches...")
+    try:
+        import uuid
+        from sqlalchemy import create_engine, event
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        from app.auth.auth import create_access_token, verify_token, user_exists, _token_cache, _user_cache
+        from app.db.database import Base
+        from app.db.models import User
+
+        token = create_access_token({"sub": "cache-user"})
+        hits = _token_cache.hits
+        first, second = verify_token(token), verify_token(token)
+        if first["sub"] != "cache-user" or second != first or _token_cache.hits != hits + 1:
+            print("❌ Verified token was not served from cache")
+            return False
+        second["sub"] = "tampered"
+        if verify_token(token)["sub"] != "cache-user":
+            print("❌ Cached payload can be mutated by callers")
+            return False
+        if verify_token(token + "x") is not None:
+            print("❌ Invalid token accepted")
+            return False
+
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine, tables=[User.__table__])
+        queries = []
+        event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+        db = sessionmaker(bind=engine)()
+        user = User(id=uuid.uuid4(), email="cache@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+
+        user_id = user.id  # (loads the expired instance before we start counting)
+        queries.clear()
+        if not (user_exists(db, user_id) and user_exists(db, user_id) and user_exists(db, user_id)):
+            print("❌ Existing user not found")
+            return False
+        if len(queries) != 1:
+            print(f"❌ Expected 1 user lookup, got {len(queries)}")
+            return False
+
+        db.delete(user)
+        db.commit()
+        if user_exists(db, user_id):
+            print("❌ Deleted user still cached")
+            return False
+
+        other = User(id=uuid.uuid4(), email="bulk@example.com", password_hash="x")
+        db.add(other)
+        db.commit()
+        user_exists(db, other.id)
+        db.query(User).filter(User.id == other.id).delete()
+        db.commit()
+        if user_exists(db, other.id):
+            print("❌ Bulk-deleted user still cached")
+            return False
+        db.close()
+
+        print(f"✅ Auth caches working! jwt hits: {_token_cache.hits}, user hits: {_user_cache.hits}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Auth cache test failed: {e}")
+        return False
+
+def test_auth_crypto():
+    """Test the bcrypt pool: rehash on cost change, legacy SHA256 upgrade, saturation"""
+    print("🔄 Testing Auth Crypto...")
+    try:
+        import asyncio, hashlib, uuid
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from passlib.context import CryptContext
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        import app.auth.crypto as crypto
+        from app.db.database import Base, get_db
+        from app.db.models import User
+        from app.routes import v1_auth
+
+        if crypto.pwd_context is None:
+            print("⚠️ bcrypt backend unavailable, skipping")
+            return True
+        saved = crypto.pwd_context
+        try:
+            crypto.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+            old = crypto.hash_password("s3cret")
+            crypto.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5)
+            valid, new_hash = asyncio.run(crypto.verify_and_update_async("s3cret", old))
+            if not valid or not new_hash or not new_hash.startswith("$2b$05$"):
+                print("❌ Hash not upgraded after BCRYPT_ROUNDS change")
+                return False
+            if crypto.verify_and_update("s3cret", new_hash) != (True, None):
+                print("❌ Current hash flagged for rehash")
+                return False
+            if crypto.verify_and_update("wrong", new_hash) != (False, None):
+                print("❌ Wrong password accepted")
+                return False
+
+            legacy = hashlib.sha256(b"s3cret").hexdigest()
+            if crypto.verify_and_update("wrong", legacy) != (False, None):
+                print("❌ Wrong password accepted for legacy hash")
+                return False
+
+            # login route stores the upgraded hash
+            engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+            Base.metadata.create_all(engine, tables=[User.__table__])
+            SessionLocal = sessionmaker(bind=engine)
+            db = SessionLocal()
+            db.add(User(id=uuid.uuid4(), email="legacy@example.com", password_hash=legacy))
+            db.commit()
+            app = FastAPI()
+            app.include_router(v1_auth.router)
+            app.dependency_overrides[get_db] = lambda: SessionLocal()
+            client = TestClient(app)
+            resp = client.post("/api/v1/auth/login", json={"email": "legacy@example.com", "password": "s3cret"})
+            stored = db.query(User.password_hash).filter(User.email == "legacy@example.com").scalar()
+            if resp.status_code != 200 or not stored.startswith("$2b$05$"):
+                print(f"❌ Legacy hash not upgraded on login: {resp.status_code} {stored[:10]}")
+                return False
+            db.close()
+
+            # saturated pool -> CryptoBusy -> 503
+            pool = crypto._pool
+            crypto._pool = crypto._CryptoPool(1, 0)
+            try:
+                crypto._pool._slots.acquire()
+                resp = client.post("/api/v1/auth/login", json={"email": "legacy@example.com", "password": "s3cret"})
+                if resp.status_code != 503 or "Retry-After" not in resp.headers:
+                    print(f"❌ Saturated pool returned {resp.status_code}")
+                    return False
+            finally:
+                crypto._pool = pool
+        finally:
+            crypto.pwd_context = saved
+
+        print(f"✅ Auth crypto working! rounds={crypto.BCRYPT_ROUNDS}, workers={crypto.BCRYPT_WORKERS}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Auth crypto test failed: {e}")
+        return False
+
+def test_db_pool():
+    """Test the engine factory: SQLite WAL, pool wait/timeout metrics, after-fork reset"""
+    print("🔄 Testing DB Pool...")
+    try:
+        import tempfile
+        from sqlalchemy import text
+        from sqlalchemy.exc import TimeoutError as PoolTimeout
+        import app.db.database as database
+        from app.core.metrics import render_metrics
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = database.make_engine(f"sqlite:///{tmp}/pool.db", name="test", pool_size=1, max_overflow=0, pool_timeout=0.05)
+            try:
+                with engine.connect() as conn:
+                    mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+                    if mode != "wal":
+                        print(f"❌ Expected WAL journal mode, got {mode}")
+                        return False
+                    try:
+                        engine.connect()
+                        print("❌ Checkout beyond pool_size + max_overflow did not time out")
+                        return False
+                    except PoolTimeout:
+                        pass
+
+                output = render_metrics()
+                for line in ('db_pool_timeouts_total{engine="test"} 1', 'db_pool_checked_out{engine="test"} 0',
+                             'db_pool_wait_seconds_count{engine="test"} 2'):
+                    if line not in output:
+                        print(f"❌ Missing metric: {line}")
+                        return False
+
+                pool = engine.pool
+                database._reset_pools_after_fork()
+                if engine.pool is pool or pool.checkedin() != 1:
+                    print("❌ Pool not replaced after fork (or parent connections closed)")
+                    return False
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            finally:
+                engine.dispose()
+                database._engines.pop("test", None)
+
+            # a failing connect is an error, not a pool timeout
+            broken = database.make_engine(f"sqlite:///{tmp}/missing/pool.db", name="test_broken", pool_size=1, max_overflow=0)
+            try:
+                broken.connect()
+                print("❌ Connecting to a missing directory should fail")
+                return False
+            except PoolTimeout:
+                print("❌ Connect failure surfaced as a pool timeout")
+                return False
+            except Exception:
+                pass
+            finally:
+                broken.dispose()
+                database._engines.pop("test_broken", None)
+            if database._pool_stats["test_broken"]["timeouts"] != 0:
+                print("❌ Connect failure counted as a pool timeout")
+                return False
+
+        print(f"✅ DB pool working! pool_size={database.DB_POOL_SIZE}, max_overflow={database.DB_MAX_OVERFLOW}, "
+              f"recycle={database.DB_POOL_RECYCLE}s, pre_ping={database.DB_POOL_PRE_PING}")
+        return True
+
+    except Exception as e:
+        print(f"❌ DB pool test failed: {e}")
+        return False
+
+def test_async_routes():
+    """Test the async session path behind /history (list and detail), /profile, /me/completeness and /generate/status"""
+    print("🔄 Testing Async Routes...")
+    try:
+        import asyncio, tempfile, uuid
+        from datetime import datetime, timedelta
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from sqlalchemy import event
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        from sqlalchemy.orm import sessionmaker
+        import app.db.database as database
+        from app.db.database import Base, get_async_db
+        from app.db.models import User, Profile as DBProfile, Job as DBJob, Run as DBRun, Artifact as DBArtifact
+        from app.auth.auth import create_access_token
+        from app.routes import v1_history, v1_profile, v1_generate
+
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{tmp}/async.db"
+            engine = database.make_engine(url, name="test_sync")
+            async_engine = database.make_async_engine(url, name="test_async")
+            try:
+                Base.metadata.create_all(engine)
+                user_id = uuid.uuid4()
+                now = datetime.utcnow()
+                with sessionmaker(bind=engine)() as db:
+                    db.add(User(id=user_id, email="async@example.com", password_hash="x"))
+                    db.add(DBProfile(user_id=user_id, profile_data={"basics": {"full_name": "Async Tester"}}, version=3, completeness=40.0))
+                    for i in range(5):  # Co3 and Co4 share a timestamp: the cursor must break the tie on id
+                        job = DBJob(id=uuid.uuid4(), user_id=user_id, company=f"Co{i}", title="Engineer", jd_text="jd", region="US")
+                        db.add(job)
+                        db.add(DBRun(user_id=user_id, job_id=job.id, status="completed", llm_output={"resume": {"summary": f"s{i}"}},
+                                     artifacts_urls={"resume_tex": "/artifacts/r.tex", "resume_tex_content": "\\documentclass{article}"},
+                                     created_at=now + timedelta(minutes=min(i, 3))))
+                    db.commit()
+
+                AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+                async def override():
+                    async with AsyncSession() as session:
+                        yield session
+
+                app = FastAPI()
+                app.include_router(v1_history.router, prefix="/api/v1")
+                app.include_router(v1_profile.router, prefix="/api/v1")
+                app.include_router(v1_generate.router, prefix="/api/v1/generate")
+                app.dependency_overrides[get_async_db] = override
+                client = TestClient(app)
+                headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+                for fn in (v1_history.get_history, v1_profile.get_profile, v1_profile.get_completeness,
+                           v1_generate.get_generation_status):
+                    if not asyncio.iscoroutinefunction(fn):
+                        print(f"❌ {fn.__name__} is not async")
+                        return False
+
+                resp = client.get("/api/v1/history", params={"page": 1, "page_size": 2}, headers=headers)
+                body = resp.json()
+                if resp.status_code != 200 or body["total"] != 5 or len(body["runs"]) != 2 or not body["next_cursor"]:
+                    print(f"❌ Unexpected history response: {resp.status_code} {body}")
+                    return False
+                by_offset = [r["run_id"] for p in (1, 2, 3) for r in
+                             client.get("/api/v1/history", params={"page": p, "page_size": 2}, headers=headers).json()["runs"]]
+                by_cursor, cursor = [], None
+                while True:
+                    params = {"page_size": 2, "with_total": "false", **({"cursor": cursor} if cursor else {})}
+                    body = client.get("/api/v1/history", params=params, headers=headers).json()
+                    by_cursor += [r["run_id"] for r in body["runs"]]
+                    cursor = body["next_cursor"]
+                    if body["total"] is not None or not cursor:
+                        break
+                if len(set(by_cursor)) != 5 or by_cursor != by_offset:
+                    print(f"❌ Cursor pages differ from offset pages: {by_cursor} vs {by_offset}")
+                    return False
+                statements = []
+                listener = lambda *args: statements.append(args[2])
+                event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+                item = client.get("/api/v1/history", params={"with_total": "false"}, headers=headers).json()["runs"][0]
+                event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+                if any("llm_output" in sql or "jd_text" in sql for sql in statements) or "resume_tex_content" in item["artifacts_urls"]:
+                    print(f"❌ History list loads large columns: {statements}")
+                    return False
+                detail = client.get(f"/api/v1/history/{item['run_id']}", headers=headers).json()
+                if detail.get("jd_text") != "jd" or "summary" not in detail.get("llm_output", {}).get("resume", {}) \
+                        or "resume_tex_content" not in detail["artifacts_urls"]:
+                    print(f"❌ Unexpected history detail: {detail}")
+                    return False
+                if client.get(f"/api/v1/history/{uuid.uuid4()}", headers=headers).status_code != 404:
+                    print("❌ Unknown run did not 404")
+                    return False
+                if client.get("/api/v1/history", params={"cursor": "garbage"}, headers=headers).status_code != 400:
+                    print("❌ Invalid cursor accepted")
+                    return False
+                with sessionmaker(bind=engine)() as db:  # a new run drops the cached total
+                    job = DBJob(id=uuid.uuid4(), user_id=user_id, company="Co5", title="Engineer", jd_text="jd", region="US")
+                    db.add_all([job, DBRun(user_id=user_id, job_id=job.id, status="completed", artifacts_urls={})])
+                    db.commit()
+                    new_job_id = job.id
+                if client.get("/api/v1/history", headers=headers).json()["total"] != 6:
+                    print("❌ Stale history total after a new run")
+                    return False
+                with sessionmaker(bind=engine)() as db:  # so does a bulk delete, which skips the mapper events
+                    db.query(DBRun).filter(DBRun.job_id == new_job_id).delete()
+                    db.commit()
+                if client.get("/api/v1/history", headers=headers).json()["total"] != 5:
+                    print("❌ Stale history total after a bulk delete")
+                    return False
+                resp = client.get("/api/v1/profile", headers=headers)
+                if resp.status_code != 200 or resp.json()["version"] != 3:
+                    print(f"❌ Unexpected profile response: {resp.status_code} {resp.text[:200]}")
+                    return False
+                resp = client.get("/api/v1/me/completeness", headers=headers)
+                if resp.status_code != 200:
+                    print(f"❌ Unexpected completeness response: {resp.status_code}")
+                    return False
+                resp = client.get(f"/api/v1/generate/status/{uuid.uuid4()}", headers=headers)
+                if resp.status_code != 200 or resp.json()["status"] != "processing":
+                    print(f"❌ Unexpected status response: {resp.status_code}")
+                    return False
+                generation_id = str(uuid.uuid4())
+                with sessionmaker(bind=engine)() as db:  # signed-in runs are found in the artifacts table
+                    run = db.query(DBRun).filter(DBRun.user_id == user_id).first()
+                    db.add(DBArtifact(run_id=run.id, job_key="Co0", kind="resume_pdf",
+                                      storage_key=f"artifacts/{generation_id}_Co0_resume.pdf"))
+                    db.commit()
+                scan, v1_generate._scan_run_files = v1_generate._scan_run_files, lambda *args: ["unexpected directory scan"]
+                try:
+                    body = client.get(f"/api/v1/generate/status/{generation_id}", headers=headers).json()
+                finally:
+                    v1_generate._scan_run_files = scan
+                if body["status"] != "completed" or body["artifacts"][0].get("resume_pdf") != f"/artifacts/{generation_id}_Co0_resume.pdf":
+                    print(f"❌ Status not served from the artifacts table: {body}")
+                    return False
+            finally:
+                asyncio.run(async_engine.dispose())
+                engine.dispose()
+                database._engines.pop("test_sync", None)
+                database._engines.pop("test_async", None)
+
+        print(f"✅ Async routes working! async URL: {database.async_url(database.DATABASE_URL).split('://')[0]}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Async route test failed: {e}")
+        return False
+
+def test_history_indexes():
+    """Test that migrate.py brings the history indexes up to date and the history queries use them"""
+    print("🔄 Testing History Indexes...")
+    try:
+        import tempfile, uuid
+        from datetime import datetime
+        from sqlalchemy import create_engine, text, inspect
+        from sqlalchemy.dialects import sqlite
+        import migrate
+        from app.db.database import Base
+        from app.routes.v1_history import history_query, after_cursor, encode_cursor
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{tmp}/plan.db")
+            try:
+                Base.metadata.create_all(engine)
+                with engine.begin() as conn:  # a database from before keyset pagination
+                    conn.execute(text("DROP INDEX ix_runs_user_id_created_at_id"))
+                    conn.execute(text("DROP INDEX ix_jobs_user_id"))
+                    conn.execute(text("CREATE INDEX ix_runs_user_id_created_at ON runs (user_id, created_at DESC)"))
+                migrate.migrate_indexes(engine)
+                indexes = {ix["name"] for t in ("runs", "jobs") for ix in inspect(engine).get_indexes(t)}
+                if indexes != {"ix_runs_user_id_created_at_id", "ix_jobs_user_id"}:
+                    print(f"❌ Indexes not migrated: {indexes}")
+                    return False
+
+                plans = []
+                first_page = history_query(uuid.uuid4()).limit(10).offset(0)
+                next_page = after_cursor(history_query(uuid.uuid4()), encode_cursor(datetime.utcnow(), uuid.uuid4())).limit(10)
+                with engine.connect() as conn:
+                    for query in (first_page, next_page):
+                        compiled = query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+                        plans.append(" | ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))))
+            finally:
+                engine.dispose()
+
+        for plan in plans:
+            if "ix_runs_user_id_created_at_id" not in plan or "TEMP B-TREE" in plan or "SCAN runs" in plan:
+                print(f"❌ History query not served by the index: {plan}")
+                return False
+
+        print(f"✅ History indexes working! plan: {plans[1]}")
+        return True
+
+    except Exception as e:
+        print(f"❌ History index test failed: {e}")
+        return False
+
+def test_artifacts():
+    """Test the artifacts backfill: rows from legacy artifacts_urls, inline LaTeX stripped, idempotent"""
+    print("🔄 Testing Artifacts Backfill...")
+    try:
+        import os, tempfile, uuid, hashlib
+        from sqlalchemy import create_engine, select
+        from sqlalchemy.orm import Session
+        import migrate
+        from app.db.database import Base
+        from app.db.models import User, Job, Run, Artifact
+
+        tex = "\\documentclass{article}\\begin{document}Hi\\end{document}"
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "abc_resume.pdf"), "wb") as f:
+                f.write(b"%PDF-1.4 test")
+            engine = create_engine(f"sqlite:///{tmp}/artifacts.db")
+            try:
+                Base.metadata.create_all(engine)
+                user_id, job_id, run_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+                with Session(engine) as db:
+                    db.add(User(id=user_id, email="a@example.com", password_hash="x"))
+                    db.add(Job(id=job_id, user_id=user_id, company="Acme", title="Eng", jd_text="jd", region="US"))
+                    db.add(Run(id=run_id, user_id=user_id, job_id=job_id, status="completed", llm_output={},
+                               artifacts_urls={
+                                   "resume_tex": "/artifacts/abc_resume.tex",  # file gone: inline source
+                                   "resume_pdf": "/artifacts/abc_resume.pdf",
+                                   "resume_tex_content": tex,
+                                   "pdf_compilation": {"resume_success": True},
+                               }))
+                    db.commit()
+
+                migrate.backfill_artifacts(engine, art_dir=tmp, batch_size=1)
+                migrate.backfill_artifacts(engine, art_dir=tmp, batch_size=1)
+
+                with Session(engine) as db:
+                    rows = {a.kind: a for a in db.execute(select(Artifact)).scalars()}
+                    urls = db.get(Run, run_id).artifacts_urls
+            finally:
+                engine.dispose()
+
+        if sorted(rows) != ["resume_pdf", "resume_tex"]:
+            print(f"❌ Unexpected artifact rows: {sorted(rows)}")
+            return False
+        tex_row, pdf_row = rows["resume_tex"], rows["resume_pdf"]
+        if tex_row.content_hash != hashlib.sha256(tex.encode()).hexdigest() or tex_row.compile_status != "ok":
+            print(f"❌ Bad tex artifact: {tex_row.content_hash} {tex_row.compile_status}")
+            return False
+        if pdf_row.size_bytes != 13 or pdf_row.storage != "local" or pdf_row.storage_key != "artifacts/abc_resume.pdf":
+            print(f"❌ Bad pdf artifact: {pdf_row.size_bytes} {pdf_row.storage} {pdf_row.storage_key}")
+            return False
+        if "resume_tex_content" in urls or urls.get("resume_pdf") != "/artifacts/abc_resume.pdf":
+            print(f"❌ artifacts_urls not stripped: {urls}")
+            return False
+
+        print(f"✅ Artifacts backfill working! {len(rows)} rows, inline LaTeX stripped")
+        return True
+
+    except Exception as e:
+        print(f"❌ Artifacts test failed: {e}")
+        return False
+
+def test_bulk_persist():
+    """Test that authenticated multi-job generation inserts jobs/runs/artifacts in batches, without refreshes"""
+    print("🔄 Testing Bulk Persistence...")
+    run_ids = []
+    try:
+        import asyncio, glob, tempfile, uuid
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from sqlalchemy import create_engine, event, select, func
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        from sqlalchemy.orm import sessionmaker
+        import app.db.database as database
+        from app.db.database import Base, get_db, get_async_db
+        from app.db.models import User, Profile as DBProfile, Job as DBJob, Run as DBRun, Artifact as DBArtifact
+        from app.auth.auth import create_access_token
+        from app.core.backends import StubBackend, set_backend
+        from app.core.tex_compile import ART_DIR
+        from app.routes import v1_generate, v1_history
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{tmp}/bulk.db", connect_args={"check_same_thread": False})
+            async_engine = database.make_async_engine(f"sqlite:///{tmp}/bulk.db", name="test_bulk_async")
+            try:
+                Base.metadata.create_all(engine)
+                SessionLocal = sessionmaker(bind=engine)
+                user_id = uuid.uuid4()
+                with SessionLocal() as db:
+                    db.add(User(id=user_id, email="bulk@example.com", password_hash="x"))
+                    db.add(DBProfile(user_id=user_id, version=2, profile_data={
+                        "basics": {"full_name": "Bulk Tester"}, "skills": [{"name": "Python"}],
+                        "experience": [{"title": "Engineer", "company": "TechCorp", "start": "2020-01", "bullets": ["Built Python APIs"]}]}))
+                    db.commit()
+
+                def session():
+                    with SessionLocal() as db:
+                        yield db
+                AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+                async def async_session():
+                    async with AsyncSession() as db:
+                        yield db
+                app = FastAPI()
+                app.include_router(v1_generate.router, prefix="/api/v1/generate")
+                app.include_router(v1_history.router, prefix="/api/v1")
+                app.dependency_overrides[get_db] = session
+                app.dependency_overrides[get_async_db] = async_session
+                headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+                total_before = TestClient(app).get("/api/v1/history", headers=headers).json()["total"]  # now cached
+
+                statements = []
+                event.listen(engine, "before_cursor_execute",
+                             lambda conn, cursor, statement, params, ctx, many: statements.append(statement.split()[0:3]))
+                jobs = [{"region": "US", "company": f"Co{i}", "title": "Engineer", "jd_text": "Python APIs"} for i in range(3)]
+                set_backend(StubBackend())
+                try:
+                    resp = TestClient(app).post("/api/v1/generate/", json={"jobs": jobs}, headers=headers)
+                finally:
+                    set_backend(None)
+                run_ids.append(resp.json().get("run_id", "missing"))
+                if resp.status_code != 200:
+                    print(f"❌ Generate failed: {resp.status_code} {resp.text[:200]}")
+                    return False
+
+                inserts = [s[2] for s in statements if s[0] == "INSERT"]
+                job_reads = [s for s in statements if s[0] == "SELECT" and "jobs" in " ".join(s)]
+                with SessionLocal() as db:
+                    counts = {m.__tablename__: db.execute(select(func.count()).select_from(m)).scalar_one()
+                              for m in (DBJob, DBRun, DBArtifact)}
+                    linked = db.execute(select(func.count()).select_from(DBRun).join(DBJob, DBRun.job_id == DBJob.id)).scalar_one()
+                total_after = TestClient(app).get("/api/v1/history", headers=headers).json()["total"]
+            finally:
+                asyncio.run(async_engine.dispose())
+                engine.dispose()
+                database._engines.pop("test_bulk_async", None)
+
+        if counts["jobs"] != 3 or counts["runs"] != 3 or linked != 3 or counts["artifacts"] < 6:
+            print(f"❌ Unexpected rows: {counts}, {linked} runs linked to jobs")
+            return False
+        if sorted(inserts) != ["artifacts", "jobs", "runs"] or job_reads:
+            print(f"❌ Expected one INSERT per table and no job reads: {inserts} {job_reads}")
+            return False
+        if (total_before, total_after) != (0, 3):
+            print(f"❌ History total not refreshed by the bulk insert: {total_before} -> {total_after}")
+            return False
+
+        print(f"✅ Bulk persistence working! {counts}, {len(statements)} statements")
+        return True
+
+    except Exception as e:
+        print(f"❌ Bulk persistence test failed: {e}")
+        return False
+    finally:
+        for run_id in run_ids:
+            for path in glob.glob(os.path.join(ART_DIR, f"{run_id}*")):
+                os.remove(path)
+
+def test_profile_cache():
+    """Test that stored profiles are parsed once per (user, version) and a version bump is picked up"""
+    print("🔄 Testing Profile Cache...")
+    try:
+        import tempfile, uuid
+        from sqlalchemy import create_engine, event
+        from sqlalchemy.orm import sessionmaker
+        from app.db.database import Base
+        from app.db.models import User, Profile as DBProfile
+        from app.core.profiles import load_profile, invalidate_profile
+        from app.core.tailor import select_topk_bullets
+
+        def profile_data(name):
+            return {"basics": {"full_name": name}, "skills": [{"name": "Python"}],
+                    "experience": [{"title": "Engineer", "company": "TechCorp", "start": "2020-01",
+                                    "bullets": ["Built Python APIs with FastAPI", "Tuned PostgreSQL queries", "Led hiring"]}]}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{tmp}/profiles.db")
+            try:
+                Base.metadata.create_all(engine)
+                user_id = uuid.uuid4()
+                with sessionmaker(bind=engine)() as db:
+                    db.add(User(id=user_id, email="cache@example.com", password_hash="x"))
+                    db.add(DBProfile(user_id=user_id, profile_data=profile_data("First"), version=1))
+                    db.commit()
+
+                    statements = []
+                    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+                    first = load_profile(db, user_id)
+                    miss_statements = len(statements)
+                    second = load_profile(db, user_id)
+                    hit_statements = len(statements) - miss_statements
+
+                    db_profile = db.query(DBProfile).filter(DBProfile.user_id == user_id).first()
+                    invalidate_profile(user_id, db_profile.version)  # what update_profile does
+                    db_profile.profile_data = profile_data("Second")
+                    db_profile.version += 1
+                    db.commit()
+                    third = load_profile(db, user_id)
+                    missing = load_profile(db, uuid.uuid4())
+            finally:
+                engine.dispose()
+
+        if second is not first or hit_statements != 1 or miss_statements != 2:
+            print(f"❌ Profile not served from cache: {miss_statements} statements on miss, {hit_statements} on hit")
+            return False
+        if third.version != 2 or third.legacy.name != "Second" or missing is not None:
+            print(f"❌ Version bump not picked up: {third.version} {third.legacy.name}")
+            return False
+        jd = "Python FastAPI developer"
+        if select_topk_bullets(first.legacy, jd, k=2, index=first.bullets) != select_topk_bullets(first.legacy, jd, k=2):
+            print("❌ Cached bullet index selects different bullets")
+            return False
+
+        print(f"✅ Profile cache working! v{first.version} -> v{third.version}, hit in {hit_statements} query")
+        return True
+
+    except Exception as e:
+        print(f"❌ Profile cache test failed: {e}")
+        return False
+
 def test_tailor_components():
     """Test core tailoring logic (without LLM call)"""
     print("🔄 Testing Tailor Components...")
@@ -155,7 +782,23 @@ def test_validation():
         
         # Test validation
         validated = validate_or_error(json.dumps(test_data))
-        
+        if validated.resume.experience[0].company != "TechCorp":
+            print("❌ Validated output does not match input")
+            return False
+
+        # Invalid documents must still report every schema error
+        broken = json.loads(json.dumps(test_data))
+        del broken["cover_letter"]["close"]
+        del broken["ats"]
+        try:
+            validate_or_error(json.dumps(broken))
+            print("❌ Invalid document passed validation")
+            return False
+        except ValueError as e:
+            if "cover_letter.close" not in str(e) or "ats" not in str(e):
+                print(f"❌ Missing schema errors in message: {e}")
+                return False
+
         print("✅ Validation working!")
         return True
         
@@ -163,6 +806,803 @@ def test_validation():
         print(f"❌ Validation test failed: {e}")
         return False
 
+def test_output_schema():
+    """Test that the Gemini and JSON schemas are derived from the same models"""
+    print("🔄 Testing Output Schema...")
+    try:
+        from app.core.schema import OUTPUT_JSON_SCHEMA, OUTPUT_GEMINI_SCHEMA
+        from app.models import LLMOutput
+
+        def walk(js, gs, path="$"):
+            if sorted(js.get("required", [])) != sorted(gs.required or []):
+                raise AssertionError(f"required mismatch at {path}")
+            for name, sub in js.get("properties", {}).items():
+                walk(sub, gs.properties[name], f"{path}.{name}")
+            if "items" in js:
+                walk(js["items"], gs.items, f"{path}[]")
+
+        walk(OUTPUT_JSON_SCHEMA, OUTPUT_GEMINI_SCHEMA)
+
+        role = OUTPUT_JSON_SCHEMA["properties"]["resume"]["properties"]["experience"]["items"]
+        if "title" not in role["properties"] or set(LLMOutput.model_fields) != set(OUTPUT_JSON_SCHEMA["properties"]):
+            print("❌ Schema does not mirror LLMOutput fields")
+            return False
+
+        print("✅ Output schema working!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Output schema test failed: {e}")
+        return False
+
+def test_repair():
+    """Test the repair stage (local fixes + targeted section re-ask, LLM stubbed)"""
+    print("🔄 Testing Repair Stage...")
+    try:
+        import app.core.repair as repair
+        from app.models import Profile, Role, JobJD
+
+        profile = Profile(
+            name="Test User",
+            summary="Backend engineer",
+            skills=["Python"],
+            experience=[Role(title="Engineer", company="TechCorp", bullets=["Built APIs"])]
+        )
+        job = JobJD(region="US", company="Acme", title="Engineer", jd_text="Python APIs")
+        selected = [{"role_title": "Engineer", "company": "TechCorp", "bullet": "Built APIs"}]
+
+        # Wrong company casing, missing summary, cover letter cut off mid-string
+        raw = json.dumps({
+            "resume": {"skills_line": ["Python"], "experience": [
+                {"title": "Engineer", "company": "techcorp ", "bullets": ["Built APIs"]},
+                {"title": "CTO", "company": "Invented Inc", "bullets": ["Nope"]}
+            ], "projects": [], "education": []},
+            "cover_letter": {"address": "Acme", "intro": "Hi"}
+        })[:-12]
+
+        calls = []
+        def fake_llm(prompt, response_schema=None, max_output_tokens=None, lane=None):
+            calls.append(prompt)
+            return json.dumps({"address": "Acme", "intro": "Hi", "why_you": "Fit", "evidence": ["Built APIs"], "why_them": "Mission", "close": "Thanks"})
+
+        original = repair.call_llm
+        repair.call_llm = fake_llm
+        try:
+            out = repair.repair_output(raw, ValueError("test"), profile, job, {}, selected, budget=1)
+        finally:
+            repair.call_llm = original
+
+        companies = [r.company for r in out.resume.experience]
+        if companies != ["TechCorp"] or out.resume.summary != "Backend engineer":
+            print(f"❌ Local fixes not applied: {companies}, {out.resume.summary!r}")
+            return False
+        if len(calls) != 1 or 'ONLY the "cover_letter"' not in calls[0]:
+            print(f"❌ Expected one cover_letter re-ask, got {len(calls)}")
+            return False
+
+        # No budget left -> RepairError instead of a silent bad document
+        try:
+            repair.repair_output(raw, ValueError("test"), profile, job, {}, selected, budget=0)
+            print("❌ Repair succeeded without budget")
+            return False
+        except repair.RepairError:
+            pass
+
+        print(f"✅ Repair stage working! Stats: {repair.repair_stats()}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Repair test failed: {e}")
+        return False
+
+def test_truncation_salvage():
+    """Test salvaging MAX_TOKENS output and continuing only the missing sections"""
+    print("🔄 Testing Truncation Salvage...")
+    try:
+        import app.core.repair as repair
+        from app.core.json_salvage import salvage_json
+        from app.core.llm import LLMResponse
+        from app.core.validate import validate_or_error
+
+        resume = {"summary": "S", "skills_line": ["Python"], "experience": [], "projects": [], "education": []}
+        cover_letter = {"address": "A", "intro": "I", "why_you": "Y", "evidence": ["E"], "why_them": "T", "close": "C"}
+        full = json.dumps({"resume": resume, "cover_letter": cover_letter, "ats": {"jd_keywords_matched": [], "risks": []}})
+        truncated = full[:full.index('"why_them"') + 14]
+
+        result = salvage_json(truncated)
+        if result.complete or result.data["resume"] != resume or result.partial_keys != ["cover_letter"]:
+            print(f"❌ Salvage mismatch: {result}")
+            return False
+
+        prompts = []
+        def fake_llm_response(prompt, response_schema=None, max_output_tokens=None, lane=None):
+            prompts.append(prompt)
+            return LLMResponse(json.dumps({"cover_letter": cover_letter, "ats": {"jd_keywords_matched": ["Python"], "risks": []}}), "STOP")
+
+        original = repair.call_llm_response
+        repair.call_llm_response = fake_llm_response
+        try:
+            merged = repair.continue_truncated(truncated, "ORIGINAL PROMPT")
+        finally:
+            repair.call_llm_response = original
+
+        out = validate_or_error(merged)
+        if len(prompts) != 1 or "remaining sections: cover_letter, ats" not in prompts[0]:
+            print("❌ Continuation should request only the tail sections")
+            return False
+        if out.resume.summary != "S" or out.ats.jd_keywords_matched != ["Python"]:
+            print("❌ Merged output lost salvaged or continued sections")
+            return False
+
+        print("✅ Truncation salvage working!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Truncation salvage test failed: {e}")
+        return False
+
+def test_llm_scheduler():
+    """Test rate-limited LLM calls against the local fake Gemini server"""
+    print("🔄 Testing LLM Scheduler...")
+    server = None
+    saved_env = {k: os.environ.get(k) for k in ("GEMINI_API_KEY", "GEMINI_BASE_URL")}
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        import app.core.llm as llm
+        from app.core.rate_limit import LLMScheduler
+        from app.core.tailor import run_tailor
+        from app.models import Profile, Role, JobJD
+        from tests.fake_llm_server import FakeGeminiServer
+
+        # Fake quota: 3 requests per 0.5s; our scheduler bursts past it and must back off
+        server = FakeGeminiServer(limit=3, window=0.5)
+        os.environ["GEMINI_API_KEY"] = "fake"
+        os.environ["GEMINI_BASE_URL"] = server.start()
+
+        original = llm.scheduler
+        llm.scheduler = LLMScheduler(rpm=600, max_concurrency=4, max_retries=6, backoff_base=0.05, backoff_max=0.5)
+        try:
+            profile = Profile(name="Test User", skills=["Python"],
+                              experience=[Role(title="Engineer", company="TechCorp", bullets=["Built Python APIs"])])
+            jobs = [JobJD(region="US", company="Acme", title=f"Engineer {i}", jd_text="Python APIs")
+                    for i in range(8)]
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                lanes = ["interactive" if i % 2 else "bulk" for i in range(8)]
+                outs = list(pool.map(lambda args: run_tailor(*args), zip([profile] * 8, jobs, lanes)))
+            stats = llm.scheduler.stats()
+        finally:
+            llm.scheduler = original
+
+        if len(outs) != 8 or any(o.resume.experience[0].company != "TechCorp" for o in outs):
+            print("❌ Not every job completed")
+            return False
+        if server.throttled == 0 or stats["retries"] == 0:
+            print(f"❌ Expected 429s to be retried: {stats}")
+            return False
+        if stats["queue_depth"] != {"interactive": 0, "bulk": 0} or stats["in_flight"] != 0:
+            print(f"❌ Scheduler did not drain: {stats}")
+            return False
+
+        print(f"✅ LLM scheduler working! {server.throttled} throttled, stats: {stats}")
+        return True
+
+    except Exception as e:
+        print(f"❌ LLM scheduler test failed: {e}")
+        return False
+    finally:
+        if server:
+            server.stop()
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+def test_stub_backend():
+    """Test the offline pipeline on the deterministic stub LLM backend"""
+    print("🔄 Testing Stub LLM Backend...")
+    try:
+        import app.core.llm as llm
+        from app.core.backends import StubBackend, set_backend, get_backend
+        from app.core.rate_limit import LLMScheduler
+        from app.core.tailor import run_tailor
+        from app.models import Profile, Role, JobJD
+
+        profile = Profile(name="Test User", skills=["Python", "SQL"],
+                          experience=[Role(title="Engineer", company="TechCorp", bullets=["Built Python APIs", "Tuned SQL"])])
+        job = JobJD(region="US", company="Acme", title="Engineer", jd_text="Python and SQL APIs")
+
+        original = llm.scheduler
+        # every other call fails with 429, a third are cut off: retries and continuation must absorb both
+        stub = StubBackend(failure_rate=0.5, truncate_rate=0.3, seed=7)
+        llm.scheduler = LLMScheduler(rpm=6000, max_retries=8, backoff_base=0.001, backoff_max=0.01)
+        set_backend(stub)
+        try:
+            if get_backend() is not stub:
+                print("❌ set_backend did not take effect")
+                return False
+            outs = [run_tailor(profile, job) for _ in range(5)]
+            stats = llm.scheduler.stats()
+        finally:
+            set_backend(None)
+            llm.scheduler = original
+
+        if any(o.resume.experience[0].company != "TechCorp" for o in outs):
+            print("❌ Stub output not grounded in the profile")
+            return False
+        if set(outs[0].ats.jd_keywords_matched) != {"Python", "SQL"}:
+            print(f"❌ Unexpected keywords: {outs[0].ats.jd_keywords_matched}")
+            return False
+        if stats["retries"] == 0 or stats.get("failed"):
+            print(f"❌ Injected failures were not retried: {stats}")
+            return False
+
+        # same seed, same sequence of outcomes
+        a, b = StubBackend(failure_rate=0.5, seed=3), StubBackend(failure_rate=0.5, seed=3)
+        def outcome(backend):
+            try:
+                return backend.generate("", "", None, 100).finish_reason
+            except Exception as e:
+                return e.code
+        if [outcome(a) for _ in range(10)] != [outcome(b) for _ in range(10)]:
+            print("❌ Stub backend is not deterministic")
+            return False
+
+        print(f"✅ Stub backend working! {stub.calls} calls, stats: {stats}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Stub backend test failed: {e}")
+        return False
+
+def test_metrics():
+    """Test stage timing spans and the Prometheus text output"""
+    print("🔄 Testing Stage Metrics...")
+    try:
+        import importlib
+        from app.core.metrics import Histogram, span, render_metrics, STAGE_SECONDS
+
+        h = Histogram("test_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 5.0):
+            h.observe(v, stage="llm")
+        lines = h.render()
+        expected = ['test_seconds_bucket{stage="llm",le="0.1"} 1', 'test_seconds_bucket{stage="llm",le="1.0"} 2',
+                    'test_seconds_bucket{stage="llm",le="+Inf"} 3', 'test_seconds_count{stage="llm"} 3']
+        if any(e not in lines for e in expected):
+            print(f"❌ Unexpected histogram output: {lines}")
+            return False
+
+        before = STAGE_SECONDS.snapshot().get(("test_stage", "US", "t.tex.j2", "error"), {"count": 0})["count"]
+        try:
+            with span("test_stage", region="US", template="t.tex.j2"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        with span("test_stage", region="US", template="t.tex.j2") as s:
+            s["status"] = "error"
+        after = STAGE_SECONDS.snapshot()[("test_stage", "US", "t.tex.j2", "error")]["count"]
+        if after - before != 2:
+            print("❌ Failed spans not recorded with status=error")
+            return False
+
+        importlib.import_module("app.core.llm")  # registers the scheduler collector
+        text = render_metrics()
+        for name in ("tailor_stage_duration_seconds_bucket", "llm_scheduler_queue_depth", "llm_scheduler_in_flight"):
+            if name not in text:
+                print(f"❌ {name} missing from /metrics output")
+                return False
+
+        print("✅ Stage metrics working!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Metrics test failed: {e}")
+        return False
+
+def test_tracing():
+    """Test trace propagation through HTTP, LLM calls, subprocesses and Celery headers"""
+    print("🔄 Testing Tracing...")
+    run_ids = []
+    try:
+        import glob
+        from types import SimpleNamespace
+        from fastapi.testclient import TestClient
+        from app.core.tracing import memory_exporter, run_traced, tracer, inject_headers
+        from app.core.backends import StubBackend, set_backend
+        from app.core.tex_compile import ART_DIR
+
+        exporter = memory_exporter()
+        if exporter is None:
+            print("⚠️  opentelemetry-sdk not installed, skipping")
+            return True
+        exporter.clear()
+
+        # HTTP: incoming traceparent is continued, pipeline spans are children
+        from app.main import app
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        set_backend(StubBackend())
+        try:
+            response = TestClient(app).post("/api/v1/generate/", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}, json={
+                "profile": {"name": "Test User", "skills": ["Python"],
+                            "experience": [{"title": "Engineer", "company": "TechCorp", "bullets": ["Built Python APIs"]}]},
+                "jobs": [{"region": "US", "company": "Acme", "title": "Engineer", "jd_text": "Python APIs"}],
+            })
+        finally:
+            set_backend(None)
+        run_ids.append(response.json().get("run_id", "missing"))
+        from opentelemetry.trace import SpanKind
+        finished = exporter.get_finished_spans()
+        spans = {s.name: s for s in finished}
+        server = [s for s in finished if s.kind == SpanKind.SERVER]
+        if not server or format(server[0].context.trace_id, "032x") != trace_id:
+            print(f"❌ No server span continuing the incoming trace: {sorted(spans)}")
+            return False
+        for name in ("llm.call", "llm.generate", "select_bullets", "validate", "render", "compile", "bundle"):
+            if name not in spans:
+                print(f"❌ Missing span {name}: {sorted(spans)}")
+                return False
+            if format(spans[name].context.trace_id, "032x") != trace_id:
+                print(f"❌ Span {name} not in the incoming trace")
+                return False
+        if spans["llm.generate"].parent.span_id != spans["llm.call"].context.span_id:
+            print("❌ llm.generate is not a child of llm.call")
+            return False
+
+        # Outgoing headers carry the current span as traceparent
+        with tracer.start_as_current_span("outgoing") as outgoing:
+            ctx = outgoing.get_span_context()
+            headers = inject_headers({})
+        if not headers.get("traceparent", "").startswith(f"00-{ctx.trace_id:032x}-{ctx.span_id:016x}-"):
+            print(f"❌ traceparent not injected into outgoing headers: {headers}")
+            return False
+
+        # Subprocess: exit code, CPU time, TRACEPARENT handed to the child
+        exporter.clear()
+        with tracer.start_as_current_span("parent") as parent:
+            result = run_traced("child", [sys.executable, "-c", "import os, sys; print(os.environ['TRACEPARENT']); sys.exit(3)"])
+        child = next(s for s in exporter.get_finished_spans() if s.name == "child")
+        if result.returncode != 3 or child.attributes["process.exit_code"] != 3:
+            print("❌ Exit code not recorded")
+            return False
+        if "process.cpu.user_seconds" not in child.attributes and hasattr(os, "wait4"):
+            print("❌ CPU time not recorded")
+            return False
+        if format(parent.get_span_context().trace_id, "032x") not in result.stdout:
+            print("❌ TRACEPARENT not passed to the subprocess")
+            return False
+
+        # Celery: headers injected at publish, task span continues the trace
+        from app.queue.tasks import _inject_trace_context, _start_task_span, _end_task_span
+        exporter.clear()
+        headers = {}
+        with tracer.start_as_current_span("enqueue") as enqueue:
+            _inject_trace_context(headers=headers)
+        task = SimpleNamespace(name="app.queue.tasks.process_generation", request=SimpleNamespace(**headers))
+        _start_task_span(task_id="t1", task=task)
+        _end_task_span(task_id="t1", state="SUCCESS")
+        consumer = next(s for s in exporter.get_finished_spans() if s.name.startswith("celery "))
+        if consumer.context.trace_id != enqueue.get_span_context().trace_id:
+            print("❌ Celery task span did not continue the trace")
+            return False
+
+        print("✅ Tracing working! HTTP -> LLM/render/compile, subprocess and Celery spans linked")
+        return True
+
+    except Exception as e:
+        print(f"❌ Tracing test failed: {e}")
+        return False
+    finally:
+        for run_id in run_ids:
+            for path in glob.glob(os.path.join(ART_DIR, f"{run_id}_*")):
+                os.remove(path)
+
+def test_logging():
+    """Test JSON log formatting, lazy queue handler and request sampling"""
+    print("🔄 Testing Logging...")
+    try:
+        import queue
+        import logging
+        from app.core.logging_config import JsonFormatter, RequestSampler, _LazyQueueHandler
+
+        class Expensive:
+            formatted = 0
+            def __str__(self):
+                Expensive.formatted += 1
+                return "expensive"
+
+        q = queue.SimpleQueue()
+        test_logger = logging.getLogger("tests.lazy")
+        test_logger.propagate = False
+        test_logger.setLevel(logging.INFO)
+        test_logger.addHandler(_LazyQueueHandler(q))
+        test_logger.debug("skipped %s", Expensive())
+        test_logger.info("queued %s", Expensive(), extra={"job_id": "j1"})
+        if Expensive.formatted != 0 or q.qsize() != 1:
+            print("❌ Log record formatted on the calling thread")
+            return False
+
+        doc = json.loads(JsonFormatter().format(q.get()))
+        if doc["msg"] != "queued expensive" or doc["job_id"] != "j1" or doc["level"] != "INFO":
+            print(f"❌ Unexpected JSON log line: {doc}")
+            return False
+
+        sampler = RequestSampler("/health=0,/api/v1/generate/status=0.5,*=1", slow_ms=1000, rng=lambda: 0.7)
+        checks = [
+            (sampler.should_log("/health", 200, 5), False),
+            (sampler.should_log("/health", 503, 5), True),       # errors always logged
+            (sampler.should_log("/health", 200, 1500), True),    # slow requests always logged
+            (sampler.should_log("/api/v1/generate/status/abc", 200, 5), False),
+            (sampler.should_log("/api/v1/generate/", 200, 5), True),
+        ]
+        if any(got != want for got, want in checks):
+            print(f"❌ Unexpected sampling decisions: {[got for got, _ in checks]}")
+            return False
+
+        print("✅ Logging working!")
+        return True
+
+    except Exception as e:
+        print(f"❌ Logging test failed: {e}")
+        return False
+
+def test_render_context():
+    """Test that RenderContext renders the same LaTeX as per-job model_dump() contexts, sharing one frozen profile"""
+    print("🔄 Testing Render Context...")
+    paths = []
+    try:
+        from app.core.tex_compile import RenderContext, render_tex
+        from app.core.tailor import run_tailor
+        from app.core.backends import StubBackend, set_backend
+        from app.models import Profile, Contact, Role, JobJD
+
+        profile = Profile(name="Ctx User", contacts=Contact(email="ctx@example.com", links=["https://example.com"]),
+                          skills=["Python", "FastAPI"],
+                          experience=[Role(title="Engineer", company="TechCorp", start="2020-01", bullets=["Built Python APIs"])])
+        jobs = [JobJD(id=f"ctx-{region}", region=region, company="Acme", title="Engineer", jd_text="Python APIs")
+                for region in ("US", "EU", "GL")]
+        set_backend(StubBackend())
+        try:
+            outs = [run_tailor(profile, job) for job in jobs]
+        finally:
+            set_backend(None)
+
+        contexts = RenderContext(profile)
+        shared = set()
+        for job, out in zip(jobs, outs):
+            old = render_tex({"profile": profile.model_dump(), "out": out.resume.model_dump(), "job": job.model_dump()},
+                             {"profile": profile.model_dump(), "out": out.cover_letter.model_dump(), "job": job.model_dump()},
+                             job.region, f"test_ctx_old_{job.region}")
+            resume_ctx, cover_letter_ctx = contexts.for_job(job, out)
+            shared.update((id(resume_ctx["profile"]), id(cover_letter_ctx["profile"])))
+            new = render_tex(resume_ctx, cover_letter_ctx, job.region, f"test_ctx_new_{job.region}")
+            paths += [*old, *new]
+            for a, b in zip(old, new):
+                with open(a, encoding="utf-8") as fa, open(b, encoding="utf-8") as fb:
+                    if fa.read() != fb.read():
+                        print(f"❌ {os.path.basename(b)} differs from the model_dump() render")
+                        return False
+
+        if len(shared) != 1:
+            print(f"❌ Profile serialized {len(shared)} times for one batch")
+            return False
+        try:
+            contexts.profile["name"] = "changed"
+            print("❌ Shared profile context is mutable")
+            return False
+        except TypeError:
+            pass
+
+        print(f"✅ Render context working! {len(jobs)} jobs, identical LaTeX, one shared profile")
+        return True
+
+    except Exception as e:
+        print(f"❌ Render context test failed: {e}")
+        return False
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+def test_generation_engine():
+    """Test that the inline, thread and process strategies produce the same jobs, in order, and failures surface"""
+    print("🔄 Testing Generation Engine...")
+    run_ids = []
+    try:
+        import glob, uuid
+        from app.core.engine import GenerationEngine, GenerationError, InlineStrategy, ThreadPoolStrategy, ProcessPoolStrategy
+        from app.core.backends import StubBackend, set_backend
+        from app.core.tex_compile import ART_DIR
+        from app.models import Profile, Role, JobJD
+
+        profile = Profile(name="Engine User", skills=["Python"],
+                          experience=[Role(title="Engineer", company="TechCorp", start="2020-01", bullets=["Built Python APIs"])])
+        jobs = [JobJD(id=f"engine-{i}", region=region, company=f"Co{i}", title="Engineer", jd_text="Python APIs")
+                for i, region in enumerate(("US", "EU", "GL"))]
+
+        results = {}
+        previous_backend = os.environ.get("LLM_BACKEND")
+        os.environ["LLM_BACKEND"] = "stub"  # spawned process workers pick their backend from the environment
+        set_backend(StubBackend())
+        process = ProcessPoolStrategy(workers=2)
+        try:
+            for strategy in (InlineStrategy(), ThreadPoolStrategy(workers=3), process):
+                run_id = f"test-engine-{strategy.name}-{uuid.uuid4().hex[:8]}"
+                run_ids.append(run_id)
+                results[strategy.name] = GenerationEngine(strategy).run(run_id, profile, jobs, include_tex=True)
+
+            class FailingBackend(StubBackend):
+                def generate(self, *args, **kwargs):
+                    raise ValueError("backend down")
+            set_backend(FailingBackend())
+            try:
+                GenerationEngine(InlineStrategy()).run("test-engine-fail", profile, jobs[:1])
+                print("❌ Failed tailoring did not raise GenerationError")
+                return False
+            except GenerationError as e:
+                failure = str(e)
+        finally:
+            set_backend(None)
+            if process._executor:
+                process._executor.shutdown()
+            if previous_backend is None:
+                os.environ.pop("LLM_BACKEND", None)
+            else:
+                os.environ["LLM_BACKEND"] = previous_backend
+
+        inline = results["inline"]
+        for name, batch in results.items():
+            if [r.job.id for r in batch] != [j.id for j in jobs]:
+                print(f"❌ {name}: jobs out of order: {[r.job.id for r in batch]}")
+                return False
+            for a, b in zip(inline, batch):
+                if a.artifact["resume_tex_content"] != b.artifact["resume_tex_content"] or set(a.artifact) != set(b.artifact):
+                    print(f"❌ {name}: artifacts differ from inline for {b.job.id}")
+                    return False
+                if not b.artifact["resume_tex"].startswith(f"/artifacts/{run_ids[list(results).index(name)]}_"):
+                    print(f"❌ {name}: unexpected artifact path {b.artifact['resume_tex']}")
+                    return False
+        if not failure.startswith("LLM/validation error"):
+            print(f"❌ Unexpected failure message: {failure}")
+            return False
+
+        print(f"✅ Generation engine working! strategies: {', '.join(results)}, {len(jobs)} jobs each")
+        return True
+
+    except Exception as e:
+        print(f"❌ Generation engine test failed: {e}")
+        return False
+    finally:
+        for run_id in run_ids:
+            for path in glob.glob(os.path.join(ART_DIR, f"{run_id}*")):
+                os.remove(path)
+
+def test_incremental_regeneration():
+    """Test that regeneration only re-asks the sections a profile change affects and reuses unchanged PDFs"""
+    print("🔄 Testing Incremental Regeneration...")
+    run_ids = []
+    try:
+        import glob, uuid, hashlib
+        from app.core.engine import GenerationEngine, InlineStrategy
+        from app.core.incremental import Previous, affected_sections
+        from app.core.profiles import parse_profile
+        from app.core.backends import StubBackend, set_backend
+        from app.core.tex_compile import ART_DIR
+        from app.models import JobJD
+
+        profile_data = {
+            "basics": {"full_name": "Incremental User", "email": "inc@example.com", "summary": "Backend engineer"},
+            "skills": [{"name": "Python"}],
+            "experience": [{"title": "Engineer", "company": "TechCorp", "start": "2020-01", "end": "present",
+                            "bullets": ["Built Python APIs"]}],
+            "education": [{"school": "MIT", "degree": "BSc", "start": "2014", "end": "2018"}],
+        }
+        original = parse_profile(profile_data, 1)
+        job = JobJD(id="incremental", region="US", company="Acme", title="Engineer", jd_text="Python APIs")
+        engine = GenerationEngine(InlineStrategy())
+
+        backend = StubBackend()
+        set_backend(backend)
+        try:
+            run_ids.append(f"test-incr-{uuid.uuid4().hex[:8]}")
+            first, = engine.run(run_ids[-1], original.legacy, [job], parsed=original)
+            with open(first.cover_letter_tex, "rb") as f:
+                cover_letter_hash = hashlib.sha256(f.read()).hexdigest()
+            fake_pdf = os.path.join(ART_DIR, f"{run_ids[-1]}_earlier_cover_letter.pdf")
+            with open(fake_pdf, "wb") as f:
+                f.write(b"%PDF-1.4 earlier")
+
+            outcomes = {}
+            for change, edit in (
+                ("name", lambda d: d["basics"].update(full_name="Renamed User")),
+                ("education", lambda d: d["education"][0].update(degree="MSc")),
+                ("skills", lambda d: d["skills"].append({"name": "Go"})),
+            ):
+                data = json.loads(json.dumps(profile_data))
+                edit(data)
+                current = parse_profile(data, 2)
+                sections = affected_sections(original.fingerprint, current.fingerprint)
+                previous = Previous(first.out.model_dump(), sections, {"cover_letter": (cover_letter_hash, fake_pdf)})
+                calls = backend.calls
+                run_ids.append(f"test-incr-{uuid.uuid4().hex[:8]}")
+                result = engine.regenerate(run_ids[-1], current, job, previous)
+                outcomes[change] = (sections, backend.calls - calls, result)
+
+            forced = affected_sections(original.fingerprint, original.fingerprint, ("cover_letter",))
+            full = affected_sections(None, original.fingerprint)
+        finally:
+            set_backend(None)
+
+        sections, calls, result = outcomes["name"]
+        if sections or calls or result.out != first.out:
+            print(f"❌ Name change should only re-render: sections={sections}, LLM calls={calls}")
+            return False
+        if result.cover_letter_pdf:
+            print("❌ Cover letter PDF reused although its LaTeX changed (name)")
+            return False
+        sections, calls, result = outcomes["education"]
+        if sections != ("resume",) or calls != 1 or result.out.cover_letter != first.out.cover_letter:
+            print(f"❌ Education change: sections={sections}, LLM calls={calls}")
+            return False
+        if not result.cover_letter_pdf or not result.artifact["pdf_compilation"]["cover_letter_success"]:
+            print("❌ Unchanged cover letter PDF was not reused")
+            return False
+        sections, calls, result = outcomes["skills"]
+        if sections != ("resume", "ats") or calls != 1 or result.out.cover_letter != first.out.cover_letter:
+            print(f"❌ Skills change: sections={sections}, LLM calls={calls}")
+            return False
+        if forced != ("cover_letter",) or full != ("resume", "cover_letter", "ats"):
+            print(f"❌ Unexpected sections: requested={forced}, no fingerprint={full}")
+            return False
+
+        print("✅ Incremental regeneration working! " + ", ".join(
+            f"{change}: {list(s) or 'render only'} ({n} LLM calls)" for change, (s, n, _) in outcomes.items()))
+        return True
+
+    except Exception as e:
+        print(f"❌ Incremental regeneration test failed: {e}")
+        return False
+    finally:
+        for run_id in run_ids:
+            for path in glob.glob(os.path.join(ART_DIR, f"{run_id}*")):
+                os.remove(path)
+
+def test_output_selector():
+    """Test that resume-only / cover-letter-only jobs narrow the LLM schema, rendering and compilation"""
+    print("🔄 Testing Output Selector...")
+    run_ids = []
+    try:
+        import glob, uuid
+        from app.core.engine import GenerationEngine, InlineStrategy
+        from app.core.backends import StubBackend, set_backend
+        from app.core.tex_compile import ART_DIR
+        from app.models import Profile, Role, JobJD, GenerateRequest
+
+        request = GenerateRequest(outputs=["resume"], jobs=[
+            {"id": "only-resume", "company": "Acme", "title": "Engineer", "jd_text": "Python APIs"},
+            {"id": "only-letter", "company": "Acme", "title": "Engineer", "jd_text": "Python APIs", "outputs": ["cover_letter"]},
+            {"id": "both", "region": "GL", "company": "Acme", "title": "Engineer", "jd_text": "Python APIs",
+             "outputs": ["resume", "cover_letter"]},
+        ])
+        if [j.outputs for j in request.jobs] != [["resume"], ["cover_letter"], ["resume", "cover_letter"]]:
+            print(f"❌ Request outputs not applied: {[j.outputs for j in request.jobs]}")
+            return False
+        if JobJD(company="Acme", title="Engineer", jd_text="x").outputs != ["resume", "cover_letter"]:
+            print("❌ Jobs should default to both documents")
+            return False
+
+        class RecordingBackend(StubBackend):
+            def generate(self, system, prompt, response_schema, max_output_tokens):
+                schemas.append(sorted(response_schema.properties))
+                return super().generate(system, prompt, response_schema, max_output_tokens)
+        schemas = []
+        profile = Profile(name="Selector User", skills=["Python"],
+                          experience=[Role(title="Engineer", company="TechCorp", start="2020-01", bullets=["Built Python APIs"])])
+        set_backend(RecordingBackend())
+        try:
+            run_ids.append(f"test-outputs-{uuid.uuid4().hex[:8]}")
+            resume_only, letter_only, both = GenerationEngine(InlineStrategy()).run(run_ids[-1], profile, request.jobs, include_tex=True)
+        finally:
+            set_backend(None)
+
+        if schemas != [["ats", "resume"], ["cover_letter"], ["ats", "cover_letter", "resume"]]:
+            print(f"❌ LLM schemas not narrowed: {schemas}")
+            return False
+        if resume_only.out.cover_letter is not None or resume_only.cover_letter_tex or "cover_letter_tex" in resume_only.artifact:
+            print("❌ Resume-only job produced a cover letter")
+            return False
+        if letter_only.out.resume is not None or letter_only.resume_tex or letter_only.artifact["pdf_compilation"].keys() != {"cover_letter_success"}:
+            print("❌ Cover-letter-only job produced a resume")
+            return False
+        if not (both.resume_tex and both.cover_letter_tex and "resume_tex_content" in both.artifact):
+            print("❌ Job with both outputs is missing a document")
+            return False
+        written = sorted(os.path.basename(p)[len(run_ids[-1]) + 1:] for p in glob.glob(os.path.join(ART_DIR, f"{run_ids[-1]}_*.tex")))
+        if written != ["both_cover.tex", "both_resume.tex", "only-letter_cover.tex", "only-resume_resume.tex"]:
+            print(f"❌ Unexpected LaTeX files: {written}")
+            return False
+
+        print(f"✅ Output selector working! schemas: {schemas}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Output selector test failed: {e}")
+        return False
+    finally:
+        for run_id in run_ids:
+            for path in glob.glob(os.path.join(ART_DIR, f"{run_id}*")):
+                os.remove(path)
+
+def test_batch_tailoring():
+    """Test that batched tailoring packs jobs under the limits, maps items back and splits failed items out"""
+    print("🔄 Testing Batch Tailoring...")
+    run_ids = []
+    try:
+        import glob, uuid
+        import app.core.batch as batch
+        from app.core.engine import GenerationEngine, InlineStrategy
+        from app.core.backends import StubBackend, set_backend
+        from app.core.tex_compile import ART_DIR
+        from app.models import Profile, Role, JobJD
+
+        full, letter = ("resume", "cover_letter", "ats"), ("cover_letter",)
+        packed = batch.pack([(full, 100), (full, 100), (letter, 50), (full, 900), (full, 100)], fixed_tokens=500,
+                            max_jobs=3, max_input_tokens=1200, max_output_tokens=10000, item_output_tokens=1000)
+        if packed != [[0, 1], [2], [3], [4]]:
+            print(f"❌ Unexpected packing: {packed}")
+            return False
+
+        class DroppingBackend(StubBackend):
+            """Leaves job_key "1" out of batched answers"""
+            def generate(self, system, prompt, response_schema, max_output_tokens):
+                prompts.append(prompt)
+                response = super().generate(system, prompt, response_schema, max_output_tokens)
+                data = json.loads(response.text)
+                if "results" in data:
+                    data["results"] = [r for r in data["results"] if r["job_key"] != "1"]
+                return type(response)(json.dumps(data), response.finish_reason)
+
+        profile = Profile(name="Batch User", skills=["Python", "Go"],
+                          experience=[Role(title="Engineer", company="TechCorp", start="2020-01", bullets=["Built Python APIs"])])
+        jobs = [JobJD(id=f"batch-{i}", region="US", company=f"Co{i}", title="Engineer", jd_text=f"Python APIs {i}",
+                      outputs=["cover_letter"] if i == 2 else ["resume", "cover_letter"]) for i in range(5)]
+
+        results, calls = {}, {}
+        previous_max_jobs = batch.TAILOR_BATCH_MAX_JOBS
+        try:
+            for max_jobs in (1, 3):
+                batch.TAILOR_BATCH_MAX_JOBS = max_jobs
+                prompts = []
+                set_backend(DroppingBackend())
+                run_ids.append(f"test-batch-{max_jobs}-{uuid.uuid4().hex[:8]}")
+                results[max_jobs] = GenerationEngine(InlineStrategy()).run(run_ids[-1], profile, jobs)
+                calls[max_jobs] = (len(prompts), sum(len(p) for p in prompts))
+        finally:
+            batch.TAILOR_BATCH_MAX_JOBS = previous_max_jobs
+            set_backend(None)
+
+        # batches [0, 1, 3] and [4]; 1 is dropped from its answer, 2 (cover letter only) and 4 are alone
+        if calls[1][0] != 5 or calls[3][0] != 4:
+            print(f"❌ Unexpected LLM calls: individual {calls[1][0]}, batched {calls[3][0]}")
+            return False
+        if [r.out for r in results[3]] != [r.out for r in results[1]] or [r.job.id for r in results[3]] != [j.id for j in jobs]:
+            print("❌ Batched outputs don't map back to their jobs")
+            return False
+        if results[3][2].out.resume is not None:
+            print("❌ Cover-letter-only job got a resume from a batch")
+            return False
+
+        print(f"✅ Batch tailoring working! LLM calls {calls[1][0]} -> {calls[3][0]}, "
+              f"prompt chars {calls[1][1]} -> {calls[3][1]}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Batch tailoring test failed: {e}")
+        return False
+    finally:
+        for run_id in run_ids:
+            for path in glob.glob(os.path.join(ART_DIR, f"{run_id}*")):
+                os.remove(path)
+
 def test_tex_compilation():
     """Test LaTeX template rendering (without compilation)"""
     print("🔄 Testing LaTeX Templates...")
@@ -256,15 +1696,78 @@ def main():
     results['auth'] = test_auth_components()
     print()
     
+    results['auth_caches'] = test_auth_caches()
+    print()
+    
+    results['auth_crypto'] = test_auth_crypto()
+    print()
+    
+    results['db_pool'] = test_db_pool()
+    print()
+    
+    results['async_routes'] = test_async_routes()
+    print()
+    
+    results['history_indexes'] = test_history_indexes()
+    print()
+    
+    results['artifacts'] = test_artifacts()
+    print()
+    
+    results['bulk_persist'] = test_bulk_persist()
+    print()
+    
+    results['profile_cache'] = test_profile_cache()
+    print()
+    
     results['tailor'] = test_tailor_components()
     print()
     
     results['validation'] = test_validation()
     print()
+
+    results['schema'] = test_output_schema()
+    print()
+
+    results['repair'] = test_repair()
+    print()
+
+    results['salvage'] = test_truncation_salvage()
+    print()
+
+    results['scheduler'] = test_llm_scheduler()
+    print()
+    
+    results['stub_backend'] = test_stub_backend()
+    print()
+    
+    results['metrics'] = test_metrics()
+    print()
+    
+    results['tracing'] = test_tracing()
+    print()
+    
+    results['logging'] = test_logging()
+    print()
     
     results['latex'] = test_tex_compilation()
     print()
     
+    results['render_context'] = test_render_context()
+    print()
+    
+    results['generation_engine'] = test_generation_engine()
+    print()
+    
+    results['incremental_regeneration'] = test_incremental_regeneration()
+    print()
+    
+    results['output_selector'] = test_output_selector()
+    print()
+    
+    results['batch_tailoring'] = test_batch_tailoring()
+    print()
+    
     # Summary
     print("=" * 60)
     print("COMPONENT TEST RESULTS")